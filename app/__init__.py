@@ -1,6 +1,7 @@
 from flask import Flask
 from .db import db, migrate
-from flask_jwt_extended import JWTManager
+from . import cache, graph, kinship, lookups, search, typeahead  # noqa: F401  (registra eventos de invalidação/índices)
+from flask_jwt_extended import JWTManager, jwt_required
 
 
 def create_app() -> Flask:
@@ -9,6 +10,7 @@ def create_app() -> Flask:
 
 	db.init_app(app)
 	migrate.init_app(app, db)
+	cache.init_app(app)
 	JWTManager(app)
 
 	from .routes.auth import bp as auth_bp
@@ -18,16 +20,23 @@ def create_app() -> Flask:
 	from .routes.users import bp as users_bp
 	from .routes.relationships import bp as rel_bp
 	from .routes.municipios import bp as municipios_bp
+	from .routes.graph import bp as graph_bp
 	app.register_blueprint(auth_bp, url_prefix='/api/auth')
 	app.register_blueprint(membros_bp, url_prefix='/api')
 	app.register_blueprint(lookups_bp, url_prefix='/api')
 	app.register_blueprint(users_bp, url_prefix='/api')
 	app.register_blueprint(rel_bp, url_prefix='/api')
 	app.register_blueprint(municipios_bp, url_prefix='/api')
+	app.register_blueprint(graph_bp, url_prefix='/api')
 	app.register_blueprint(views_bp)
 
 	@app.get('/api/health')
 	def health():
 		return { 'status': 'ok' }
 
+	@app.get('/api/cache/stats')
+	@jwt_required()
+	def cache_stats():
+		return cache.stats()
+
 	return app 
\ No newline at end of file
@@ -0,0 +1,278 @@
+from collections import OrderedDict
+from functools import wraps
+from flask import has_request_context, request, make_response
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.orm import Session
+from .db import db
+from .models import CacheVersion, Membro, MembroRelacionamento, MembroHistorico, Lookup, Municipio, membro_amigos
+import hashlib
+import json
+import threading
+import time
+
+# cache de resultados versionado: toda gravação em membros/amigos/parentescos muda a versão,
+# então chaves antigas simplesmente deixam de ser consultadas (e saem por LRU/TTL).
+# Cada escopo tem sua versão; tabelas gravadas -> escopo invalidado.
+# As versões ficam na tabela cache_versions e sobem na mesma transação da gravação:
+# todos os workers e a CLI enxergam a mesma versão assim que o commit é feito.
+SCOPE_BY_TABLE = {
+	Membro.__tablename__: 'membros',
+	MembroRelacionamento.__tablename__: 'membros',
+	membro_amigos.name: 'membros',
+	Lookup.__tablename__: 'lookups',
+	MembroHistorico.__tablename__: 'historico',
+	Municipio.__tablename__: 'municipios',
+}
+
+
+class LocalBackend:
+	"""Backend em processo: LRU com TTL por entrada."""
+
+	def __init__(self, max_entries=1024, ttl=600):
+		self.max_entries = max_entries
+		self.ttl = ttl
+		self._data = OrderedDict()
+		self._lock = threading.Lock()
+
+	def get(self, key):
+		with self._lock:
+			item = self._data.get(key)
+			if item is None:
+				return None
+			expires_at, value = item
+			if expires_at < time.monotonic():
+				del self._data[key]
+				return None
+			self._data.move_to_end(key)
+			return value
+
+	def set(self, key, value, ttl=None) -> None:
+		with self._lock:
+			self._data[key] = (time.monotonic() + (ttl or self.ttl), value)
+			self._data.move_to_end(key)
+			while len(self._data) > self.max_entries:
+				self._data.popitem(last=False)
+
+	def clear(self) -> None:
+		with self._lock:
+			self._data.clear()
+
+	def size(self) -> int:
+		return len(self._data)
+
+
+class RedisBackend:
+	"""Backend compartilhado entre workers (requer o pacote redis)."""
+
+	def __init__(self, url, ttl=600, prefix='membro:cache:'):
+		try:
+			import redis
+		except ImportError as e:
+			raise RuntimeError('CACHE_BACKEND=redis requer o pacote redis instalado') from e
+		self.client = redis.Redis.from_url(url)
+		self.ttl = ttl
+		self.prefix = prefix
+
+	def _k(self, key) -> str:
+		return self.prefix + hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+	def get(self, key):
+		raw = self.client.get(self._k(key))
+		return json.loads(raw) if raw is not None else None
+
+	def set(self, key, value, ttl=None) -> None:
+		self.client.setex(self._k(key), int(ttl or self.ttl), json.dumps(value, ensure_ascii=False))
+
+	def clear(self) -> None:
+		for k in self.client.scan_iter(self.prefix + '*'):
+			self.client.delete(k)
+
+	def size(self) -> int:
+		# chaves do banco Redis inteiro (não só deste prefixo): DBSIZE é O(1), SCAN não
+		return int(self.client.dbsize())
+
+
+_backend = LocalBackend()
+_ENV_KEY = 'membro.cache_versions'
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def init_app(app) -> None:
+	global _backend
+	kind = (app.config.get('CACHE_BACKEND') or 'local').lower()
+	ttl = int(app.config.get('CACHE_TTL') or 600)
+	if kind == 'redis':
+		_backend = RedisBackend(app.config.get('CACHE_REDIS_URL'), ttl=ttl)
+	else:
+		_backend = LocalBackend(max_entries=int(app.config.get('CACHE_MAX_ENTRIES') or 1024), ttl=ttl)
+
+
+def _read_versions() -> dict:
+	t = CacheVersion.__table__
+	# conexão própria e curta: dentro da transação da sessão (REPEATABLE READ) o valor não mudaria
+	with db.engine.connect() as conn:
+		return dict(conn.execute(select(t.c.scope, t.c.version)).all())
+
+
+def versions(fresh=False) -> dict:
+	"""{escopo: versão}; lida uma vez por requisição (fresh=True relê)."""
+	if not has_request_context():
+		return _read_versions()
+	# no environ (e não em g): o contexto de aplicação pode ser compartilhado entre requisições
+	if fresh or _ENV_KEY not in request.environ:
+		request.environ[_ENV_KEY] = _read_versions()
+	return request.environ[_ENV_KEY]
+
+
+def _forget() -> None:
+	if has_request_context():
+		request.environ.pop(_ENV_KEY, None)
+
+
+def _bump(conn, scopes) -> None:
+	t = CacheVersion.__table__
+	# ordem fixa: transações que sobem os mesmos escopos travam as linhas na mesma ordem
+	scopes = sorted(scopes)
+	res = conn.execute(update(t).where(t.c.scope.in_(scopes)).values(version=t.c.version + 1))
+	if res.rowcount < len(scopes):
+		present = set(conn.execute(select(t.c.scope).where(t.c.scope.in_(scopes))).scalars())
+		missing = [s for s in scopes if s not in present]
+		if missing:
+			conn.execute(insert(t), [{'scope': s, 'version': 1} for s in missing])
+
+
+def data_version(scope='membros') -> int:
+	return versions().get(scope, 0)
+
+
+def bump_version(scope='membros', conn=None) -> None:
+	"""Sobe a versão do escopo; com conn, dentro da transação do chamador (só vale se ela confirmar)."""
+	if conn is not None:
+		_bump(conn, [scope])
+	else:
+		with db.engine.begin() as own:
+			_bump(own, [scope])
+	_forget()
+
+
+def membros_version() -> int:
+	return data_version('membros')
+
+
+def bump_membros_version() -> None:
+	bump_version('membros')
+
+
+def get_or_set(name, key, compute, ttl=None, scope='membros'):
+	"""Resultado de compute() para (name, versão atual do escopo, key), calculado uma vez por versão."""
+	version = data_version(scope)
+	full_key = (name, version, key)
+	val = _backend.get(full_key)
+	with _stats_lock:
+		_stats['hits' if val is not None else 'misses'] += 1
+	if val is not None:
+		return val
+	val = compute()
+	# só guarda se ninguém gravou durante o cálculo
+	if versions(fresh=True).get(scope, 0) == version:
+		_backend.set(full_key, val, ttl)
+	return val
+
+
+def cached_total(signature, compute):
+	return get_or_set('total', signature, compute)
+
+
+def request_etag(scopes) -> str:
+	"""ETag forte: versões dos escopos + rota + parâmetros (ordenados); não depende do corpo.
+
+	As versões vêm de cache_versions, então todos os workers calculam a mesma ETag para os mesmos dados.
+	"""
+	args = sorted((k, v) for k in request.args for v in request.args.getlist(k))
+	current = versions()
+	raw = repr((request.path, args, [(sc, current.get(sc, 0)) for sc in scopes]))
+	return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def with_etag(*scopes):
+	"""Responde 304 quando If-None-Match bate com a ETag atual, antes de montar a resposta."""
+	scopes = scopes or ('membros',)
+
+	def deco(fn):
+		@wraps(fn)
+		def wrapper(*args, **kwargs):
+			tag = request_etag(scopes)
+			if tag in request.if_none_match:
+				resp = make_response('', 304)
+			else:
+				resp = make_response(fn(*args, **kwargs))
+				if resp.status_code != 200:
+					return resp
+			resp.set_etag(tag)
+			resp.headers['Cache-Control'] = 'private, no-cache'
+			resp.headers['Vary'] = 'Authorization'
+			return resp
+		return wrapper
+	return deco
+
+
+def stats() -> dict:
+	with _stats_lock:
+		hits, misses = _stats['hits'], _stats['misses']
+	total = hits + misses
+	return {
+		'backend': type(_backend).__name__,
+		'version': data_version('membros'),
+		'hits': hits,
+		'misses': misses,
+		'hit_ratio': round(hits / total, 3) if total else 0.0,
+		'entries': _backend.size(),
+	}
+
+
+def mark_scope(session, scope) -> None:
+	"""Faz o escopo subir no commit da sessão (escopos que não vêm de SCOPE_BY_TABLE, ex.: 'nomes')."""
+	session.info.setdefault('dirty_scopes', set()).add(scope)
+
+
+def _mark_dirty(session, table_name) -> None:
+	scope = SCOPE_BY_TABLE.get(table_name)
+	if scope:
+		mark_scope(session, scope)
+
+
+@event.listens_for(Session, 'after_flush')
+def _after_flush(session, flush_context):
+	for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+		table = getattr(obj, '__tablename__', None)
+		if table:
+			_mark_dirty(session, table)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _on_execute(state):
+	# DML direto (Core insert em membro_amigos, Query.delete() etc.) não passa pelo flush
+	if not (state.is_insert or state.is_update or state.is_delete):
+		return
+	table = getattr(state.statement, 'table', None)
+	_mark_dirty(state.session, getattr(table, 'name', None))
+
+
+@event.listens_for(Session, 'before_commit')
+def _before_commit(session):
+	# descarrega antes para que a versão suba junto com tudo o que o commit vai gravar
+	session.flush()
+	scopes = session.info.pop('dirty_scopes', None)
+	if scopes:
+		_bump(session.connection(), scopes)
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+	_forget()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session):
+	session.info.pop('dirty_scopes', None)
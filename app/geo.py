@@ -0,0 +1,470 @@
+from . import cache
+from .db import db
+from .models import Municipio
+from .search import strip_accents
+import json
+import os
+import re
+import threading
+import time
+
+STATIC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), 'static'))
+DEFAULT_GEOJSON = os.path.join(STATIC_DIR, 'mg.geo.json')
+DEFAULT_UF = 'MG'
+
+# sigla -> (nome, sigla da região, nome da região); evita consultar o IBGE para dados fixos
+UF_INFO = {
+	'AC': ('Acre', 'N', 'Norte'),
+	'AL': ('Alagoas', 'NE', 'Nordeste'),
+	'AP': ('Amapá', 'N', 'Norte'),
+	'AM': ('Amazonas', 'N', 'Norte'),
+	'BA': ('Bahia', 'NE', 'Nordeste'),
+	'CE': ('Ceará', 'NE', 'Nordeste'),
+	'DF': ('Distrito Federal', 'CO', 'Centro-Oeste'),
+	'ES': ('Espírito Santo', 'SE', 'Sudeste'),
+	'GO': ('Goiás', 'CO', 'Centro-Oeste'),
+	'MA': ('Maranhão', 'NE', 'Nordeste'),
+	'MT': ('Mato Grosso', 'CO', 'Centro-Oeste'),
+	'MS': ('Mato Grosso do Sul', 'CO', 'Centro-Oeste'),
+	'MG': ('Minas Gerais', 'SE', 'Sudeste'),
+	'PA': ('Pará', 'N', 'Norte'),
+	'PB': ('Paraíba', 'NE', 'Nordeste'),
+	'PR': ('Paraná', 'S', 'Sul'),
+	'PE': ('Pernambuco', 'NE', 'Nordeste'),
+	'PI': ('Piauí', 'NE', 'Nordeste'),
+	'RJ': ('Rio de Janeiro', 'SE', 'Sudeste'),
+	'RN': ('Rio Grande do Norte', 'NE', 'Nordeste'),
+	'RS': ('Rio Grande do Sul', 'S', 'Sul'),
+	'RO': ('Rondônia', 'N', 'Norte'),
+	'RR': ('Roraima', 'N', 'Norte'),
+	'SC': ('Santa Catarina', 'S', 'Sul'),
+	'SP': ('São Paulo', 'SE', 'Sudeste'),
+	'SE': ('Sergipe', 'NE', 'Nordeste'),
+	'TO': ('Tocantins', 'N', 'Norte'),
+}
+
+# apelidos explícitos de comarca -> nome normalizado do município (mesmos do mapa, sanitizeComarca);
+# é o único casamento além do nome exato
+NAME_ALIASES = {
+	'capital': 'belo horizonte',
+}
+
+# propriedades aceitas no GeoJSON (malhas do IBGE, mg.geo.json, shapefiles convertidos)
+CODE_PROPS = ('id', 'codarea', 'CD_MUN', 'cod_ibge', 'codigo_ibge', 'geocodigo')
+NAME_PROPS = ('name', 'nome', 'NM_MUN', 'description')
+
+_PAREN_RE = re.compile(r'\(.*?\)')
+_SUFFIX_RE = re.compile(r'\s+[-/]\s+.*$')
+_PREFIX_RE = re.compile(r'^comarca\s+(?:d[aeo]s?\s+)?')
+_NON_ALNUM_RE = re.compile(r'[^a-z0-9]+')
+
+
+def name_key(name) -> str:
+	"""Chave de comparação de município/comarca: sem acento, minúscula, sem 'Comarca de', parênteses e sufixos."""
+	s = strip_accents(name).lower()
+	s = _PAREN_RE.sub(' ', s)
+	s = _SUFFIX_RE.sub('', s)
+	s = _NON_ALNUM_RE.sub(' ', s).strip()
+	s = _PREFIX_RE.sub('', s)
+	return NAME_ALIASES.get(s, s)
+
+
+def _rings(geometry):
+	# anéis externos de Polygon/MultiPolygon
+	if not geometry:
+		return []
+	kind = geometry.get('type')
+	coords = geometry.get('coordinates') or []
+	if kind == 'Polygon':
+		return coords[:1]
+	if kind == 'MultiPolygon':
+		return [poly[0] for poly in coords if poly]
+	return []
+
+
+def centroid(geometry):
+	"""(lat, lon) do centróide ponderado por área; média dos vértices se a área for nula."""
+	area = cx = cy = 0.0
+	n = sx = sy = 0
+	for ring in _rings(geometry):
+		for (x0, y0), (x1, y1) in zip(ring, ring[1:]):
+			cross = x0 * y1 - x1 * y0
+			area += cross
+			cx += (x0 + x1) * cross
+			cy += (y0 + y1) * cross
+		for p in ring:
+			sx += p[0]
+			sy += p[1]
+			n += 1
+	if area:
+		return (cy / (3.0 * area), cx / (3.0 * area))
+	if n:
+		return (sy / n, sx / n)
+	return (None, None)
+
+
+def _prop(props, keys):
+	for k in keys:
+		v = props.get(k)
+		if v not in (None, ''):
+			return v
+	return None
+
+
+def features_to_rows(geojson, uf, names=None) -> list:
+	"""Linhas de `municipios` a partir de um FeatureCollection do IBGE (names: {código: nome} opcional)."""
+	uf = (uf or DEFAULT_UF).upper()
+	rows = []
+	for feat in geojson.get('features') or []:
+		props = feat.get('properties') or {}
+		code = _prop(props, CODE_PROPS) or feat.get('id')
+		try:
+			code = int(code)
+		except (TypeError, ValueError):
+			continue
+		name = (names or {}).get(code) or _prop(props, NAME_PROPS)
+		if not name:
+			continue
+		lat, lon = centroid(feat.get('geometry'))
+		rows.append({
+			'codigo': code,
+			'nome': str(name).strip(),
+			'nome_norm': name_key(name),
+			'uf': uf,
+			'lat': round(lat, 6) if lat is not None else None,
+			'lon': round(lon, 6) if lon is not None else None,
+		})
+	return rows
+
+
+def load_geojson(path=None) -> dict:
+	with open(path or DEFAULT_GEOJSON, 'r', encoding='utf-8') as f:
+		return json.load(f)
+
+
+class _Index:
+	def __init__(self, rows):
+		self.by_code = {}
+		self.by_key = {}
+		for r in rows:
+			entry = {k: r[k] for k in ('codigo', 'nome', 'nome_norm', 'uf', 'lat', 'lon')}
+			self.by_code[entry['codigo']] = entry
+			self.by_key.setdefault((entry['uf'], entry['nome_norm']), entry)
+
+	def find(self, name, uf=DEFAULT_UF):
+		"""Município pelo nome normalizado exato (ou apelido de NAME_ALIASES); None se não houver.
+
+		Sem casamento aproximado: um nome desconhecido fica de fora (contado como não localizado)
+		em vez de cair num município errado. Variantes novas entram em NAME_ALIASES.
+		"""
+		key = name_key(name)
+		if not key:
+			return None
+		return self.by_key.get(((uf or DEFAULT_UF).upper(), key))
+
+
+# (versão de SCOPE, _Index): `flask import-municipios` sobe a versão e cada worker recarrega na próxima consulta
+SCOPE = 'municipios'
+_index = None
+_lock = threading.Lock()
+
+
+def _load_rows():
+	# tabela municipios (todas as UFs importadas); sem ela, o mg.geo.json embarcado
+	try:
+		rows = [r._asdict() for r in db.session.query(
+			Municipio.codigo, Municipio.nome, Municipio.nome_norm, Municipio.uf, Municipio.lat, Municipio.lon
+		).all()]
+	except Exception:
+		db.session.rollback()
+		rows = []
+	if not any(r['uf'] == DEFAULT_UF for r in rows) and os.path.isfile(DEFAULT_GEOJSON):
+		rows += features_to_rows(load_geojson(DEFAULT_GEOJSON), DEFAULT_UF)
+	return rows
+
+
+def index() -> _Index:
+	global _index
+	# na requisição, a versão já lida para a ETag/cache; sem requisição, uma leitura por chamada
+	version = cache.data_version(SCOPE)
+	current = _index
+	if current is None or current[0] != version:
+		with _lock:
+			if _index is None or _index[0] != version:
+				_index = (version, _Index(_load_rows()))
+			current = _index
+	return current[1]
+
+
+def reload() -> None:
+	global _index
+	with _lock:
+		_index = None
+
+
+def find(name, uf=DEFAULT_UF):
+	return index().find(name, uf)
+
+
+def get(code):
+	try:
+		return index().by_code.get(int(code))
+	except (TypeError, ValueError):
+		return None
+
+
+def import_geojson(conn, geojson, uf, names=None) -> int:
+	"""Substitui os municípios da UF pelos do GeoJSON; retorna quantos foram gravados."""
+	rows = features_to_rows(geojson, uf, names)
+	if not rows:
+		return 0
+	table = Municipio.__table__
+	conn.execute(table.delete().where(table.c.uf == rows[0]['uf']))
+	# códigos são únicos no Brasil: remove também linhas que estavam com outra UF
+	conn.execute(table.delete().where(table.c.codigo.in_([r['codigo'] for r in rows])))
+	conn.execute(table.insert(), rows)
+	return len(rows)
+
+
+# ---- geometria simplificada para o mapa (flask build-geo) ----
+
+GEO_DIR = os.path.join(STATIC_DIR, 'geo')
+MANIFEST = os.path.join(GEO_DIR, 'manifest.json')
+PREVIOUS_KEY = '_previous'  # no manifest: {uf: {nível: arquivo}} da geração anterior, ainda servida
+
+# nível -> (tolerância Douglas-Peucker em graus, casas decimais das coordenadas);
+# no zoom padrão do mapa (~60 px por grau) 'media' fica abaixo de 1 px
+SIMPLIFY_LEVELS = {
+	'baixa': (0.02, 3),
+	'media': (0.008, 3),
+	'alta': (0.003, 4),
+}
+DEFAULT_LEVEL = 'media'
+
+
+def _douglas_peucker(points, tol):
+	# iterativo; extremos sempre mantidos (arco fechado: divide no ponto mais distante do início)
+	n = len(points)
+	if n < 3:
+		return list(points)
+	keep = [False] * n
+	keep[0] = keep[-1] = True
+	tol2 = tol * tol
+	stack = [(0, n - 1)]
+	while stack:
+		a, b = stack.pop()
+		ax, ay = points[a]
+		bx, by = points[b]
+		dx, dy = bx - ax, by - ay
+		seg = dx * dx + dy * dy
+		best, idx = -1.0, -1
+		for i in range(a + 1, b):
+			px, py = points[i]
+			if seg:
+				t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / seg))
+				qx, qy = ax + t * dx - px, ay + t * dy - py
+			else:
+				qx, qy = px - ax, py - ay
+			d = qx * qx + qy * qy
+			if d > best:
+				best, idx = d, i
+		if best > tol2:
+			keep[idx] = True
+			stack.append((a, idx))
+			stack.append((idx, b))
+	return [p for p, k in zip(points, keep) if k]
+
+
+def _polygons(geometry):
+	if geometry.get('type') == 'Polygon':
+		return [geometry['coordinates']]
+	if geometry.get('type') == 'MultiPolygon':
+		return geometry['coordinates']
+	return []
+
+
+def _closed(ring):
+	pts = [(round(x, 6), round(y, 6)) for x, y in ring]
+	if pts and pts[0] == pts[-1]:
+		pts.pop()
+	return pts
+
+
+def _junctions(rings) -> set:
+	# vértice com mais de dois vizinhos distintos = onde uma divisa compartilhada começa/termina
+	neighbors = {}
+	for pts in rings:
+		m = len(pts)
+		for i, p in enumerate(pts):
+			s = neighbors.setdefault(p, set())
+			s.add(pts[i - 1])
+			s.add(pts[(i + 1) % m])
+	return {p for p, s in neighbors.items() if len(s) > 2}
+
+
+class _ArcSimplifier:
+	"""Simplifica anéis arco a arco: a divisa entre dois municípios é simplificada uma vez só,
+	então os dois lados continuam coincidindo (sem frestas nem sobreposições)."""
+
+	def __init__(self, junctions, tol):
+		self.junctions = junctions
+		self.tol = tol
+		self._done = {}
+
+	def _arc(self, arc):
+		fwd = tuple(arc)
+		rev = fwd[::-1]
+		key = min(fwd, rev)
+		out = self._done.get(key)
+		if out is None:
+			out = self._done[key] = _douglas_peucker(key, self.tol)
+		return out if key == fwd else out[::-1]
+
+	def ring(self, pts):
+		cut = [i for i, p in enumerate(pts) if p in self.junctions]
+		if not cut:
+			# anel sem divisas com junções (ilha, enclave): arco fechado em forma canônica
+			k = pts.index(min(pts))
+			loop = pts[k:] + pts[:k] + [pts[k]]
+			return self._arc(loop)
+		k = cut[0]
+		loop = pts[k:] + pts[:k] + [pts[k]]
+		out = [loop[0]]
+		start = 0
+		for i in range(1, len(loop)):
+			if i == len(loop) - 1 or loop[i] in self.junctions:
+				out.extend(self._arc(loop[start:i + 1])[1:])
+				start = i
+		return out
+
+
+def _quantize(ring, digits):
+	out = []
+	for x, y in ring:
+		p = [round(x, digits), round(y, digits)]
+		if not out or out[-1] != p:
+			out.append(p)
+	if out and out[0] != out[-1]:
+		out.append(out[0])
+	return out
+
+
+def simplify(geojson, tol, digits) -> dict:
+	"""FeatureCollection simplificado (divisas compartilhadas preservadas) com coordenadas quantizadas."""
+	feats = []
+	for feat in geojson.get('features') or []:
+		feats.append((feat, [[_closed(r) for r in poly] for poly in _polygons(feat.get('geometry') or {})]))
+	simplifier = _ArcSimplifier(_junctions([r for _, polys in feats for poly in polys for r in poly if r]), tol)
+	out = []
+	for feat, polys in feats:
+		new_polys = []
+		for poly in polys:
+			rings = []
+			for pts in poly:
+				if len(pts) < 3:
+					continue
+				ring = _quantize(simplifier.ring(pts), digits)
+				if len(ring) < 4:
+					# anel menor que a tolerância: mantém o original só quantizado
+					ring = _quantize(pts, digits)
+				if len(ring) >= 4:
+					rings.append(ring)
+			if rings:
+				new_polys.append(rings)
+		if not new_polys:
+			continue
+		props = feat.get('properties') or {}
+		geometry = {'type': 'Polygon', 'coordinates': new_polys[0]} if len(new_polys) == 1 else {'type': 'MultiPolygon', 'coordinates': new_polys}
+		out.append({
+			'type': 'Feature',
+			'properties': {'id': _prop(props, CODE_PROPS) or feat.get('id'), 'name': _prop(props, NAME_PROPS)},
+			'geometry': geometry,
+		})
+	return {'type': 'FeatureCollection', 'features': out}
+
+
+def _read_manifest() -> dict:
+	try:
+		with open(MANIFEST, 'r', encoding='utf-8') as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return {}
+
+
+def build_assets(geojson, uf, names=None) -> dict:
+	"""Gera static/geo/<uf>-<nível>.<hash>.json (+ .gz e .br) e atualiza o manifest; retorna {nível: (arquivo, bytes)}."""
+	import gzip
+	import hashlib
+	try:
+		import brotli
+	except ImportError:
+		brotli = None
+	uf = uf.lower()
+	if names:
+		for feat in geojson.get('features') or []:
+			props = feat.setdefault('properties', {})
+			code = _prop(props, CODE_PROPS) or feat.get('id')
+			try:
+				props['name'] = names.get(int(code)) or _prop(props, NAME_PROPS)
+			except (TypeError, ValueError):
+				pass
+	os.makedirs(GEO_DIR, exist_ok=True)
+	manifest = _read_manifest()
+	current = manifest.get(uf) or {}
+	previous = manifest.setdefault(PREVIOUS_KEY, {})
+	before = set(current.values()) | set((previous.get(uf) or {}).values())
+	built = {}
+	for level, (tol, digits) in SIMPLIFY_LEVELS.items():
+		raw = json.dumps(simplify(geojson, tol, digits), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+		name = f'{uf}-{level}.{hashlib.sha1(raw).hexdigest()[:12]}.json'
+		path = os.path.join(GEO_DIR, name)
+		with open(path, 'wb') as f:
+			f.write(raw)
+		with open(path + '.gz', 'wb') as f:
+			f.write(gzip.compress(raw, compresslevel=9, mtime=0))
+		if brotli is not None:
+			with open(path + '.br', 'wb') as f:
+				f.write(brotli.compress(raw, quality=11))
+		built[level] = (name, len(raw))
+	manifest[uf] = {level: name for level, (name, _) in built.items()}
+	if current and current != manifest[uf]:
+		# páginas já abertas (ou em cache) ainda pedem os arquivos da geração anterior
+		previous[uf] = current
+	tmp = MANIFEST + '.tmp'
+	with open(tmp, 'w', encoding='utf-8') as f:
+		json.dump(manifest, f, indent=1)
+	os.replace(tmp, MANIFEST)
+	# só sai o que não é nem da geração atual nem da anterior
+	for name in before - set(manifest[uf].values()) - set((previous.get(uf) or {}).values()):
+		for ext in ('', '.gz', '.br'):
+			try:
+				os.remove(os.path.join(GEO_DIR, name + ext))
+			except OSError:
+				pass
+	_asset_cache.clear()
+	return built
+
+
+_asset_cache = {}
+# o manifest só muda com `flask build-geo` (outro processo): confere no máximo a cada tantos segundos
+ASSET_RECHECK = 10
+
+
+def asset_urls(uf=DEFAULT_UF) -> dict:
+	"""{nível: URL com hash} da geometria simplificada; vazio se `flask build-geo` ainda não rodou."""
+	now = time.monotonic()
+	cached = _asset_cache.get(uf)
+	if cached and now - cached[0] < ASSET_RECHECK:
+		return cached[2]
+	try:
+		mtime = os.path.getmtime(MANIFEST)
+	except OSError:
+		mtime = None
+	if cached and cached[1] == mtime:
+		urls = cached[2]
+	elif mtime is None:
+		urls = {}
+	else:
+		urls = { level: f'/geo/{name}' for level, name in (_read_manifest().get(uf.lower()) or {}).items() }
+	_asset_cache[uf] = (now, mtime, urls)
+	return urls
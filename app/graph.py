@@ -0,0 +1,590 @@
+from array import array
+from collections import deque
+from heapq import nlargest
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import PASSIVE_NO_INITIALIZE, get_history
+from . import cache
+from .db import db
+from .models import Membro, MembroRelacionamento, membro_amigos
+import threading
+import time
+
+# grafos em memória (amizades e parentescos), não direcionados, em CSR:
+# vizinhos do nó i = targets[offsets[i]:offsets[i+1]], ordenados e sem repetição.
+# Gravações posteriores ficam numa camada de diferenças até a próxima reconstrução.
+# Uma reconstrução por vez; o que for confirmado enquanto ela lê é reaplicado no resultado.
+# O instantâneo guarda a versão 'grafo' (cache_versions) em que foi lido: se a versão compartilhada
+# mudou (outro worker, CLI), a próxima consulta reconstrói antes de responder (e de gerar a ETag).
+KINDS = ('amigos', 'parentesco')
+SCOPE = 'grafo'
+MAX_AGE = 900  # segundos; rede de segurança
+MAX_DELTA = 50000  # arestas na camada de diferenças antes de preferir reconstruir
+
+_lock = threading.Lock()
+_build_lock = threading.Lock()
+_state = None
+_pending = None  # durante uma reconstrução: alterações a reaplicar; _RELOAD se o resultado já nasce velho
+_RELOAD = object()
+
+
+class _Graph:
+	def __init__(self, n, offsets, targets):
+		self.n = n  # nós presentes no CSR
+		self.offsets = offsets
+		self.targets = targets
+		self.added = {}      # i -> {j}
+		self.removed = set() # (min, max)
+		self.degree = array('l', (offsets[i+1] - offsets[i] for i in range(n)))
+		self.edges = len(targets) // 2
+
+	def base(self, i):
+		if i >= self.n:
+			return ()
+		return self.targets[self.offsets[i]:self.offsets[i+1]]
+
+	def neighbors(self, i):
+		out = set(self.base(i))
+		if self.removed:
+			out = { j for j in out if (min(i, j), max(i, j)) not in self.removed }
+		extra = self.added.get(i)
+		if extra:
+			out |= extra
+		return out
+
+	def has_edge(self, i, j):
+		if (min(i, j), max(i, j)) in self.removed:
+			return False
+		if j in self.added.get(i, ()):
+			return True
+		seg = self.base(i)
+		# busca binária no trecho ordenado
+		lo, hi = 0, len(seg)
+		while lo < hi:
+			mid = (lo + hi) // 2
+			if seg[mid] < j:
+				lo = mid + 1
+			else:
+				hi = mid
+		return lo < len(seg) and seg[lo] == j
+
+	def _grow(self, size):
+		while len(self.degree) < size:
+			self.degree.append(0)
+
+	def add(self, i, j) -> bool:
+		if i == j or self.has_edge(i, j):
+			return False
+		self._grow(max(i, j) + 1)
+		self.removed.discard((min(i, j), max(i, j)))
+		if j not in self.base(i):
+			self.added.setdefault(i, set()).add(j)
+			self.added.setdefault(j, set()).add(i)
+		self.degree[i] += 1
+		self.degree[j] += 1
+		self.edges += 1
+		return True
+
+	def remove(self, i, j) -> bool:
+		if i == j or not self.has_edge(i, j):
+			return False
+		for a, b in ((i, j), (j, i)):
+			s = self.added.get(a)
+			if s and b in s:
+				s.discard(b)
+				if not s:
+					del self.added[a]
+		if j in self.base(i):
+			self.removed.add((min(i, j), max(i, j)))
+		self.degree[i] -= 1
+		self.degree[j] -= 1
+		self.edges -= 1
+		return True
+
+	def delta_size(self) -> int:
+		return len(self.removed) + sum(len(s) for s in self.added.values()) // 2
+
+
+class _UnionFind:
+	def __init__(self, size):
+		self.parent = array('l', range(size))
+		self.size = array('l', [1]) * size
+		self._groups = None
+
+	def _grow(self, size):
+		while len(self.parent) < size:
+			self.parent.append(len(self.parent))
+			self.size.append(1)
+
+	def find(self, i):
+		if i >= len(self.parent):
+			self._grow(i + 1)
+		p = self.parent
+		root = i
+		while p[root] != root:
+			root = p[root]
+		while p[i] != root:
+			p[i], i = root, p[i]
+		return root
+
+	def union(self, i, j) -> None:
+		a, b = self.find(i), self.find(j)
+		if a == b:
+			return
+		if self.size[a] < self.size[b]:
+			a, b = b, a
+		self.parent[b] = a
+		self.size[a] += self.size[b]
+		self._groups = None
+
+	def groups(self):
+		"""raiz -> [índices] dos componentes com mais de um nó (calculado uma vez por estado)."""
+		if self._groups is None:
+			groups = {}
+			for i in range(len(self.parent)):
+				r = self.find(i)
+				if self.size[r] > 1:
+					groups.setdefault(r, []).append(i)
+			self._groups = groups
+		return self._groups
+
+
+class _State:
+	def __init__(self):
+		self.ids = array('q')  # índice -> id do membro
+		self.index = {}        # id do membro -> índice
+		self.graphs = {}
+		self.degree_all = array('l')  # grau somando os tipos (vizinhos distintos), para kind=todos
+		self.components = {}   # tipos -> _UnionFind, mantido nas inclusões
+		self.built_at = time.monotonic()
+		self.version = None    # versão de SCOPE lida antes da carga
+
+	def idx(self, id_, create=False):
+		i = self.index.get(id_)
+		if i is None and create:
+			i = len(self.ids)
+			self.ids.append(id_)
+			self.index[id_] = i
+			self.degree_all.append(0)
+		return i
+
+
+def _csr(n, src, dst):
+	"""CSR a partir de pares direcionados (já nos dois sentidos), sem laços e sem repetição."""
+	counts = array('l', [0]) * (n + 1)
+	for u in src:
+		counts[u + 1] += 1
+	for i in range(n):
+		counts[i + 1] += counts[i]
+	raw = array('l', [0]) * len(src)
+	pos = array('l', counts)
+	for u, v in zip(src, dst):
+		raw[pos[u]] = v
+		pos[u] += 1
+	offsets = array('l', [0]) * (n + 1)
+	targets = array('l')
+	for i in range(n):
+		seg = set(raw[counts[i]:counts[i+1]])
+		seg.discard(i)
+		targets.extend(sorted(seg))
+		offsets[i + 1] = len(targets)
+	return offsets, targets
+
+
+def _union_size(segs):
+	segs = [s for s in segs if s]
+	if len(segs) < 2:
+		return len(segs[0]) if segs else 0
+	return len(set().union(*segs))
+
+
+def _load() -> '_State':
+	state = _State()
+	sources = {
+		'amigos': select(membro_amigos.c.membro_id, membro_amigos.c.amigo_id),
+		'parentesco': select(MembroRelacionamento.source_id, MembroRelacionamento.target_id),
+	}
+	pairs = {}
+	# conexão própria: a leitura (e o instantâneo do banco) começa depois de _pending ser aberto
+	with db.engine.connect() as conn:
+		# todos os membros viram nós (índices em ordem de id); as arestas são convertidas por lote
+		state.ids = array('q', conn.execute(select(Membro.id).order_by(Membro.id.asc())).scalars())
+		state.index = dict(zip(state.ids, range(len(state.ids))))
+		for kind, stmt in sources.items():
+			src, dst = array('l'), array('l')
+			# cursor do driver direto: milhões de pares sem criar um Row por linha
+			cursor = conn.connection.dbapi_connection.cursor()
+			try:
+				cursor.execute(str(stmt.compile(dialect=conn.dialect)))
+				chunks = iter(lambda: cursor.fetchmany(20000), [])
+				for chunk in chunks:
+					col_a, col_b = zip(*chunk)
+					ia = array('l', map(state.index.__getitem__, col_a))
+					ib = array('l', map(state.index.__getitem__, col_b))
+					# não direcionado: os dois sentidos
+					src.extend(ia)
+					src.extend(ib)
+					dst.extend(ib)
+					dst.extend(ia)
+			finally:
+				cursor.close()
+			pairs[kind] = (src, dst)
+	n = len(state.ids)
+	for kind, (src, dst) in pairs.items():
+		offsets, targets = _csr(n, src, dst)
+		state.graphs[kind] = _Graph(n, offsets, targets)
+	graphs = [state.graphs[k] for k in KINDS]
+	state.degree_all = array('l', (_union_size([g.base(i) for g in graphs]) for i in range(n)))
+	return state
+
+
+def _rebuild() -> '_State':
+	# chamado com _build_lock
+	global _state, _pending
+	with _lock:
+		_pending = []
+	try:
+		# versão lida antes das linhas: gravação concorrente só provoca outra reconstrução
+		version = cache.versions(fresh=True).get(SCOPE, 0)
+		state = _load()
+		state.version = version
+	except Exception:
+		with _lock:
+			_pending = None
+		raise
+	with _lock:
+		pending, _pending = _pending, None
+		if pending is _RELOAD:
+			# DML direto durante a leitura: arestas desconhecidas, a próxima consulta reconstrói
+			return state
+		_apply_to(state, pending)
+		_state = state
+	return state
+
+
+def rebuild() -> '_State':
+	with _build_lock:
+		return _rebuild()
+
+
+def _fresh(state, version) -> bool:
+	return state is not None and state.version == version and (time.monotonic() - state.built_at) <= MAX_AGE
+
+
+def invalidate() -> None:
+	global _state, _pending
+	with _lock:
+		_state = None
+		if _pending is not None:
+			_pending = _RELOAD
+
+
+def _ensure() -> _State:
+	# na requisição, a mesma leitura de versões que gerou a ETag (cache.with_etag)
+	version = cache.data_version(SCOPE)
+	state = _state
+	if _fresh(state, version):
+		return state
+	with _build_lock:
+		# quem esperava pela reconstrução de outra requisição reaproveita o resultado
+		state = _state
+		if _fresh(state, version):
+			return state
+		return _rebuild()
+
+
+def _tracking() -> bool:
+	"""Há grafo (ou reconstrução em andamento) que precisa das alterações confirmadas."""
+	return _state is not None or _pending is not None
+
+
+def _linked_elsewhere(state, kind, i, j) -> bool:
+	return any(state.graphs[k].has_edge(i, j) for k in KINDS if k != kind)
+
+
+def _apply_to(state, changes) -> None:
+	# chamado com _lock
+	for kind, op, a, b in changes:
+		if kind is None:
+			# membro novo, ainda sem arestas
+			state.idx(a, True)
+			continue
+		g = state.graphs[kind]
+		if op == '+':
+			i, j = state.idx(a, True), state.idx(b, True)
+			elsewhere = _linked_elsewhere(state, kind, i, j)
+			if g.add(i, j):
+				if not elsewhere:
+					state.degree_all[i] += 1
+					state.degree_all[j] += 1
+				for kinds, uf in state.components.items():
+					if kind in kinds:
+						uf.union(i, j)
+		else:
+			i, j = state.idx(a), state.idx(b)
+			if i is None or j is None:
+				continue
+			elsewhere = _linked_elsewhere(state, kind, i, j)
+			if g.remove(i, j):
+				if not elsewhere:
+					state.degree_all[i] -= 1
+					state.degree_all[j] -= 1
+				# remoção pode partir um componente: recalcular sob demanda
+				for kinds in [k for k in state.components if kind in k]:
+					del state.components[kinds]
+
+
+def apply_changes(changes, advance=False) -> None:
+	"""Aplica [(kind, '+'|'-', membro_id, outro_id)] ao grafo já construído (e guarda para a reconstrução em andamento).
+
+	advance: as alterações vêm de um commit deste processo, que subiu a versão de SCOPE em um.
+	Se outro processo também gravou, a versão não bate e a próxima consulta reconstrói.
+	"""
+	global _state
+	with _lock:
+		if isinstance(_pending, list):
+			_pending.extend(changes)
+		state = _state
+		if state is None:
+			return
+		_apply_to(state, changes)
+		if advance and state.version is not None:
+			state.version += 1
+		if any(g.delta_size() > MAX_DELTA for g in state.graphs.values()):
+			_state = None
+
+
+def _kinds(kind):
+	return KINDS if kind == 'todos' else (kind,)
+
+
+def _neighbors(state, kinds, i):
+	if len(kinds) == 1:
+		return state.graphs[kinds[0]].neighbors(i)
+	out = set()
+	for k in kinds:
+		out |= state.graphs[k].neighbors(i)
+	return out
+
+
+def _components(state, kinds):
+	if kinds in state.components:
+		return state.components[kinds]
+	uf = _UnionFind(len(state.ids))
+	for k in kinds:
+		g = state.graphs[k]
+		for i in range(g.n):
+			for j in g.base(i):
+				if j > i and (i, j) not in g.removed:
+					uf.union(i, j)
+		for i, extra in g.added.items():
+			for j in extra:
+				uf.union(i, j)
+	state.components[kinds] = uf
+	return uf
+
+
+def degree(id_, kind='amigos'):
+	"""Grau (nº de vizinhos distintos) de um membro."""
+	state = _ensure()
+	with _lock:
+		i = state.idx(id_)
+		if i is None:
+			return 0
+		kinds = _kinds(kind)
+		deg = state.graphs[kind].degree if len(kinds) == 1 else state.degree_all
+		return deg[i] if i < len(deg) else 0
+
+
+def top_degree(kind='amigos', limit=20):
+	"""[(id, grau)] dos membros mais conectados."""
+	state = _ensure()
+	with _lock:
+		deg = state.graphs[kind].degree if len(_kinds(kind)) == 1 else state.degree_all
+		best = nlargest(limit, range(len(deg)), key=deg.__getitem__)
+		return [(state.ids[i], deg[i]) for i in best if deg[i] > 0]
+
+
+def node_count() -> int:
+	"""Membros no grafo (todos os membros na construção, mais os que ganharam arestas depois)."""
+	return len(_ensure().ids)
+
+
+def components(kind='amigos', limit=20, id_=None, members=100):
+	"""Componentes conexos: totais, os maiores e, se id_ for dado, o componente do membro."""
+	state = _ensure()
+	with _lock:
+		kinds = _kinds(kind)
+		uf = _components(state, kinds)
+		# só nós com ao menos uma aresta contam (os demais estão isolados)
+		groups = uf.groups()
+		largest = nlargest(limit, groups.items(), key=lambda kv: len(kv[1]))
+		out = {
+			'count': len(groups),
+			'nodes': sum(len(g) for g in groups.values()),
+			'largest': [{'size': len(g), 'sample_ids': [state.ids[k] for k in g[:10]]} for _, g in largest],
+		}
+		if id_ is not None:
+			i = state.idx(id_)
+			g = groups.get(uf.find(i)) if i is not None else None
+			if not g:
+				out['component'] = {'size': 1, 'ids': [id_]}
+			else:
+				out['component'] = {'size': len(g), 'ids': [state.ids[k] for k in g[:members]]}
+		return out
+
+
+def shortest_path(a, b, kind='todos', max_depth=8):
+	"""Menor caminho (lista de ids) entre dois membros por BFS bidirecional; None se não houver."""
+	state = _ensure()
+	with _lock:
+		kinds = _kinds(kind)
+		i, j = state.idx(a), state.idx(b)
+		if i is None or j is None:
+			return [a] if a == b else None
+		if i == j:
+			return [a]
+		prev = {i: None}
+		nxt = {j: None}
+		front_a, front_b = deque([i]), deque([j])
+		depth = 0
+		while front_a and front_b and depth < max_depth:
+			depth += 1
+			# expandir sempre o lado com a menor fronteira
+			if len(front_a) <= len(front_b):
+				meet = _expand(state, kinds, front_a, prev, nxt)
+			else:
+				meet = _expand(state, kinds, front_b, nxt, prev)
+			if meet is not None:
+				path = []
+				k = meet
+				while k is not None:
+					path.append(k)
+					k = prev[k]
+				path.reverse()
+				k = nxt[meet]
+				while k is not None:
+					path.append(k)
+					k = nxt[k]
+				return [state.ids[k] for k in path]
+		return None
+
+
+def _expand(state, kinds, frontier, seen, other):
+	for _ in range(len(frontier)):
+		u = frontier.popleft()
+		for v in _neighbors(state, kinds, u):
+			if v in seen:
+				continue
+			seen[v] = u
+			if v in other:
+				return v
+			frontier.append(v)
+	return None
+
+
+def mutual(a, b, kind='amigos'):
+	"""Ids conectados diretamente aos dois membros."""
+	state = _ensure()
+	with _lock:
+		kinds = _kinds(kind)
+		i, j = state.idx(a), state.idx(b)
+		if i is None or j is None:
+			return []
+		common = _neighbors(state, kinds, i) & _neighbors(state, kinds, j)
+		return sorted(state.ids[k] for k in common)
+
+
+def stats():
+	state = _ensure()
+	with _lock:
+		return {
+			'nodes': len(state.ids),
+			'edges': { k: g.edges for k, g in state.graphs.items() },
+			'delta': { k: g.delta_size() for k, g in state.graphs.items() },
+			'age_seconds': round(time.monotonic() - state.built_at, 1),
+		}
+
+
+def _still_linked(session, kind, a, b) -> bool:
+	# outra linha (no outro sentido ou com outro grau) mantém a aresta não direcionada
+	if kind == 'amigos':
+		t = membro_amigos.c
+		cond = ((t.membro_id == a) & (t.amigo_id == b)) | ((t.membro_id == b) & (t.amigo_id == a))
+		stmt = select(t.membro_id).where(cond).limit(1)
+	else:
+		R = MembroRelacionamento
+		cond = ((R.source_id == a) & (R.target_id == b)) | ((R.source_id == b) & (R.target_id == a))
+		stmt = select(R.id).where(cond).limit(1)
+	return session.connection().execute(stmt).first() is not None
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_amigos(session, flush_context, instances):
+	# o histórico de relações "dynamic" é zerado pelo flush: capturar antes
+	# (sempre: mesmo sem grafo neste processo, a versão compartilhada tem de subir)
+	pending = session.info.setdefault('graph_amigos', [])
+	for obj in list(session.new) + list(session.dirty):
+		if isinstance(obj, Membro):
+			hist = get_history(obj, 'amigos', passive=PASSIVE_NO_INITIALIZE)
+			for f in hist.added or ():
+				pending.append(('+', obj, f))
+			for f in hist.deleted or ():
+				pending.append(('-', obj, f))
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect(session, flush_context):
+	amigos = session.info.pop('graph_amigos', ())
+	new = [o for o in session.new if isinstance(o, (Membro, MembroRelacionamento))]
+	deleted = [o for o in session.deleted if isinstance(o, (Membro, MembroRelacionamento))]
+	modified = any(isinstance(o, MembroRelacionamento) and session.is_modified(o) for o in session.dirty)
+	if not (amigos or new or deleted or modified):
+		return
+	cache.mark_scope(session, SCOPE)
+	if modified or any(isinstance(o, Membro) for o in deleted):
+		session.info['graph_invalidate'] = True
+	if not _tracking():
+		return
+	changes = session.info.setdefault('graph_changes', [])
+	for op, obj, f in amigos:
+		if op == '+':
+			changes.append(('amigos', '+', obj.id, f.id))
+		elif not _still_linked(session, 'amigos', obj.id, f.id):
+			changes.append(('amigos', '-', obj.id, f.id))
+	for obj in new:
+		if isinstance(obj, Membro):
+			changes.append((None, '+', obj.id, None))
+		else:
+			changes.append(('parentesco', '+', obj.source_id, obj.target_id))
+	for obj in deleted:
+		if isinstance(obj, MembroRelacionamento) and not _still_linked(session, 'parentesco', obj.source_id, obj.target_id):
+			changes.append(('parentesco', '-', obj.source_id, obj.target_id))
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _on_execute(state):
+	# DML direto (importação, Core insert no pivot): sem como saber as arestas, reconstruir depois
+	if not (state.is_insert or state.is_update or state.is_delete):
+		return
+	name = getattr(getattr(state.statement, 'table', None), 'name', None)
+	# em membros só inclusões e exclusões mudam os nós
+	if name in (membro_amigos.name, MembroRelacionamento.__tablename__) or (name == Membro.__tablename__ and not state.is_update):
+		state.session.info['graph_invalidate'] = True
+		cache.mark_scope(state.session, SCOPE)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply(session):
+	changes = session.info.pop('graph_changes', None)
+	if session.info.pop('graph_invalidate', False):
+		invalidate()
+	elif changes:
+		apply_changes(changes, advance=True)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_pending(session):
+	session.info.pop('graph_amigos', None)
+	session.info.pop('graph_changes', None)
+	session.info.pop('graph_invalidate', None)
@@ -0,0 +1,187 @@
+from collections import deque
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+from .models import MembroRelacionamento, MembroParente, MembroFamilia
+
+# fecho dos parentescos: para cada membro, todos os parentes até MAX_DISTANCE saltos,
+# com a relação direta ou inferida; famílias = componentes conexos (sem limite de saltos).
+MAX_DISTANCE = 4
+
+# rel(source -> target) = degree significa "target é <degree> de source"
+INVERSE = {'parent': 'child', 'child': 'parent', 'spouse': 'spouse', 'sibling': 'sibling'}
+
+# (relação de Y com X, relação de Z com Y) -> relação de Z com X
+# O segundo elemento é sempre um grau direto (INVERSE); pares como ('sibling', 'grandchild') não ocorrem,
+# o neto do irmão sai de ('nephew', 'child'). Como a BFS acha o menor caminho, um parente que seria direto
+# já foi alcançado antes: ex. ('grandchild', 'parent') é o genro/nora, não o filho.
+# Combinação fora da tabela (ex. parente do concunhado) fica como RELATIVE.
+COMPOSE = {
+	('parent', 'parent'): 'grandparent',
+	('parent', 'child'): 'sibling',          # irmão por pai/mãe em comum
+	('parent', 'sibling'): 'uncle',
+	('parent', 'spouse'): 'stepparent',
+	('child', 'child'): 'grandchild',
+	('child', 'spouse'): 'child_in_law',
+	('child', 'parent'): 'co_parent',
+	('sibling', 'sibling'): 'sibling',
+	('sibling', 'parent'): 'parent',
+	('sibling', 'child'): 'nephew',
+	('sibling', 'spouse'): 'sibling_in_law',
+	('spouse', 'parent'): 'parent_in_law',
+	('spouse', 'child'): 'stepchild',
+	('spouse', 'sibling'): 'sibling_in_law',
+	('child', 'sibling'): 'child',
+	('grandparent', 'parent'): 'great_grandparent',
+	('grandparent', 'child'): 'uncle',
+	('grandparent', 'sibling'): 'great_uncle',
+	('grandparent', 'spouse'): 'grandparent',
+	('grandchild', 'child'): 'great_grandchild',
+	('grandchild', 'sibling'): 'grandchild',
+	('grandchild', 'spouse'): 'grandchild_in_law',
+	('grandchild', 'parent'): 'child_in_law',
+	('stepparent', 'child'): 'sibling',
+	('stepchild', 'child'): 'grandchild',
+	('parent_in_law', 'child'): 'sibling_in_law',
+	('sibling_in_law', 'child'): 'nephew',
+	('sibling_in_law', 'spouse'): 'sibling_in_law',
+	('uncle', 'child'): 'cousin',
+	('uncle', 'spouse'): 'uncle',
+	('uncle', 'sibling'): 'uncle',
+	('uncle', 'parent'): 'grandparent',
+	('cousin', 'sibling'): 'cousin',
+	('nephew', 'child'): 'grandnephew',
+	('nephew', 'sibling'): 'nephew',
+	('nephew', 'spouse'): 'nephew_in_law',
+	('nephew', 'parent'): 'sibling_in_law',
+}
+RELATIVE = 'relative'
+
+
+def _load_component(conn, seeds):
+	"""Arestas do(s) componente(s) que contêm `seeds`: {id: {vizinho: relação do vizinho com id}}."""
+	R = MembroRelacionamento.__table__.c
+	adj = {}
+	seen = set(seeds)
+	frontier = set(seeds)
+	while frontier:
+		rows = conn.execute(
+			select(R.source_id, R.target_id, R.degree).where(R.source_id.in_(frontier) | R.target_id.in_(frontier))
+		).all()
+		nxt = set()
+		for s, t, degree in rows:
+			if s == t or degree not in INVERSE:
+				continue
+			adj.setdefault(s, {}).setdefault(t, degree)
+			adj.setdefault(t, {}).setdefault(s, INVERSE[degree])
+			for n in (s, t):
+				if n not in seen:
+					seen.add(n)
+					nxt.add(n)
+		frontier = nxt
+	return adj
+
+
+def _components(adj):
+	seen = set()
+	for start in sorted(adj):
+		if start in seen:
+			continue
+		comp = [start]
+		seen.add(start)
+		q = deque([start])
+		while q:
+			u = q.popleft()
+			for v in adj[u]:
+				if v not in seen:
+					seen.add(v)
+					comp.append(v)
+					q.append(v)
+		yield comp
+
+
+def _closure_from(adj, start):
+	"""[(parente, distância, relação)] por BFS a partir de start, até MAX_DISTANCE."""
+	out = []
+	rel = {start: None}
+	dist = {start: 0}
+	q = deque([start])
+	while q:
+		u = q.popleft()
+		if dist[u] >= MAX_DISTANCE:
+			continue
+		for v, step in adj[u].items():
+			if v in dist:
+				continue
+			dist[v] = dist[u] + 1
+			rel[v] = step if rel[u] is None else COMPOSE.get((rel[u], step), RELATIVE)
+			out.append((v, dist[v], rel[v]))
+			q.append(v)
+	return out
+
+
+def refresh(conn, member_ids) -> set:
+	"""Recalcula família e fecho dos componentes que contêm member_ids (antes e depois da mudança).
+
+	Retorna os membros que ficaram em alguma família.
+	"""
+	member_ids = set(i for i in member_ids if i)
+	if not member_ids:
+		return set()
+	P = MembroParente.__table__
+	F = MembroFamilia.__table__
+	# famílias antigas desses membros: tudo delas é regravado
+	old = set(conn.execute(select(F.c.familia_id).where(F.c.membro_id.in_(member_ids))).scalars())
+	if old:
+		conn.execute(P.delete().where(P.c.familia_id.in_(old)))
+		conn.execute(F.delete().where(F.c.familia_id.in_(old)))
+	conn.execute(F.delete().where(F.c.membro_id.in_(member_ids)))
+	adj = _load_component(conn, member_ids)
+	fam_rows = []
+	closure_rows = []
+	for comp in _components(adj):
+		familia_id = min(comp)
+		for m in comp:
+			fam_rows.append({'membro_id': m, 'familia_id': familia_id})
+			for p, d, r in _closure_from(adj, m):
+				closure_rows.append({'membro_id': m, 'parente_id': p, 'distancia': d, 'relacao': r, 'familia_id': familia_id})
+	if fam_rows:
+		conn.execute(F.insert(), fam_rows)
+	if closure_rows:
+		conn.execute(P.insert(), closure_rows)
+	return set(adj)
+
+
+def rebuild_all(conn) -> int:
+	"""Reconstrói as duas tabelas do zero; retorna o nº de famílias."""
+	conn.execute(MembroParente.__table__.delete())
+	conn.execute(MembroFamilia.__table__.delete())
+	R = MembroRelacionamento.__table__.c
+	ids = set()
+	for s, t in conn.execute(select(R.source_id, R.target_id)):
+		ids.add(s)
+		ids.add(t)
+	families = 0
+	done = set()
+	for i in sorted(ids):
+		if i in done:
+			continue
+		done |= refresh(conn, {i})
+		families += 1
+	return families
+
+
+@event.listens_for(Session, 'after_flush')
+def _sync(session, flush_context):
+	touched = set()
+	for obj in list(session.new) + list(session.deleted):
+		if isinstance(obj, MembroRelacionamento):
+			touched.update((obj.source_id, obj.target_id))
+	for obj in session.dirty:
+		if isinstance(obj, MembroRelacionamento) and session.is_modified(obj):
+			touched.update((obj.source_id, obj.target_id))
+			# pontas antigas também mudam de família
+			for attr in ('source_id', 'target_id'):
+				touched.update(get_history(obj, attr).deleted or ())
+	if touched:
+		refresh(session.connection(), touched)
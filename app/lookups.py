@@ -0,0 +1,104 @@
+from flask import current_app
+from sqlalchemy import event, exists, func, literal, select
+from sqlalchemy.orm import Session
+from .db import db
+from .models import Lookup, Membro
+from . import cache
+
+# tipo de cadastro -> coluna de membros de onde os valores vêm
+LOOKUP_COLUMNS = {
+	'concurso': 'concurso',
+	'cargo_efetivo': 'cargo_efetivo',
+	'titularidade': 'titularidade',
+	'cargo_especial': 'cargo_especial',
+	'unidade_lotacao': 'unidade_lotacao',
+	'comarca_lotacao': 'comarca_lotacao',
+	'time_extraprofissionais': 'time_extraprofissionais',
+	'estado_origem': 'estado_origem',
+	'grupos_identitarios': 'grupos_identitarios',
+}
+
+UF_LIST = ['AC','AL','AP','AM','BA','CE','DF','ES','GO','MA','MT','MS','MG','PA','PB','PR','PE','PI','RJ','RN','RS','RO','RR','SC','SP','SE','TO']
+
+_VALUE_MAX = Lookup.__table__.c.value.type.length
+
+
+def _insert_ignore(conn):
+	# a unicidade (type, value) segue a collation do banco; duplicados são ignorados por ele
+	stmt = Lookup.__table__.insert()
+	if conn.dialect.name == 'mysql':
+		return stmt.prefix_with('IGNORE')
+	if conn.dialect.name == 'sqlite':
+		return stmt.prefix_with('OR IGNORE')
+	return stmt
+
+
+def clean(value):
+	if value is None:
+		return None
+	value = str(value).strip()
+	if not value or len(value) > _VALUE_MAX:
+		return None
+	return value
+
+
+def values_of(obj) -> set:
+	"""Pares (tipo, valor) de cadastro presentes em um membro (objeto ou dict de colunas)."""
+	get = obj.get if isinstance(obj, dict) else (lambda k: getattr(obj, k, None))
+	out = set()
+	for type_, attr in LOOKUP_COLUMNS.items():
+		v = clean(get(attr))
+		if v:
+			out.add((type_, v))
+	return out
+
+
+def ensure(conn, pairs) -> int:
+	"""Insere os pares (tipo, valor) que ainda não existem; retorna quantos entraram."""
+	rows = [{'type': t, 'value': v} for t, v in sorted(pairs)]
+	if not rows:
+		return 0
+	return max(conn.execute(_insert_ignore(conn), rows).rowcount or 0, 0)
+
+
+def populate(conn) -> int:
+	"""Varredura completa: UFs padrão + INSERT ... SELECT DISTINCT por tipo. Retorna linhas inseridas."""
+	table = Lookup.__table__
+	# limite da coluna é em caracteres: LENGTH do MySQL conta bytes (acentos contam 2); o sqlite não tem CHAR_LENGTH
+	char_length = func.length if conn.dialect.name == 'sqlite' else func.char_length
+	inserted = conn.execute(_insert_ignore(conn), [{'type': 'estado_origem', 'value': uf} for uf in UF_LIST]).rowcount or 0
+	for type_, attr in LOOKUP_COLUMNS.items():
+		col = func.trim(getattr(Membro, attr))
+		already = exists().where(table.c.type == type_, table.c.value == col)
+		src = select(literal(type_), col).where(
+			col.isnot(None), col != '', char_length(col) <= _VALUE_MAX, ~already
+		).distinct()
+		inserted += conn.execute(_insert_ignore(conn).from_select(['type', 'value'], src)).rowcount or 0
+	return max(inserted, 0)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect(session, flush_context):
+	pending = session.info.setdefault('lookup_values', set())
+	for obj in list(session.new) + list(session.dirty):
+		if isinstance(obj, Membro) and (obj in session.new or session.is_modified(obj, include_collections=False)):
+			pending |= values_of(obj)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply(session):
+	pairs = session.info.pop('lookup_values', None)
+	if not pairs:
+		return
+	# fora da transação do membro: uma falha aqui não desfaz o cadastro
+	try:
+		with db.engine.begin() as conn:
+			if ensure(conn, pairs):
+				cache.bump_version('lookups', conn)
+	except Exception:
+		current_app.logger.exception('Falha ao gravar cadastros (%d valores)', len(pairs))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_pending(session):
+	session.info.pop('lookup_values', None)
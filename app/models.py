@@ -59,6 +59,9 @@ class Membro(db.Model):
 	observacao = db.Column(db.Text)
 	# nova: caminho relativo da foto dentro de static/ (ex.: uploads/membros/123/foto.jpg)
 	foto_path = db.Column(db.String(255))
+	# importação incremental: chave natural (sha1 de e-mail ou nome+concurso) e hash do conteúdo importado
+	import_key = db.Column(db.String(40), unique=True, index=True)
+	import_hash = db.Column(db.String(40))
 
 	amigos = db.relationship(
 		'Membro',
@@ -70,6 +73,15 @@ class Membro(db.Model):
 	)
 
 
+class MembroSearchToken(db.Model):
+	# índice de busca: tokens normalizados (sem acento, minúsculos) por campo de texto do membro
+	__tablename__ = 'membro_search_tokens'
+	membro_id = db.Column(MySQLBigInt(unsigned=True), db.ForeignKey('membros.id', ondelete='CASCADE'), primary_key=True)
+	field = db.Column(db.String(32), primary_key=True)
+	token = db.Column(db.String(64), primary_key=True, index=True)
+	weight = db.Column(db.Integer, nullable=False, default=1)
+
+
 class MembroRelacionamento(db.Model):
 	__tablename__ = 'membro_relacionamentos'
 	id = db.Column(MySQLBigInt(unsigned=True), primary_key=True)
@@ -80,6 +92,24 @@ class MembroRelacionamento(db.Model):
 	__table_args__ = (db.UniqueConstraint('source_id', 'target_id', 'degree', name='uq_rel_source_target_degree'),)
 
 
+class MembroParente(db.Model):
+	"""Fecho transitivo dos parentescos (mantido por app/kinship.py): uma linha por par e sentido."""
+	__tablename__ = 'membro_parentes'
+	membro_id = db.Column(MySQLBigInt(unsigned=True), db.ForeignKey('membros.id', ondelete='CASCADE'), primary_key=True)
+	parente_id = db.Column(MySQLBigInt(unsigned=True), db.ForeignKey('membros.id', ondelete='CASCADE'), primary_key=True)
+	# nº de saltos no menor caminho e relação do parente com o membro (direta ou inferida)
+	distancia = db.Column(db.Integer, nullable=False)
+	relacao = db.Column(db.String(32), nullable=False)
+	# menor id do componente de parentesco ("família")
+	familia_id = db.Column(MySQLBigInt(unsigned=True), nullable=False, index=True)
+
+
+class MembroFamilia(db.Model):
+	__tablename__ = 'membro_familias'
+	membro_id = db.Column(MySQLBigInt(unsigned=True), db.ForeignKey('membros.id', ondelete='CASCADE'), primary_key=True)
+	familia_id = db.Column(MySQLBigInt(unsigned=True), nullable=False, index=True)
+
+
 class Lookup(db.Model):
 	__tablename__ = 'lookups'
 	id = db.Column(MySQLBigInt(unsigned=True), primary_key=True)
@@ -88,6 +118,26 @@ class Lookup(db.Model):
 	__table_args__ = (db.UniqueConstraint('type', 'value', name='uq_lookups_type_value'),)
 
 
+class CacheVersion(db.Model):
+	"""Versão por escopo do cache de resultados (app/cache.py), compartilhada por todos os workers e pela CLI."""
+	__tablename__ = 'cache_versions'
+	scope = db.Column(db.String(32), primary_key=True)
+	version = db.Column(MySQLBigInt(unsigned=True), nullable=False, default=0)
+
+
+class Municipio(db.Model):
+	"""Índice local de municípios (importado de GeoJSON do IBGE por `flask import-municipios`)."""
+	__tablename__ = 'municipios'
+	codigo = db.Column(db.Integer, primary_key=True, autoincrement=False)
+	nome = db.Column(db.String(255), nullable=False)
+	# nome sem acento/pontuação, minúsculo (ver geo.name_key)
+	nome_norm = db.Column(db.String(255), nullable=False, index=True)
+	uf = db.Column(db.String(2), nullable=False, index=True)
+	# centróide (média ponderada por área dos anéis externos)
+	lat = db.Column(db.Float)
+	lon = db.Column(db.Float)
+
+
 class MembroHistorico(db.Model):
 	__tablename__ = 'membro_historico'
 	id = db.Column(MySQLBigInt(unsigned=True), primary_key=True)
@@ -0,0 +1,153 @@
+from PIL import Image, ImageOps
+import glob
+import hashlib
+import os
+import uuid
+
+STATIC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), 'static'))
+UPLOAD_DIR = os.path.join(STATIC_DIR, 'uploads', 'membros')
+
+# tamanho -> (lado em px, recorte quadrado); grade e modal exibem 28 e 96 px (2x para telas densas)
+SIZES = {
+	'thumb': (64, True),
+	'modal': (192, True),
+	# PDF: 30 mm a 300 dpi, proporção original
+	'pdf': (354, False),
+}
+# extensão -> (formato do Pillow, opções); WebP para o navegador, JPEG como alternativa e para o PDF
+FORMATS = {
+	'webp': ('WEBP', {'quality': 80, 'method': 6}),
+	'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+ALLOWED_EXTS = ('.jpg', '.jpeg', '.png', '.webp')
+
+
+def is_processed(foto_path) -> bool:
+	# derivados gravam em foto_path a base sem extensão (uploads/membros/<id>/foto-<hash>);
+	# fotos antigas ainda apontam para o arquivo original (foto.jpg)
+	return bool(foto_path) and not os.path.splitext(foto_path)[1]
+
+
+def urls(foto_path):
+	"""{tamanho: {formato: URL}} dos derivados; None para foto ainda não processada."""
+	if not is_processed(foto_path):
+		return None
+	base = '/static/' + foto_path.lstrip('/')
+	return { size: { ext: f'{base}-{size}.{ext}' for ext in FORMATS } for size in SIZES }
+
+
+def url(foto_path, size='modal', ext='jpg'):
+	if not foto_path:
+		return None
+	if not is_processed(foto_path):
+		return '/static/' + foto_path.lstrip('/')
+	return f"/static/{foto_path.lstrip('/')}-{size}.{ext}"
+
+
+def file_path(foto_path, size='pdf', ext='jpg'):
+	"""Caminho absoluto do derivado (ou do original, para foto não processada)."""
+	if not foto_path:
+		return None
+	path = os.path.abspath(os.path.join(STATIC_DIR, foto_path))
+	return f'{path}-{size}.{ext}' if is_processed(foto_path) else path
+
+
+def original_path(member_id):
+	"""Arquivo original guardado para o membro (upload novo ou foto antiga), se houver."""
+	member_dir = os.path.join(UPLOAD_DIR, str(member_id))
+	for pattern in ('original.*', 'foto.*'):
+		for path in sorted(glob.glob(os.path.join(member_dir, pattern))):
+			if os.path.splitext(path)[1].lower() in ALLOWED_EXTS:
+				return path
+	return None
+
+
+def _load(src):
+	img = Image.open(src)
+	# JPEG grande: decodifica já reduzido (escala DCT), bem mais rápido que abrir em tamanho cheio
+	big = max(side for side, _ in SIZES.values()) * 2
+	img.draft('RGB', (big, big))
+	img = ImageOps.exif_transpose(img)
+	if img.mode in ('RGBA', 'LA', 'P'):
+		img = img.convert('RGBA')
+		bg = Image.new('RGB', img.size, (255, 255, 255))
+		bg.paste(img, mask=img.getchannel('A'))
+		return bg
+	return img.convert('RGB')
+
+
+def _resize(img, side, square):
+	if square:
+		return ImageOps.fit(img, (side, side), Image.LANCZOS)
+	out = img.copy()
+	out.thumbnail((side, side), Image.LANCZOS)
+	return out
+
+
+def process(member_id, src) -> str:
+	"""Gera os derivados (SIZES x FORMATS) a partir de src; retorna o novo foto_path (base sem extensão).
+
+	Não apaga nada: os derivados anteriores só saem com prune(), depois do commit do novo foto_path.
+	Função de módulo, sem contexto de aplicação: roda também em processos do pool (flask build-photos).
+	"""
+	with open(src, 'rb') as f:
+		token = hashlib.sha1(f.read()).hexdigest()[:10]
+	img = _load(src)
+	member_dir = os.path.join(UPLOAD_DIR, str(member_id))
+	os.makedirs(member_dir, exist_ok=True)
+	base = f'foto-{token}'
+	for size, (side, square) in SIZES.items():
+		out = _resize(img, side, square)
+		for ext, (fmt, opts) in FORMATS.items():
+			out.save(os.path.join(member_dir, f'{base}-{size}.{ext}'), fmt, **opts)
+	return os.path.relpath(os.path.join(member_dir, base), STATIC_DIR).replace('\\', '/')
+
+
+def _derivatives(member_id):
+	return glob.glob(os.path.join(UPLOAD_DIR, str(member_id), 'foto-*-*.*'))
+
+
+def _remove(paths) -> None:
+	for path in paths:
+		try:
+			os.remove(path)
+		except OSError:
+			pass
+
+
+def prune(member_id, foto_path) -> None:
+	"""Apaga os derivados que não são de foto_path (chamar só depois do commit que o gravou)."""
+	prefix = os.path.basename(foto_path) + '-' if is_processed(foto_path) else None
+	_remove(p for p in _derivatives(member_id) if not (prefix and os.path.basename(p).startswith(prefix)))
+
+
+def store_upload(member_id, file, ext):
+	"""Guarda o upload com nome único e gera os derivados; retorna (arquivo do upload, novo foto_path).
+
+	A foto atual fica intacta até finish_upload; uploads simultâneos do mesmo membro não se sobrescrevem.
+	"""
+	member_dir = os.path.join(UPLOAD_DIR, str(member_id))
+	os.makedirs(member_dir, exist_ok=True)
+	tmp = os.path.join(member_dir, f'upload-{uuid.uuid4().hex}{ext}')
+	file.save(tmp)
+	try:
+		return tmp, process(member_id, tmp)
+	except Exception:
+		os.remove(tmp)
+		raise
+
+
+def finish_upload(member_id, tmp, foto_path) -> None:
+	"""Depois do commit: o upload vira original.<ext> e saem o original e os derivados anteriores."""
+	member_dir = os.path.join(UPLOAD_DIR, str(member_id))
+	_remove(glob.glob(os.path.join(member_dir, 'original.*')) + glob.glob(os.path.join(member_dir, 'foto.*')))
+	os.replace(tmp, os.path.join(member_dir, 'original' + os.path.splitext(tmp)[1]))
+	prune(member_id, foto_path)
+
+
+def discard_upload(member_id, tmp, foto_path, current) -> None:
+	"""Commit falhou: apaga o upload e os derivados novos (a menos que sejam os da foto atual)."""
+	_remove([tmp])
+	if foto_path != current:
+		prefix = os.path.basename(foto_path) + '-'
+		_remove(p for p in _derivatives(member_id) if os.path.basename(p).startswith(prefix))
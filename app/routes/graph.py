@@ -0,0 +1,97 @@
+from flask import Blueprint, request
+from flask_jwt_extended import jwt_required
+from ..db import db
+from ..models import Membro
+from ..cache import with_etag
+from .. import graph
+
+bp = Blueprint('graph', __name__)
+
+ALLOWED_KINDS = {'amigos', 'parentesco', 'todos'}
+
+
+def _kind(default='amigos'):
+	kind = (request.args.get('kind') or default).strip().lower()
+	return kind if kind in ALLOWED_KINDS else None
+
+
+def _names(ids):
+	ids = list(ids)
+	if not ids:
+		return {}
+	return { i: n for i, n in db.session.query(Membro.id, Membro.nome).filter(Membro.id.in_(ids)).all() }
+
+
+def _limit(default=20, maximum=500):
+	return max(1, min(request.args.get('limit', default, type=int) or default, maximum))
+
+
+@bp.get('/graph/degree')
+@jwt_required()
+@with_etag(graph.SCOPE, 'nomes')
+def degree_centrality():
+	# ?id= grau de um membro; sem id, ranking dos mais conectados
+	kind = _kind()
+	if not kind:
+		return {'message': 'kind inválido'}, 400
+	# nº de nós do próprio instantâneo do grafo: sem COUNT no banco a cada chamada
+	total = graph.node_count()
+	norm = (total - 1) if total > 1 else 1
+	id_ = request.args.get('id', type=int)
+	if id_:
+		d = graph.degree(id_, kind)
+		return {'id': id_, 'nome': _names([id_]).get(id_), 'degree': d, 'centrality': round(d / norm, 6)}
+	top = graph.top_degree(kind, _limit())
+	names = _names(i for i, _ in top)
+	return {'data': [{'id': i, 'nome': names.get(i), 'degree': d, 'centrality': round(d / norm, 6)} for i, d in top]}
+
+
+@bp.get('/graph/components')
+@jwt_required()
+@with_etag(graph.SCOPE, 'nomes')
+def connected_components():
+	kind = _kind()
+	if not kind:
+		return {'message': 'kind inválido'}, 400
+	out = graph.components(kind, _limit(), request.args.get('id', type=int), _limit(100, 5000) if request.args.get('id') else 100)
+	if 'component' in out:
+		names = _names(out['component']['ids'])
+		out['component']['members'] = [{'id': i, 'nome': names.get(i)} for i in out['component'].pop('ids')]
+	return out
+
+
+@bp.get('/graph/path')
+@jwt_required()
+@with_etag(graph.SCOPE, 'nomes')
+def shortest_path():
+	kind = _kind('todos')
+	source = request.args.get('source', type=int)
+	target = request.args.get('target', type=int)
+	if not kind or not source or not target:
+		return {'message': 'Informe source, target e kind válidos'}, 400
+	max_depth = max(1, min(request.args.get('max_depth', 8, type=int) or 8, 12))
+	path = graph.shortest_path(source, target, kind, max_depth)
+	if path is None:
+		return {'found': False, 'path': [], 'length': None}
+	names = _names(path)
+	return {'found': True, 'length': len(path) - 1, 'path': [{'id': i, 'nome': names.get(i)} for i in path]}
+
+
+@bp.get('/graph/mutual')
+@jwt_required()
+@with_etag(graph.SCOPE, 'nomes')
+def mutual_friends():
+	kind = _kind()
+	a = request.args.get('a', type=int)
+	b = request.args.get('b', type=int)
+	if not kind or not a or not b:
+		return {'message': 'Informe a, b e kind válidos'}, 400
+	ids = graph.mutual(a, b, kind)
+	names = _names(ids)
+	return {'total': len(ids), 'data': [{'id': i, 'nome': names.get(i)} for i in ids]}
+
+
+@bp.get('/graph/stats')
+@jwt_required()
+def graph_stats():
+	return graph.stats()
@@ -1,24 +1,13 @@
 from flask import Blueprint, request
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from sqlalchemy import func
 from ..db import db
-from ..models import Lookup, Membro
+from ..models import Lookup
+from ..cache import bump_version, get_or_set, with_etag
+from ..lookups import LOOKUP_COLUMNS, UF_LIST, populate
 
 bp = Blueprint('lookups', __name__)
 
-ALLOWED_TYPES = {
-	'concurso',
-	'cargo_efetivo',
-	'titularidade',
-	'cargo_especial',
-	'unidade_lotacao',
-	'comarca_lotacao',
-	'time_extraprofissionais',
-	'estado_origem',
-	'grupos_identitarios',
-}
-
-UF_LIST = ['AC','AL','AP','AM','BA','CE','DF','ES','GO','MA','MT','MS','MG','PA','PB','PR','PE','PI','RJ','RN','RS','RO','RR','SC','SP','SE','TO']
+ALLOWED_TYPES = set(LOOKUP_COLUMNS)
 
 
 def is_admin_identity():
@@ -28,6 +17,7 @@ def is_admin_identity():
 
 @bp.get('/lookups')
 @jwt_required()
+@with_etag('lookups')
 def list_lookups():
 	type_ = (request.args.get('type') or '').strip().lower()
 	if type_ not in ALLOWED_TYPES:
@@ -48,6 +38,23 @@ def list_lookups():
 	return {'data': data, 'total': p.total}
 
 
+@bp.get('/lookups/all')
+@jwt_required()
+@with_etag('lookups')
+def all_lookups():
+	"""Todos os tipos numa resposta: {tipo: [valores]}; cache invalidado por qualquer gravação em lookups."""
+	def compute():
+		out = { t: [] for t in sorted(ALLOWED_TYPES) }
+		rows = db.session.query(Lookup.type, Lookup.value).filter(Lookup.type.in_(ALLOWED_TYPES)).order_by(Lookup.type.asc(), Lookup.value.asc()).all()
+		for t, v in rows:
+			out[t].append(v)
+		# mesmo padrão da listagem: UFs quando não há cadastro de estado_origem
+		if not out['estado_origem']:
+			out['estado_origem'] = list(UF_LIST)
+		return out
+	return {'data': get_or_set('lookups_all', (), compute, scope='lookups')}
+
+
 @bp.post('/lookups')
 @jwt_required()
 def create_lookup():
@@ -101,35 +108,11 @@ def delete_lookup(id: int):
 @bp.post('/lookups/populate-from-membros')
 @jwt_required()
 def populate_from_membros():
+	"""Varredura completa (ação administrativa); o dia a dia é mantido pelos eventos em app/lookups.py."""
 	if not is_admin_identity():
 		return {'message': 'Apenas administradores.'}, 403
-	# map: lookup type -> column
-	mapping = {
-		'concurso': Membro.concurso,
-		'cargo_efetivo': Membro.cargo_efetivo,
-		'titularidade': Membro.titularidade,
-		'cargo_especial': Membro.cargo_especial,
-		'unidade_lotacao': Membro.unidade_lotacao,
-		'comarca_lotacao': Membro.comarca_lotacao,
-		'time_extraprofissionais': Membro.time_extraprofissionais,
-		'estado_origem': Membro.estado_origem,
-		'grupos_identitarios': Membro.grupos_identitarios,
-	}
-	inserted = 0
-	# Inserir UFs padrão para estado_origem
-	for uf in UF_LIST:
-		if not Lookup.query.filter_by(type='estado_origem', value=uf).first():
-			db.session.add(Lookup(type='estado_origem', value=uf))
-			inserted += 1
-	# Popular demais tipos a partir dos membros
-	for t, col in mapping.items():
-		vals = [r[0] for r in db.session.query(col).filter(col.isnot(None)).distinct().all()]
-		for v in vals:
-			v = str(v).strip()
-			if not v:
-				continue
-			if not Lookup.query.filter_by(type=t, value=v).first():
-				db.session.add(Lookup(type=t, value=v))
-				inserted += 1
+	inserted = populate(db.session.connection())
+	if inserted:
+		bump_version('lookups', db.session.connection())
 	db.session.commit()
-	return {'inserted': inserted} 
\ No newline at end of file
+	return {'inserted': inserted}
@@ -1,10 +1,17 @@
-from flask import Blueprint, request
+from flask import Blueprint, Response, request, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from sqlalchemy import func
+from sqlalchemy import func, cast, literal, select, union_all, String
+from sqlalchemy.orm import load_only
 from ..db import db
-from ..models import Membro, MembroHistorico, MembroRelacionamento
+from ..models import Membro, MembroHistorico, membro_amigos
+from ..cache import cached_total, data_version, get_or_set, with_etag
+from .. import geo, photos, search, typeahead
+from .relationships import member_relationships
 import json
 import re
+import base64
+import csv
+import tempfile
 from datetime import datetime
 from io import BytesIO
 from flask import send_file
@@ -16,6 +23,8 @@ from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, Tabl
 from reportlab.lib import colors
 import os
 from werkzeug.utils import secure_filename
+from PIL.Image import DecompressionBombError
+from PIL import UnidentifiedImageError
 
 bp = Blueprint('membros', __name__)
 
@@ -47,13 +56,15 @@ def label_to_column(label: str):
 	return m.get((label or '').strip())
 
 
-def apply_filters(query):
+def apply_filters(query, exclude=None):
 	q = (request.args.get('q') or '').strip()
 	if q:
-		like = f"%{q}%"
-		query = query.filter(
-			(Membro.nome.ilike(like)) | (Membro.comarca_lotacao.ilike(like)) | (Membro.cargo_efetivo.ilike(like))
-		)
+		# busca por prefixo de palavra, sem acento, no índice membro_search_tokens
+		query = search.filter_query(query, q)
+	return apply_column_filters(query, exclude)
+
+
+def apply_column_filters(query, exclude=None):
 	# filtros por coluna vindos do front
 	filters_json = request.args.get('filters_json')
 	if filters_json:
@@ -61,7 +72,7 @@ def apply_filters(query):
 			filters = json.loads(filters_json)
 			if isinstance(filters, dict):
 				for label, values in filters.items():
-					if not values:
+					if not values or label == exclude:
 						continue
 					col = label_to_column(label)
 					if not col:
@@ -76,57 +87,313 @@ def apply_filters(query):
 	return query
 
 
-def to_row(m: Membro):
-	amigos = list(m.amigos)  # pode consultar
-	# montar URL da foto (se houver) servida via /static
-	foto_url = None
-	if m.foto_path:
-		foto_url = f"/static/{m.foto_path.lstrip('/')}"
+def filter_signature():
+	"""Chave canônica dos filtros da requisição (q + filters_json), usada em caches."""
+	q = (request.args.get('q') or '').strip().lower()
+	filters_json = request.args.get('filters_json') or ''
+	try:
+		filters = json.loads(filters_json) if filters_json else {}
+		canon = json.dumps(filters, sort_keys=True, ensure_ascii=False) if filters else ''
+	except Exception:
+		canon = ''
+	return (q, canon)
+
+
+def encode_cursor(nome, id_):
+	raw = json.dumps([nome, id_], ensure_ascii=False).encode('utf-8')
+	return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: str):
+	pad = '=' * (-len(token) % 4)
+	nome, id_ = json.loads(base64.urlsafe_b64decode(token + pad).decode('utf-8'))
+	return nome, int(id_)
+
+
+def seek_after(query, nome, id_):
+	# ordem (nome, id) com NULLs primeiro, como o ORDER BY nome ASC do MySQL
+	if nome is None:
+		return query.filter((Membro.nome.isnot(None)) | ((Membro.nome.is_(None)) & (Membro.id > id_)))
+	return query.filter((Membro.nome > nome) | ((Membro.nome == nome) & (Membro.id > id_)))
+
+
+def load_amigos(ids, conn=None):
+	"""Carrega (id, nome) dos amigos de vários membros numa única consulta.
+
+	Retorna dict membro_id -> lista de linhas com .id e .nome, para ser passado
+	ao to_row e evitar uma consulta por linha na listagem. `conn` permite usar
+	outra conexão (ex.: enquanto a da sessão está ocupada com um cursor de streaming).
+	"""
+	out = { i: [] for i in ids }
+	if not ids:
+		return out
+	stmt = select(
+		membro_amigos.c.membro_id.label('membro_id'),
+		Membro.id.label('id'),
+		Membro.nome.label('nome'),
+	).join(Membro, Membro.id == membro_amigos.c.amigo_id).where(membro_amigos.c.membro_id.in_(ids)).order_by(membro_amigos.c.membro_id.asc(), Membro.id.asc())
+	rows = (conn or db.session).execute(stmt)
+	for r in rows:
+		out.setdefault(r.membro_id, []).append(r)
+	return out
+
+
+# rótulo -> atributo do modelo, na ordem da resposta
+ROW_FIELDS = [
+	('Membro', 'nome'),
+	('Foto URL', 'foto_path'),
+	('Fotos', 'foto_path'),
+	('Sexo', 'sexo'),
+	('Concurso', 'concurso'),
+	('Cargo efetivo', 'cargo_efetivo'),
+	('Titularidade', 'titularidade'),
+	('eMail pessoal', 'email_pessoal'),
+	('Cargo Especial', 'cargo_especial'),
+	('Telefone Unidade', 'telefone_unidade'),
+	('Telefone celular', 'telefone_celular'),
+	('Unidade Lotação', 'unidade_lotacao'),
+	('Comarca Lotação', 'comarca_lotacao'),
+	('Time de futebol e outros grupos extraprofissionais', 'time_extraprofissionais'),
+	('Quantidade de filhos', 'quantidade_filhos'),
+	('Nome dos filhos', 'nomes_filhos'),
+	('Estado de origem', 'estado_origem'),
+	('Acadêmico', 'academico'),
+	('Pretensão de movimentação na carreira', 'pretensao_carreira'),
+	('Carreira anterior', 'carreira_anterior'),
+	('Liderança', 'lideranca'),
+	('Grupos identitários', 'grupos_identitarios'),
+	('Data de inclusão', 'data_inclusao'),
+	('Observação', 'observacao'),
+	('Amigos no MP (IDs)', None),
+	('Amigos no MP (Nomes)', None),
+]
+ROW_LABELS = [label for label, _ in ROW_FIELDS]
+AMIGOS_LABELS = ('Amigos no MP (IDs)', 'Amigos no MP (Nomes)')
+
+
+def parse_fields():
+	"""Rótulos pedidos em ?fields= (lista JSON ou separada por vírgula); None = todos."""
+	raw = (request.args.get('fields') or '').strip()
+	if not raw:
+		return None
+	try:
+		wanted = json.loads(raw) if raw.startswith('[') else [f.strip() for f in raw.split(',')]
+	except Exception:
+		raise ValueError('fields inválido')
+	known = set(ROW_LABELS)
+	unknown = [f for f in wanted if f and f not in known]
+	if unknown:
+		raise ValueError('Campos desconhecidos: ' + ', '.join(unknown))
+	wanted = set(wanted)
+	return [label for label in ROW_LABELS if label in wanted]
+
+
+def with_fields(query, labels):
+	"""Restringe o SELECT às colunas dos rótulos pedidos (id e nome sempre, por causa da ordenação)."""
+	if labels is None:
+		return query
+	attrs = dict(ROW_FIELDS)
+	cols = [Membro.id, Membro.nome]
+	for label in labels:
+		attr = attrs.get(label)
+		if attr and attr != 'nome':
+			cols.append(getattr(Membro, attr))
+	return query.options(load_only(*cols))
+
+
+def field_value(m: Membro, label: str, attr, amigos):
+	if label == 'Foto URL':
+		# URL da foto (tamanho do modal) servida via /static
+		return photos.url(m.foto_path)
+	if label == 'Fotos':
+		# {tamanho: {webp, jpg}}; None enquanto a foto não tiver derivados (flask build-photos)
+		return photos.urls(m.foto_path)
+	if label == 'Data de inclusão':
+		return m.data_inclusao.isoformat() if m.data_inclusao else None
+	if label == 'Amigos no MP (IDs)':
+		return [a.id for a in amigos]
+	if label == 'Amigos no MP (Nomes)':
+		return [a.nome for a in amigos]
+	return getattr(m, attr)
+
+
+def to_row(m: Membro, amigos=None, labels=None):
+	fields = ROW_FIELDS if labels is None else [(label, dict(ROW_FIELDS)[label]) for label in labels]
+	if amigos is None and any(label in AMIGOS_LABELS for label, _ in fields):
+		amigos = list(m.amigos)  # pode consultar
 	return {
 		'id': m.id,
-		'data': {
-			'Membro': m.nome,
-			'Foto URL': foto_url,
-			'Sexo': m.sexo,
-			'Concurso': m.concurso,
-			'Cargo efetivo': m.cargo_efetivo,
-			'Titularidade': m.titularidade,
-			'eMail pessoal': m.email_pessoal,
-			'Cargo Especial': m.cargo_especial,
-			'Telefone Unidade': m.telefone_unidade,
-			'Telefone celular': m.telefone_celular,
-			'Unidade Lotação': m.unidade_lotacao,
-			'Comarca Lotação': m.comarca_lotacao,
-			'Time de futebol e outros grupos extraprofissionais': m.time_extraprofissionais,
-			'Quantidade de filhos': m.quantidade_filhos,
-			'Nome dos filhos': m.nomes_filhos,
-			'Estado de origem': m.estado_origem,
-			'Acadêmico': m.academico,
-			'Pretensão de movimentação na carreira': m.pretensao_carreira,
-			'Carreira anterior': m.carreira_anterior,
-			'Liderança': m.lideranca,
-			'Grupos identitários': m.grupos_identitarios,
-			'Data de inclusão': (m.data_inclusao.isoformat() if m.data_inclusao else None),
-			'Observação': m.observacao,
-			'Amigos no MP (IDs)': [a.id for a in amigos],
-			'Amigos no MP (Nomes)': [a.nome for a in amigos],
-		}
+		'data': {label: field_value(m, label, attr, amigos) for label, attr in fields},
+	}
+
+
+def render_rows(items, labels, columnar: bool):
+	"""Linhas da listagem; amigos só são carregados se algum rótulo de amigos foi pedido."""
+	need_amigos = labels is None or any(label in AMIGOS_LABELS for label in labels)
+	amigos_map = load_amigos([m.id for m in items]) if need_amigos else {}
+	rows = [to_row(m, amigos_map.get(m.id, []), labels) for m in items]
+	if not columnar:
+		return {'data': rows}
+	# formato compacto: um cabeçalho e uma lista de valores por membro
+	header = labels if labels is not None else ROW_LABELS
+	return {
+		'columns': ['id'] + header,
+		'rows': [[r['id']] + [r['data'][label] for label in header] for r in rows],
 	}
 
 
 @bp.get('/membros')
 @jwt_required()
+@with_etag('membros')
 def list_membros():
+	try:
+		labels = parse_fields()
+	except ValueError as e:
+		return {'message': str(e)}, 400
+	columnar = request.args.get('format') == 'columns'
 	query = apply_filters(Membro.query)
-	page = int(request.args.get('page', 1))
 	per_page = int(request.args.get('per_page', 20))
-	p = query.order_by(Membro.nome.asc(), Membro.id.asc()).paginate(page=page, per_page=per_page, error_out=False)
-	data = [to_row(m) for m in p.items]
-	return {'data': data, 'total': p.total}
+	if 'cursor' in request.args:
+		# modo keyset: ?cursor= (vazio na primeira página) e next_cursor na resposta
+		token = (request.args.get('cursor') or '').strip()
+		total = cached_total(filter_signature(), query.count)
+		page_query = query
+		if token:
+			try:
+				nome, last_id = decode_cursor(token)
+			except Exception:
+				return {'message': 'Cursor inválido'}, 400
+			page_query = seek_after(page_query, nome, last_id)
+		page_query = with_fields(page_query, labels)
+		items = page_query.order_by(Membro.nome.asc(), Membro.id.asc()).limit(per_page + 1).all()
+		has_more = len(items) > per_page
+		items = items[:per_page]
+		next_cursor = encode_cursor(items[-1].nome, items[-1].id) if (has_more and items) else None
+		out = render_rows(items, labels, columnar)
+		out.update({'total': total, 'next_cursor': next_cursor})
+		return out
+	page = int(request.args.get('page', 1))
+	p = with_fields(query, labels).order_by(Membro.nome.asc(), Membro.id.asc()).paginate(page=page, per_page=per_page, error_out=False)
+	out = render_rows(p.items, labels, columnar)
+	out['total'] = p.total
+	return out
+
+
+EXPORT_BATCH = 500
+EXPORT_FORMATS = {
+	'csv': 'text/csv; charset=utf-8',
+	'ndjson': 'application/x-ndjson',
+	'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def export_batches(query, labels):
+	"""Gera listas de linhas (to_row) em lotes, lendo o resultado com cursor no servidor."""
+	need_amigos = labels is None or any(label in AMIGOS_LABELS for label in labels)
+	query = with_fields(query, labels).order_by(Membro.nome.asc(), Membro.id.asc()).yield_per(EXPORT_BATCH)
+	# a conexão da sessão fica presa ao cursor de streaming; amigos vêm por outra conexão
+	with db.engine.connect() as conn:
+		batch = []
+		for m in query:
+			batch.append(m)
+			if len(batch) >= EXPORT_BATCH:
+				amigos_map = load_amigos([b.id for b in batch], conn) if need_amigos else {}
+				yield [to_row(b, amigos_map.get(b.id, []), labels) for b in batch]
+				batch = []
+		if batch:
+			amigos_map = load_amigos([b.id for b in batch], conn) if need_amigos else {}
+			yield [to_row(b, amigos_map.get(b.id, []), labels) for b in batch]
+
+
+def _flat(value):
+	# planilhas não têm listas: amigos viram texto separado por "; "
+	if isinstance(value, list):
+		return '; '.join(str(v) for v in value)
+	if isinstance(value, dict):
+		return json.dumps(value, ensure_ascii=False)
+	return value
+
+
+class _LineBuffer:
+	"""Destino para csv.writer que devolve o texto escrito."""
+
+	def write(self, value):
+		return value
+
+
+def _export_csv(batches, header):
+	writer = csv.writer(_LineBuffer())
+	yield '\ufeff' + writer.writerow(['id'] + header)
+	for rows in batches:
+		yield ''.join(writer.writerow([r['id']] + [_flat(r['data'][h]) for h in header]) for r in rows)
+
+
+def _export_ndjson(batches, header):
+	for rows in batches:
+		yield ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in rows)
+
+
+def _export_xlsx(batches, header):
+	from openpyxl import Workbook
+	# write_only grava as linhas direto em disco; o arquivo final é enviado em blocos
+	wb = Workbook(write_only=True)
+	ws = wb.create_sheet('Membros')
+	ws.append(['id'] + header)
+	for rows in batches:
+		for r in rows:
+			ws.append([r['id']] + [_flat(r['data'][h]) for h in header])
+	with tempfile.TemporaryFile() as tmp:
+		wb.save(tmp)
+		tmp.seek(0)
+		while True:
+			chunk = tmp.read(64 * 1024)
+			if not chunk:
+				break
+			yield chunk
+
+
+@bp.get('/membros/export')
+@jwt_required()
+def export_membros():
+	fmt = (request.args.get('format') or 'csv').lower()
+	if fmt not in EXPORT_FORMATS:
+		return {'message': 'Formato inválido (use csv, ndjson ou xlsx)'}, 400
+	try:
+		labels = parse_fields()
+	except ValueError as e:
+		return {'message': str(e)}, 400
+	header = labels if labels is not None else ROW_LABELS
+	batches = export_batches(apply_filters(Membro.query), labels)
+	body = {'csv': _export_csv, 'ndjson': _export_ndjson, 'xlsx': _export_xlsx}[fmt](batches, header)
+	filename = f"membros_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+	return Response(
+		stream_with_context(body),
+		content_type=EXPORT_FORMATS[fmt],
+		headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+	)
+
+
+@bp.get('/membros/graph')
+@jwt_required()
+@with_etag('membros')
+def graph_membros():
+	# grafo de amizades compacto: só id/nome/comarca dos nós e pares (membro_id, amigo_id)
+	query = apply_filters(Membro.query)
+	nodes = [
+		{'id': r.id, 'nome': r.nome, 'comarca': r.comarca_lotacao}
+		for r in query.with_entities(Membro.id, Membro.nome, Membro.comarca_lotacao).order_by(Membro.id.asc()).all()
+	]
+	edges_q = db.session.query(membro_amigos.c.membro_id, membro_amigos.c.amigo_id)
+	if query.whereclause is not None:
+		ids = query.with_entities(Membro.id)
+		edges_q = edges_q.filter(membro_amigos.c.membro_id.in_(ids), membro_amigos.c.amigo_id.in_(ids))
+	edges = [[r[0], r[1]] for r in edges_q.all()]
+	return {'nodes': nodes, 'edges': edges}
 
 
 @bp.get('/membros/<int:id>')
 @jwt_required()
+@with_etag('membros')
 def get_membro(id: int):
 	m = Membro.query.get_or_404(id)
 	return to_row(m)
@@ -134,62 +401,162 @@ def get_membro(id: int):
 
 @bp.get('/membros/aggregate')
 @jwt_required()
+@with_etag('membros')
 def aggregate_membros():
 	field = (request.args.get('field') or '').strip()
 	col = label_to_column(field)
 	if not col:
 		return {'field': field, 'data': []}
-	query = apply_filters(Membro.query)
-	rows = query.with_entities(col.label('v'), func.count(Membro.id).label('c')).group_by(col).order_by(func.count(Membro.id).desc()).limit(int(request.args.get('limit', 50))).all()
-	data = [ {'v': r.v, 'c': int(r.c)} for r in rows if r.v ]
-	return {'field': field, 'data': data}
+	limit = int(request.args.get('limit', 50))
+
+	def compute():
+		query = apply_filters(Membro.query)
+		rows = query.with_entities(col.label('v'), func.count(Membro.id).label('c')).group_by(col).order_by(func.count(Membro.id).desc()).limit(limit).all()
+		data = [ {'v': r.v, 'c': int(r.c)} for r in rows if r.v ]
+		return {'field': field, 'data': data}
+	return get_or_set('aggregate', (filter_signature(), field, limit), compute)
+
+
+@bp.get('/membros/geo')
+@jwt_required()
+@with_etag('membros', geo.SCOPE)
+def geo_membros():
+	# contagem por comarca (com os filtros da tabela) já casada com o município do IBGE e seu centróide:
+	# linhas [código, nome, lat, lon, qtd] no lugar do GeoJSON inteiro no navegador
+	uf = (request.args.get('uf') or geo.DEFAULT_UF).strip().upper()
+
+	def compute():
+		rows = apply_filters(Membro.query).with_entities(Membro.comarca_lotacao, func.count(Membro.id)).filter(
+			Membro.comarca_lotacao.isnot(None)
+		).group_by(Membro.comarca_lotacao).all()
+		counts = {}
+		unmatched = 0
+		for comarca, c in rows:
+			entry = geo.find(comarca, uf)
+			if entry:
+				counts[entry['codigo']] = counts.get(entry['codigo'], 0) + int(c)
+			else:
+				unmatched += int(c)
+		data = []
+		for code, c in sorted(counts.items(), key=lambda kv: -kv[1]):
+			entry = geo.get(code)
+			data.append([code, entry['nome'], entry['lat'], entry['lon'], c])
+		return {'columns': ['code', 'name', 'lat', 'lon', 'count'], 'rows': data, 'unmatched': unmatched}
+	# casamento com os municípios muda com `flask import-municipios`: a versão deles entra na chave
+	return get_or_set('geo', (filter_signature(), uf, data_version(geo.SCOPE)), compute)
+
+
+def _numeric_type(col):
+	try:
+		py = col.type.python_type
+	except NotImplementedError:
+		return None
+	return py if py in (int, float) else None
+
+
+@bp.get('/membros/facets')
+@jwt_required()
+@with_etag('membros')
+def facets_membros():
+	# contagens valor -> quantidade de vários campos numa única consulta (UNION ALL)
+	raw = (request.args.get('fields') or '').strip()
+	try:
+		labels = json.loads(raw) if raw.startswith('[') else raw.split(',')
+	except Exception:
+		labels = []
+	labels = [str(l).strip() for l in labels if label_to_column(str(l))]
+	labels = list(dict.fromkeys(labels))
+	if not labels:
+		return {'facets': {}}
+	limit = int(request.args.get('limit', 200))
+	# exclude_self=1: cada faceta ignora o próprio filtro de coluna (busca facetada)
+	exclude_self = request.args.get('exclude_self') in ('1', 'true')
+
+	def compute():
+		parts = []
+		for label in labels:
+			col = label_to_column(label)
+			query = apply_filters(Membro.query, exclude=label if exclude_self else None)
+			parts.append(
+				query.with_entities(literal(label).label('f'), cast(col, String).label('v'), func.count(Membro.id).label('c'))
+				.filter(col.isnot(None)).group_by(col).statement
+			)
+		rows = db.session.execute(union_all(*parts)).all()
+		# o UNION ALL traz todo valor como texto: campos numéricos voltam ao tipo da coluna
+		casts = {label: _numeric_type(label_to_column(label)) for label in labels}
+		facets = {label: [] for label in labels}
+		for r in rows:
+			if r.v not in (None, ''):
+				to_type = casts[r.f]
+				facets[r.f].append({'v': to_type(r.v) if to_type else r.v, 'c': int(r.c)})
+		for label, items in facets.items():
+			items.sort(key=lambda it: (-it['c'], it['v']))
+			if limit > 0:
+				del items[limit:]
+		return {'facets': facets}
+	return get_or_set('facets', (filter_signature(), tuple(labels), limit, exclude_self), compute)
 
 
 @bp.get('/membros/distinct')
 @jwt_required()
+@with_etag('membros')
 def distinct_membros():
 	field = (request.args.get('field') or '').strip()
 	limit = int(request.args.get('limit', 200))
 	col = label_to_column(field)
 	if not col:
 		return {'field': field, 'values': []}
-	query = apply_filters(Membro.query)
-	vals = [r[0] for r in query.with_entities(col).filter(col.isnot(None)).distinct().order_by(col.asc()).limit(limit).all()]
-	return {'field': field, 'values': vals}
+
+	def compute():
+		query = apply_filters(Membro.query)
+		vals = [r[0] for r in query.with_entities(col).filter(col.isnot(None)).distinct().order_by(col.asc()).limit(limit).all()]
+		return {'field': field, 'values': vals}
+	return get_or_set('distinct', (filter_signature(), field, limit), compute)
 
 
 @bp.get('/membros/suggest')
 @jwt_required()
 def suggest_membros():
 	q = (request.args.get('q') or '').strip()
-	query = Membro.query
-	if q:
-		like = f"%{q}%"
-		query = query.filter(Membro.nome.ilike(like))
-	vals = [r[0] for r in query.with_entities(Membro.nome).filter(Membro.nome.isnot(None)).order_by(Membro.nome.asc()).limit(20).all()]
-	return {'values': vals}
+	# índice em memória (app.typeahead): não consulta o banco a cada tecla
+	return {'values': [nome for _, nome in typeahead.lookup(q, 20)]}
 
 
 @bp.get('/membros/search-min')
 @jwt_required()
 def search_min_membros():
 	q = (request.args.get('q') or '').strip()
-	query = Membro.query
-	if q:
-		like = f"%{q}%"
-		query = query.filter(Membro.nome.ilike(like))
-	rows = query.order_by(Membro.nome.asc()).limit(20).all()
-	return {'data': [{'id': m.id, 'nome': m.nome} for m in rows]}
+	return {'data': [{'id': i, 'nome': nome} for i, nome in typeahead.lookup(q, 20)]}
+
+
+@bp.get('/membros/search')
+@jwt_required()
+def search_membros():
+	q = (request.args.get('q') or '').strip()
+	limit = min(int(request.args.get('limit', 20)), 200)
+	# apply_filters já aplica q; aqui só os filtros de coluna, o ranking cuida de q
+	scored = search.ranked(apply_column_filters(Membro.query), q, limit)
+	if not scored:
+		return {'data': []}
+	by_id = {m.id: m for m in Membro.query.filter(Membro.id.in_([i for i, _ in scored])).all()}
+	data = [
+		{'id': i, 'nome': by_id[i].nome, 'comarca': by_id[i].comarca_lotacao, 'cargo': by_id[i].cargo_efetivo, 'score': sc}
+		for i, sc in scored if i in by_id
+	]
+	return {'data': data}
 
 
 @bp.get('/membros/stats')
 @jwt_required()
+@with_etag('membros')
 def stats_membros():
-	query = apply_filters(Membro.query)
-	total = query.count()
-	female = query.filter(Membro.sexo == 'Feminino').count()
-	pct = round((female * 100 / total), 1) if total else 0.0
-	return {'total': total, 'female_count': female, 'female_pct': pct}
+	def compute():
+		query = apply_filters(Membro.query)
+		total = query.count()
+		female = query.filter(Membro.sexo == 'Feminino').count()
+		pct = round((female * 100 / total), 1) if total else 0.0
+		return {'total': total, 'female_count': female, 'female_pct': pct}
+	return get_or_set('stats', filter_signature(), compute)
 
 
 def parse_int_or_none(value):
@@ -358,27 +725,30 @@ def upload_photo(id: int):
 	# validar extensão simples
 	name = secure_filename(file.filename)
 	ext = os.path.splitext(name)[1].lower()
-	if ext not in ['.jpg', '.jpeg', '.png', '.webp']:
+	if ext not in photos.ALLOWED_EXTS:
 		return { 'message': 'Extensão não suportada. Use JPG, PNG ou WEBP.' }, 400
-	# diretório destino
-	base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'static', 'uploads', 'membros', str(id)))
-	os.makedirs(base_dir, exist_ok=True)
-	dest = os.path.join(base_dir, 'foto'+ext)
-	# sobrescrever arquivo
-	file.save(dest)
-	# salvar caminho relativo para servir via /static
-	rel_path = os.path.relpath(dest, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'static')))
-	m.foto_path = rel_path.replace('\\','/')
+	# decodifica uma vez e grava miniatura/modal/PDF em WebP + JPEG; foto_path = base dos derivados
+	current = m.foto_path
+	try:
+		tmp, foto_path = photos.store_upload(id, file, ext)
+	except (UnidentifiedImageError, DecompressionBombError, ValueError):
+		# só erro de conteúdo é culpa do cliente; falha de disco segue como 500
+		return { 'message': 'Imagem inválida ou corrompida.' }, 400
+	m.foto_path = foto_path
 	try:
 		db.session.commit()
 	except Exception as e:
 		db.session.rollback()
+		photos.discard_upload(id, tmp, foto_path, current)
 		return { 'message': f'Erro ao salvar foto: {str(e)[:200]}' }, 422
-	return { 'success': True, 'foto_url': f"/static/{m.foto_path}" }
+	# a foto anterior só sai depois que o novo caminho está gravado
+	photos.finish_upload(id, tmp, foto_path)
+	return { 'success': True, 'foto_url': photos.url(foto_path), 'fotos': photos.urls(foto_path) }
 
 
 @bp.get('/membros/<int:id>/historico')
 @jwt_required()
+@with_etag('historico', 'membros')
 def list_historico(id: int):
 	m = Membro.query.get_or_404(id)
 	items = MembroHistorico.query.filter_by(membro_id=id).order_by(MembroHistorico.data_movimentacao.asc(), MembroHistorico.id.asc()).all()
@@ -455,9 +825,8 @@ def member_report_pdf(id: int):
 	m = Membro.query.get_or_404(id)
 	# amigos
 	amigos = m.amigos.all()
-	# parentescos (in/out)
-	rels_out = MembroRelacionamento.query.filter_by(source_id=id).all()
-	rels_in = MembroRelacionamento.query.filter_by(target_id=id).all()
+	# parentescos (in/out), já com o nome do parente
+	rels = member_relationships(id)
 	# histórico
 	hist = MembroHistorico.query.filter_by(membro_id=id).order_by(MembroHistorico.data_movimentacao.asc(), MembroHistorico.id.asc()).all()
 
@@ -492,7 +861,8 @@ def member_report_pdf(id: int):
 	static_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'static'))
 	try:
 		if getattr(m, 'foto_path', None):
-			foto_abs = os.path.abspath(os.path.join(static_dir, m.foto_path))
+			# derivado de 30 mm a 300 dpi (ou o original, se a foto ainda não foi processada)
+			foto_abs = photos.file_path(m.foto_path, 'pdf', 'jpg')
 			if os.path.isfile(foto_abs):
 				img = Image(foto_abs)
 				# ajustar para caber em 30x30mm mantendo proporção
@@ -590,11 +960,9 @@ def member_report_pdf(id: int):
 
 	# Família (Parentescos)
 	h('Parentescos')
-	def fmt_rel(r, direction):
-		other_id = r.target_id if direction=='out' else r.source_id
-		other = Membro.query.get(other_id)
-		return f"{other.nome if other else ('#'+str(other_id))} — {r.degree} { '(dele)' if direction=='in' else '' }"
-	all_rels = [fmt_rel(r,'out') for r in rels_out] + [fmt_rel(r,'in') for r in rels_in]
+	def fmt_rel(r):
+		return f"{r['other_name']} — {r['degree']} { '(dele)' if r['direction']=='in' else '' }"
+	all_rels = [fmt_rel(r) for r in rels]
 	if all_rels:
 		rows = [[Paragraph('<b>Parente</b>', styles['Normal'])]] + [[Paragraph(s, styles['Normal'])] for s in all_rels]
 		t = Table(rows, colWidths=[160*mm])
@@ -1,25 +1,98 @@
-from flask import Blueprint, request
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from flask import Blueprint, current_app, request
 from flask_jwt_extended import jwt_required
-import json, urllib.request, urllib.parse, unicodedata
+import json, threading, time, urllib.request, urllib.parse
+from ..search import strip_accents as _normalize
+from .. import cache, geo
 
 bp = Blueprint('municipios', __name__)
 
+# enriquecimento (meso/microrregião) vem do IBGE e muda raramente
+ENRICH_TTL = 24 * 3600
 
-def _normalize(s: str) -> str:
-	if s is None:
-		return ''
-	s = unicodedata.normalize('NFD', s)
-	s = ''.join(ch for ch in s if unicodedata.category(ch) != 'Mn')
-	return s.strip()
+# consultas remotas (só quando o índice local não conhece o nome) rodam em paralelo
+_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='municipios')
 
 
-def _http_get_json(url: str):
+class UpstreamUnavailable(Exception):
+	pass
+
+
+class CircuitBreaker:
+	"""Abre após `failures` falhas seguidas; depois de `cooldown` segundos deixa passar uma tentativa."""
+
+	def __init__(self, failures=3, cooldown=30):
+		self.failures = failures
+		self.cooldown = cooldown
+		self._count = 0
+		self._opened_at = None
+		self._trial = False
+		self._lock = threading.Lock()
+
+	@property
+	def state(self) -> str:
+		if self._opened_at is None:
+			return 'closed'
+		return 'half-open' if time.monotonic() - self._opened_at >= self.cooldown else 'open'
+
+	def allow(self) -> bool:
+		with self._lock:
+			if self._opened_at is None:
+				return True
+			if self._trial or time.monotonic() - self._opened_at < self.cooldown:
+				return False
+			self._trial = True
+			return True
+
+	def success(self) -> None:
+		with self._lock:
+			self._count = 0
+			self._opened_at = None
+			self._trial = False
+
+	def failure(self) -> None:
+		with self._lock:
+			self._count += 1
+			self._trial = False
+			if self._opened_at is not None or self._count >= self.failures:
+				self._opened_at = time.monotonic()
+
+
+BREAKERS = { 'ibge': CircuitBreaker(), 'brasilapi': CircuitBreaker() }
+
+
+def _http_get_json(url: str, timeout=10):
 	req = urllib.request.Request(url, headers={ 'User-Agent': 'membro-app/1.0' })
-	with urllib.request.urlopen(req, timeout=10) as resp:
+	with urllib.request.urlopen(req, timeout=timeout) as resp:
 		data = resp.read()
 		return json.loads(data.decode('utf-8'))
 
 
+def _fetch(upstream: str, url: str, timeout):
+	breaker = BREAKERS[upstream]
+	if not breaker.allow():
+		raise UpstreamUnavailable(upstream)
+	try:
+		data = _http_get_json(url, timeout=timeout)
+	except Exception:
+		breaker.failure()
+		raise
+	breaker.success()
+	return data
+
+
+def _upstream_config() -> dict:
+	# lido uma vez no request e repassado às consultas do pool
+	cfg = current_app.config
+	return {
+		'ibge': cfg.get('MUNICIPIOS_IBGE_URL', 'https://servicodados.ibge.gov.br').rstrip('/'),
+		'brasilapi': cfg.get('MUNICIPIOS_BRASILAPI_URL', 'https://brasilapi.com.br').rstrip('/'),
+		'timeout': cfg.get('MUNICIPIOS_TIMEOUT', 3),
+		'deadline': cfg.get('MUNICIPIOS_DEADLINE', 5),
+		'list_ttl': cfg.get('MUNICIPIOS_LIST_TTL', 6 * 3600),
+	}
+
+
 def _pick_mg(items, uf_sigla: str):
 	if not isinstance(items, list):
 		return None
@@ -45,6 +118,107 @@ def _format_like_ibge(item: dict, uf_sigla: str):
 	}
 
 
+def _match(lst, needle_norm: str, uf_req: str):
+	if not isinstance(lst, list):
+		return None
+	# primeiro, match exato normalizado; depois, contains
+	for it in lst:
+		if _normalize(it.get('nome', '')).lower() == needle_norm:
+			return _format_like_ibge(it, uf_req)
+	for it in lst:
+		if needle_norm in _normalize(it.get('nome', '')).lower():
+			return _format_like_ibge(it, uf_req)
+	return None
+
+
+def _uf_list(upstream: str, url: str, uf_req: str, cfg: dict):
+	# lista de municípios do UF muda raramente: cache com TTL (falhas não são guardadas)
+	return cache.get_or_set(
+		'municipios_uf', (upstream, uf_req), lambda: _fetch(upstream, url, cfg['timeout']),
+		ttl=cfg['list_ttl'], scope='municipios',
+	)
+
+
+def _by_name(name: str, uf_req: str, cfg: dict):
+	params = urllib.parse.urlencode({ 'nome': name })
+	return _pick_mg(_fetch('ibge', f"{cfg['ibge']}/api/v1/localidades/municipios?{params}", cfg['timeout']), uf_req)
+
+
+def _by_ibge_uf(name: str, uf_req: str, cfg: dict):
+	url = f"{cfg['ibge']}/api/v1/localidades/estados/{urllib.parse.quote(uf_req)}/municipios?orderBy=nome"
+	return _match(_uf_list('ibge', url, uf_req, cfg), _normalize(name).lower(), uf_req)
+
+
+def _by_brasilapi(name: str, uf_req: str, cfg: dict):
+	url = f"{cfg['brasilapi']}/api/ibge/municipios/v1/{urllib.parse.quote(uf_req)}"
+	return _match(_uf_list('brasilapi', url, uf_req, cfg), _normalize(name).lower(), uf_req)
+
+
+# IBGE por nome, lista do UF (IBGE) e BrasilAPI, todos ao mesmo tempo
+STRATEGIES = (_by_name, _by_ibge_uf, _by_brasilapi)
+
+
+def _in_app(app, fn, *args):
+	# o cache de listas lê as versões no banco: a thread do pool precisa do contexto de aplicação
+	with app.app_context():
+		return fn(*args)
+
+
+def _upstream_lookup(name: str, uf_req: str, cfg: dict):
+	"""Primeira resposta válida entre as consultas remotas, limitada a cfg['deadline'] segundos."""
+	app = current_app._get_current_object()
+	futures = [_pool.submit(_in_app, app, fn, name, uf_req, cfg) for fn in STRATEGIES]
+	try:
+		for fut in as_completed(futures, timeout=cfg['deadline']):
+			try:
+				chosen = fut.result()
+			except Exception:
+				continue
+			if chosen:
+				return chosen
+	except FuturesTimeout:
+		pass
+	return None
+
+
+def _enrich(code):
+	"""Meso/microrregião do IBGE para um código, em cache; {} se indisponível."""
+	# opcional (MUNICIPIOS_ENRICH): sem cache, a resposta espera o IBGE
+	if not current_app.config.get('MUNICIPIOS_ENRICH', False):
+		return {}
+	cfg = _upstream_config()
+
+	def compute():
+		try:
+			item = _fetch('ibge', f"{cfg['ibge']}/api/v1/localidades/municipios/{int(code)}", cfg['timeout'])
+		except Exception:
+			return None
+		micro = (item or {}).get('microrregiao') or {}
+		return { 'mesorregiao': (micro.get('mesorregiao') or {}).get('nome'), 'microrregiao': micro.get('nome') }
+
+	return cache.get_or_set('municipio_ibge', int(code), compute, ttl=ENRICH_TTL, scope='municipios') or {}
+
+
+def _links(mun_name: str, uf_sigla: str) -> dict:
+	mun_slug = _normalize(mun_name).lower().replace(' ', '-')
+	return { 'ibge_cidades': f'https://cidades.ibge.gov.br/brasil/{uf_sigla.lower()}/{mun_slug}' }
+
+
+def _local_info(entry: dict, enrich: bool) -> dict:
+	uf_nome, reg_sigla, reg_nome = geo.UF_INFO.get(entry['uf'], (entry['uf'], '', ''))
+	extra = _enrich(entry['codigo']) if enrich else {}
+	return {
+		'id': entry['codigo'],
+		'nome': entry['nome'],
+		'uf': { 'sigla': entry['uf'], 'nome': uf_nome },
+		'regiao': { 'sigla': reg_sigla, 'nome': reg_nome },
+		'mesorregiao': extra.get('mesorregiao') or '',
+		'microrregiao': extra.get('microrregiao') or '',
+		'centroide': { 'lat': entry['lat'], 'lon': entry['lon'] },
+		'links': _links(entry['nome'], entry['uf']),
+	}
+
+
 @bp.get('/municipios/info')
 @jwt_required()
 def municipio_info():
@@ -52,71 +226,27 @@ def municipio_info():
 	uf_req = (request.args.get('uf') or 'MG').strip().upper()
 	if not name:
 		return { 'message': 'Parâmetro nome é obrigatório' }, 400
-	needle_norm = _normalize(name).lower()
-	# 1) IBGE localidades por nome
-	params = urllib.parse.urlencode({ 'nome': name })
-	url_ibge = f'https://servicodados.ibge.gov.br/api/v1/localidades/municipios?{params}'
-	chosen = None
-	try:
-		items = _http_get_json(url_ibge)
-		chosen = _pick_mg(items, uf_req)
-	except Exception:
-		chosen = None
-	# 2) Fallback: lista do UF e matching normalizado (exato/contains)
-	if not chosen:
-		try:
-			url_uf = f'https://servicodados.ibge.gov.br/api/v1/localidades/estados/{urllib.parse.quote(uf_req)}/municipios?orderBy=nome'
-			lst = _http_get_json(url_uf)
-			if isinstance(lst, list) and lst:
-				# primeiro, match exato normalizado
-				for it in lst:
-					if _normalize(it.get('nome','')).lower() == needle_norm:
-						chosen = _format_like_ibge(it, uf_req)
-						break
-				# depois, contains
-				if not chosen:
-					for it in lst:
-						if needle_norm in _normalize(it.get('nome','')).lower():
-							chosen = _format_like_ibge(it, uf_req)
-							break
-		except Exception:
-			pass
-	# 3) Fallback BrasilAPI
-	if not chosen:
-		try:
-			url_brasilapi = f'https://brasilapi.com.br/api/ibge/municipios/v1/{urllib.parse.quote(uf_req)}'
-			lst = _http_get_json(url_brasilapi)
-			if isinstance(lst, list) and lst:
-				for it in lst:
-					if _normalize(it.get('nome', '')).lower() == needle_norm or needle_norm in _normalize(it.get('nome', '')).lower():
-						chosen = _format_like_ibge(it, uf_req)
-						break
-		except Exception:
-			pass
+	# índice local (código IBGE, nome, centróide); IBGE só para meso/microrregião, em cache
+	entry = geo.find(name, uf_req)
+	if entry:
+		return { 'data': _local_info(entry, request.args.get('enrich', '1') != '0') }
+	chosen = _upstream_lookup(name, uf_req, _upstream_config()) if current_app.config.get('MUNICIPIOS_UPSTREAM', True) else None
 	if not chosen:
 		# Fallback final: retornar dados mínimos com link IBGE Cidades
-		mun_name = name
-		uf_sigla = uf_req
-		mun_slug = _normalize(mun_name).lower().replace(' ', '-')
-		links = { 'ibge_cidades': f'https://cidades.ibge.gov.br/brasil/{uf_sigla.lower()}/{mun_slug}' }
 		data = {
 			'id': None,
-			'nome': mun_name,
-			'uf': { 'sigla': uf_sigla, 'nome': uf_sigla },
+			'nome': name,
+			'uf': { 'sigla': uf_req, 'nome': uf_req },
 			'regiao': { 'sigla': '', 'nome': '' },
 			'mesorregiao': '',
 			'microrregiao': '',
-			'links': links,
+			'links': _links(name, uf_req),
 		}
 		return { 'data': data }
 	uf = ((chosen.get('microrregiao') or {}).get('mesorregiao') or {}).get('UF') or { 'sigla': uf_req, 'nome': uf_req, 'regiao': { 'sigla': '', 'nome': '' } }
 	reg = (uf.get('regiao') or {})
 	mun_name = chosen.get('nome') or name
 	uf_sigla = uf.get('sigla') or uf_req
-	mun_slug = _normalize(mun_name).lower().replace(' ', '-')
-	links = {
-		'ibge_cidades': f'https://cidades.ibge.gov.br/brasil/{uf_sigla.lower()}/{mun_slug}',
-	}
 	data = {
 		'id': chosen.get('id'),
 		'nome': mun_name,
@@ -124,6 +254,6 @@ def municipio_info():
 		'regiao': { 'sigla': reg.get('sigla'), 'nome': reg.get('nome') },
 		'mesorregiao': ((chosen.get('microrregiao') or {}).get('mesorregiao') or {}).get('nome'),
 		'microrregiao': (chosen.get('microrregiao') or {}).get('nome'),
-		'links': links,
+		'links': _links(mun_name, uf_sigla),
 	}
-	return { 'data': data } 
\ No newline at end of file
+	return { 'data': data }
@@ -1,12 +1,25 @@
-from flask import Blueprint, request
+from flask import Blueprint, Response, request, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy import literal, select, union_all
+from sqlalchemy.orm import aliased
 from ..db import db
-from ..models import Membro, MembroRelacionamento
+from ..models import Membro, MembroRelacionamento, MembroParente, MembroFamilia
+from ..cache import with_etag
+from ..search import like_escape, like_pattern
+import json
 
 bp = Blueprint('relationships', __name__)
 
 ALLOWED_DEGREES = {'spouse','parent','child','sibling'}
+# codificação compacta do grau: índice nesta lista
+DEGREES = ['spouse','parent','child','sibling']
+DEGREE_CODES = { d: i for i, d in enumerate(DEGREES) }
+PAGE_LIMIT = 1000
+UNPAGED_LIMIT = 50000  # resposta sem paginação (compatível com os clientes antigos)
+MAX_PAGE_LIMIT = 10000
+STREAM_BATCH = 2000
+MAX_DEPTH = 6
 
 
 def is_admin():
@@ -14,29 +27,189 @@ def is_admin():
 	return (claims.get('role') or '').lower() == 'admin'
 
 
+def member_relationships(id: int):
+	"""Parentescos de saída e de entrada de um membro, com o nome da outra ponta, numa única consulta.
+
+	Usado pela listagem JSON e pelo relatório PDF. Saídas primeiro, depois entradas.
+	"""
+	R = MembroRelacionamento
+	rels = union_all(
+		select(R.id.label('id'), R.degree.label('degree'), literal('out').label('direction'), literal(0).label('pos'), R.target_id.label('other_id')).where(R.source_id == id),
+		select(R.id, R.degree, literal('in'), literal(1), R.source_id).where(R.target_id == id),
+	).subquery()
+	rows = db.session.execute(
+		select(rels.c.id, rels.c.degree, rels.c.direction, rels.c.other_id, Membro.nome)
+		.outerjoin(Membro, Membro.id == rels.c.other_id)
+		.order_by(rels.c.pos.asc(), rels.c.id.asc())
+	).all()
+	return [
+		{ 'id': r.id, 'degree': r.degree, 'direction': r.direction, 'other_id': r.other_id, 'other_name': r.nome if r.nome is not None else ('#'+str(r.other_id)) }
+		for r in rows
+	]
+
+
 @bp.get('/membros/<int:id>/relationships')
 @jwt_required()
+@with_etag('membros')
 def list_relationships(id: int):
 	# lista relacionamentos de saída e de entrada para exibir ambos
-	rels_out = MembroRelacionamento.query.filter_by(source_id=id).all()
-	rels_in = MembroRelacionamento.query.filter_by(target_id=id).all()
-	def fmt(r: MembroRelacionamento, direction: str):
-		other_id = r.target_id if direction=='out' else r.source_id
-		other = Membro.query.get(other_id)
-		return { 'id': r.id, 'degree': r.degree, 'direction': direction, 'other_id': other_id, 'other_name': other.nome if other else ('#'+str(other_id)) }
-	data = [fmt(r,'out') for r in rels_out] + [fmt(r,'in') for r in rels_in]
-	return { 'data': data }
+	return { 'data': member_relationships(id) }
+
+
+def _parse_ids(raw: str):
+	raw = (raw or '').strip()
+	if not raw:
+		return None
+	vals = json.loads(raw) if raw.startswith('[') else raw.split(',')
+	return sorted(set(int(v) for v in vals if str(v).strip()))
 
 
 @bp.get('/relationships')
 @jwt_required()
+@with_etag('membros')
 def list_all_relationships():
+	"""Parentescos; sem parâmetros de página, todos numa resposta (até UNPAGED_LIMIT), como sempre foi.
+
+	?cursor= e/ou ?limit= ativam a paginação por id (next_cursor na resposta); ?format=ndjson envia todos em streaming.
+
+	?compact=1 troca cada registro por [id, source_id, target_id, código do grau]; os códigos
+	são os índices de `degrees` na resposta. ?ids= restringe a parentescos com alguma ponta no conjunto.
+	"""
 	degree = (request.args.get('degree') or '').strip().lower()
-	query = MembroRelacionamento.query
+	compact = request.args.get('compact') in ('1', 'true')
+	try:
+		ids = _parse_ids(request.args.get('ids'))
+		after = int(request.args.get('cursor') or 0)
+	except (ValueError, TypeError):
+		return {'message': 'Parâmetros inválidos'}, 400
+	R = MembroRelacionamento
+	query = db.session.query(R.id, R.source_id, R.target_id, R.degree)
 	if degree and degree in ALLOWED_DEGREES:
-		query = query.filter_by(degree=degree)
-	rels = query.limit(50000).all()
-	return { 'data': [ { 'id': r.id, 'source_id': r.source_id, 'target_id': r.target_id, 'degree': r.degree } for r in rels ] }
+		query = query.filter(R.degree == degree)
+	if ids is not None:
+		query = query.filter(R.source_id.in_(ids) | R.target_id.in_(ids))
+	if after:
+		query = query.filter(R.id > after)
+	query = query.order_by(R.id.asc())
+
+	if compact:
+		def encode(r):
+			return [r.id, r.source_id, r.target_id, DEGREE_CODES.get(r.degree)]
+	else:
+		def encode(r):
+			return { 'id': r.id, 'source_id': r.source_id, 'target_id': r.target_id, 'degree': r.degree }
+
+	if (request.args.get('format') or '').lower() == 'ndjson':
+		def generate():
+			if compact:
+				yield json.dumps({'degrees': DEGREES}) + '\n'
+			for r in query.yield_per(STREAM_BATCH):
+				yield json.dumps(encode(r)) + '\n'
+		return Response(stream_with_context(generate()), content_type='application/x-ndjson')
+
+	if 'cursor' in request.args or 'limit' in request.args:
+		limit = max(1, min(request.args.get('limit', PAGE_LIMIT, type=int) or PAGE_LIMIT, MAX_PAGE_LIMIT))
+		rows = query.limit(limit + 1).all()
+		next_cursor = str(rows[limit - 1].id) if len(rows) > limit else None
+		out = { 'data': [encode(r) for r in rows[:limit]], 'next_cursor': next_cursor }
+	else:
+		out = { 'data': [encode(r) for r in query.limit(UNPAGED_LIMIT).all()] }
+	if compact:
+		out['degrees'] = DEGREES
+	return out
+
+
+def _neighborhood(center_id: int, depth: int, degree: str = ''):
+	# BFS por níveis: uma consulta por salto, com a fronteira inteira no IN
+	seen = {center_id}
+	frontier = {center_id}
+	for _ in range(depth):
+		if not frontier:
+			break
+		query = db.session.query(MembroRelacionamento.source_id, MembroRelacionamento.target_id).filter(
+			(MembroRelacionamento.source_id.in_(frontier)) | (MembroRelacionamento.target_id.in_(frontier))
+		)
+		if degree:
+			query = query.filter(MembroRelacionamento.degree == degree)
+		nxt = set()
+		for s_id, t_id in query.all():
+			for n in (s_id, t_id):
+				if n not in seen:
+					nxt.add(n)
+		seen |= nxt
+		frontier = nxt
+	return seen
+
+
+@bp.get('/relationships/graph')
+@jwt_required()
+@with_etag('membros')
+def relationships_graph():
+	# arestas de parentesco já com os nomes das duas pontas; opcionalmente só a vizinhança de N saltos
+	degree = (request.args.get('degree') or '').strip().lower()
+	if degree not in ALLOWED_DEGREES:
+		degree = ''
+	center_id = request.args.get('center_id', type=int)
+	nome = (request.args.get('nome') or '').strip()
+	center = None
+	if not center_id and nome:
+		# % e _ digitados são literais, não curingas
+		m = Membro.query.filter(Membro.nome.ilike(like_escape(nome), escape='\\')).order_by(Membro.id.asc()).first()
+		if not m:
+			m = Membro.query.filter(Membro.nome.ilike(like_pattern(nome), escape='\\')).order_by(Membro.nome.asc(), Membro.id.asc()).first()
+		if not m:
+			return { 'center_id': None, 'nodes': [], 'edges': [] }
+		center_id, center = m.id, (m.nome,)
+	Src = aliased(Membro)
+	Tgt = aliased(Membro)
+	query = db.session.query(
+		MembroRelacionamento.id, MembroRelacionamento.source_id, MembroRelacionamento.target_id, MembroRelacionamento.degree,
+		Src.nome.label('source_nome'), Tgt.nome.label('target_nome'),
+	).join(Src, Src.id == MembroRelacionamento.source_id).join(Tgt, Tgt.id == MembroRelacionamento.target_id)
+	if degree:
+		query = query.filter(MembroRelacionamento.degree == degree)
+	if center_id:
+		depth = max(1, min(request.args.get('depth', 1, type=int) or 1, MAX_DEPTH))
+		ids = _neighborhood(center_id, depth, degree)
+		query = query.filter(MembroRelacionamento.source_id.in_(ids), MembroRelacionamento.target_id.in_(ids))
+	edges = []
+	names = {}
+	for r in query.all():
+		names[r.source_id] = r.source_nome
+		names[r.target_id] = r.target_nome
+		edges.append({ 'id': r.id, 'source_id': r.source_id, 'target_id': r.target_id, 'degree': r.degree, 'source_nome': r.source_nome, 'target_nome': r.target_nome })
+	if center_id and center_id not in names:
+		# membro sem parentescos: o nó central aparece sozinho
+		if center is None:
+			center = db.session.query(Membro.nome).filter(Membro.id == center_id).first()
+		if center is not None:
+			names[center_id] = center[0]
+	nodes = [ { 'id': i, 'nome': n } for i, n in names.items() ]
+	return { 'center_id': center_id, 'nodes': nodes, 'edges': edges }
+
+
+@bp.get('/membros/<int:id>/family')
+@jwt_required()
+@with_etag('membros')
+def member_family(id: int):
+	"""Parentes diretos e inferidos (até kinship.MAX_DISTANCE saltos), lidos do fecho materializado."""
+	rows = db.session.query(
+		MembroParente.parente_id, MembroParente.distancia, MembroParente.relacao, MembroParente.familia_id, Membro.nome,
+	).join(Membro, Membro.id == MembroParente.parente_id).filter(MembroParente.membro_id == id).order_by(
+		MembroParente.distancia.asc(), Membro.nome.asc()
+	).all()
+	relatives = [ { 'id': r.parente_id, 'nome': r.nome, 'distance': r.distancia, 'relation': r.relacao } for r in rows ]
+	return { 'membro_id': id, 'familia_id': rows[0].familia_id if rows else None, 'relatives': relatives }
+
+
+@bp.get('/familias/<int:familia_id>')
+@jwt_required()
+@with_etag('membros')
+def family_members(familia_id: int):
+	rows = db.session.query(Membro.id, Membro.nome).join(MembroFamilia, MembroFamilia.membro_id == Membro.id).filter(
+		MembroFamilia.familia_id == familia_id
+	).order_by(Membro.nome.asc()).all()
+	return { 'familia_id': familia_id, 'size': len(rows), 'members': [ { 'id': r.id, 'nome': r.nome } for r in rows ] }
 
 
 @bp.post('/membros/<int:id>/relationships')
@@ -1,22 +1,97 @@
-from flask import Blueprint, render_template_string
+from flask import Blueprint, Response, abort, current_app, render_template, render_template_string, request, send_file
+from werkzeug.security import safe_join
+from .. import geo
+import gzip
+import hashlib
+import os
+import threading
+
+try:
+	import brotli
+except ImportError:
+	brotli = None
 
 bp = Blueprint('views', __name__)
 
+# variantes pré-comprimidas, na ordem de preferência
+GEO_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+ETAG_SUFFIX = {'identity': '', 'gzip': '-gz', 'br': '-br'}
+
+# páginas renderizadas: nome -> (contexto, {'etag', 'identity', 'gzip', 'br'})
+_pages = {}
+_pages_lock = threading.Lock()
+
+
+def _render_once(name, render, context):
+	"""Corpo da página renderizado (e comprimido) uma vez por contexto; em debug, a cada requisição."""
+	cached = _pages.get(name)
+	if cached and cached[0] == context and not current_app.debug:
+		return cached[1]
+	with _pages_lock:
+		cached = _pages.get(name)
+		if cached and cached[0] == context and not current_app.debug:
+			return cached[1]
+		body = render(**dict(context)).encode('utf-8')
+		page = {
+			'etag': hashlib.sha1(body).hexdigest(),
+			'identity': body,
+			'gzip': gzip.compress(body, compresslevel=9, mtime=0),
+			'br': brotli.compress(body, quality=11) if brotli is not None else None,
+		}
+		_pages[name] = (context, page)
+		return page
+
+
+def _serve_page(name, render, **context):
+	# contexto vira parte da chave: ex. novas URLs da malha após `flask build-geo` geram outra página
+	page = _render_once(name, render, tuple(sorted(context.items())))
+	encoding = next((enc for enc in ('br', 'gzip') if page[enc] is not None and request.accept_encodings[enc]), None)
+	# ETag forte é por representação: cada codificação tem a sua ("<sha1>-br", "<sha1>-gz")
+	tags = {enc: page['etag'] + suffix for enc, suffix in ETAG_SUFFIX.items()}
+	# qualquer variante do mesmo corpo vale para o 304 (ex. cache que guardou a versão gzip)
+	if any(tag in request.if_none_match for tag in tags.values()):
+		resp = Response(status=304)
+	else:
+		resp = Response(page[encoding or 'identity'], mimetype='text/html')
+		if encoding:
+			resp.headers['Content-Encoding'] = encoding
+	resp.set_etag(tags[encoding or 'identity'])
+	# HTML sempre revalida (é barato: 304 sem corpo); os assets com hash é que ficam em cache
+	resp.headers['Cache-Control'] = 'no-cache'
+	resp.headers['Vary'] = 'Accept-Encoding'
+	return resp
+
 
 @bp.get('/login')
 def login_page():
-	from flask import redirect
-	return render_template_string(open('app/templates/login.html').read())
+	return _serve_page('login.html', lambda: render_template('login.html'))
 
 
 @bp.get('/')
 def members_page():
-	return render_template_string(open('app/templates/membros.html').read())
+	return _serve_page('membros.html', lambda **ctx: render_template('membros.html', **ctx), geo_urls=geo.asset_urls())
 
 
-@bp.get('/cadastros')
-def cadastros_page():
-	html = '''<!doctype html><html><head><meta charset="utf-8" /><meta name="viewport" content="width=device-width, initial-scale=1" /><title>Cadastros</title>
+@bp.get('/geo/<path:filename>')
+def geo_asset(filename):
+	# arquivos de `flask build-geo`: nome com hash do conteúdo, então podem ficar em cache para sempre
+	path = safe_join(geo.GEO_DIR, filename)
+	if not path or not filename.endswith('.json') or path == geo.MANIFEST or not os.path.isfile(path):
+		abort(404)
+	encoding = None
+	for enc, ext in GEO_ENCODINGS:
+		if request.accept_encodings[enc] and os.path.isfile(path + ext):
+			encoding, path = enc, path + ext
+			break
+	resp = send_file(path, mimetype='application/json', conditional=True, etag=True)
+	if encoding:
+		resp.headers['Content-Encoding'] = encoding
+	resp.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+	resp.headers['Vary'] = 'Accept-Encoding'
+	return resp
+
+
+CADASTROS_HTML = '''<!doctype html><html><head><meta charset="utf-8" /><meta name="viewport" content="width=device-width, initial-scale=1" /><title>Cadastros</title>
 	<style> body{font-family:system-ui,sans-serif;padding:16px} .toolbar{display:flex;gap:8px;align-items:center;margin-bottom:12px} .btn{padding:8px 12px;border:1px solid #334155;background:#334155;color:#fff;border-radius:6px;cursor:pointer} .input{padding:8px;border:1px solid #cbd5e1;border-radius:6px} table{border-collapse:collapse;width:100%} th,td{border:1px solid #e2e8f0;padding:8px;font-size:14px} th{background:#f1f5f9} .row{display:flex;gap:8px;align-items:center;margin:8px 0} select{padding:8px;border:1px solid #cbd5e1;border-radius:6px} </style>
 	</head><body>
 	<div class="toolbar">
@@ -32,6 +107,7 @@ def cadastros_page():
 			<option value="grupos_identitarios">Grupos identitários</option>
 		</select>
 		<input id="q" class="input" placeholder="Buscar..." oninput="loadList()" />
+		<button class="btn" onclick="syncFromMembros()" title="Varre todos os membros (normalmente não é necessário)">Sincronizar com membros</button>
 		<a class="btn" href="/">Voltar</a>
 	</div>
 	<div class="row">
@@ -47,7 +123,12 @@ def cadastros_page():
 	async function save(id){ const inp = document.querySelector(`[data-id="${id}"]`); const value=inp.value.trim(); const r=await fetch(`/api/lookups/${id}`, { method:'PUT', headers:{ 'Content-Type':'application/json', ...auth() }, body: JSON.stringify({ value }) }); if(r.ok){ loadList() } }
 	async function removeVal(id){ if(!confirm('Excluir este valor?')) return; const r=await fetch(`/api/lookups/${id}`, { method:'DELETE', headers:{ ...auth() } }); if(r.ok){ loadList() } }
 	async function populate(){ try{ await fetch('/api/lookups/populate-from-membros', { method:'POST', headers:{ ...auth() } }) }catch(e){} }
-	(async function init(){ await populate(); loadList() })()
+	async function syncFromMembros(){ await populate(); loadList() }
+	loadList()
 	</script>
 	</body></html>'''
-	return render_template_string(html) 
\ No newline at end of file
+
+
+@bp.get('/cadastros')
+def cadastros_page():
+	return _serve_page('cadastros', lambda: render_template_string(CADASTROS_HTML))
@@ -0,0 +1,153 @@
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from .db import db
+from .models import Membro, MembroSearchToken
+from functools import lru_cache
+import re
+import unicodedata
+
+# campos de texto indexados e seu peso na relevância
+FIELD_WEIGHTS = {
+	'nome': 10,
+	'comarca_lotacao': 5,
+	'cargo_efetivo': 5,
+	'unidade_lotacao': 3,
+	'cargo_especial': 3,
+	'titularidade': 2,
+	'concurso': 2,
+	'email_pessoal': 2,
+	'sexo': 1,
+	'estado_origem': 1,
+	'telefone_unidade': 1,
+	'telefone_celular': 1,
+	'time_extraprofissionais': 1,
+	'nomes_filhos': 1,
+	'academico': 1,
+	'pretensao_carreira': 1,
+	'carreira_anterior': 1,
+	'lideranca': 1,
+	'grupos_identitarios': 1,
+	'observacao': 1,
+}
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+# tamanho de MembroSearchToken.token: índice e consulta cortam no mesmo ponto, senão palavra longa não casa
+_TOKEN_MAX = MembroSearchToken.__table__.c.token.type.length
+
+
+def strip_accents(s: str) -> str:
+	if s is None:
+		return ''
+	s = str(s)
+	if s.isascii():
+		return s.strip()
+	s = unicodedata.normalize('NFD', s)
+	s = ''.join(ch for ch in s if unicodedata.category(ch) != 'Mn')
+	return s.strip()
+
+
+def normalize(s: str) -> str:
+	return strip_accents(s).lower()
+
+
+@lru_cache(maxsize=65536)
+def _tokens(s: str):
+	return tuple(t[:_TOKEN_MAX] for t in _TOKEN_RE.findall(normalize(s)))
+
+
+def tokenize(s: str):
+	# valores se repetem muito (comarcas, cargos): tokens memorizados por texto
+	if s is None:
+		return []
+	return list(_tokens(str(s)))
+
+
+def membro_tokens(m: Membro):
+	"""Linhas (membro_id, field, token, weight) do índice para um membro."""
+	rows = {}
+	for field, weight in FIELD_WEIGHTS.items():
+		for tok in tokenize(getattr(m, field, None)):
+			rows[(field, tok)] = weight
+	return [ {'membro_id': m.id, 'field': f, 'token': t, 'weight': w} for (f, t), w in rows.items() ]
+
+
+def reindex(conn, membros) -> int:
+	"""Regrava os tokens dos membros informados usando a conexão dada."""
+	membros = [m for m in membros if m.id is not None]
+	if not membros:
+		return 0
+	table = MembroSearchToken.__table__
+	conn.execute(table.delete().where(table.c.membro_id.in_([m.id for m in membros])))
+	rows = [r for m in membros for r in membro_tokens(m)]
+	if rows:
+		conn.execute(table.insert(), rows)
+	return len(rows)
+
+
+def query_tokens(q: str):
+	"""Tokens distintos da busca, na ordem, cortados em _TOKEN_MAX como os do índice."""
+	return list(dict.fromkeys(tokenize(q)))
+
+
+def match_ids(q: str):
+	"""Subconsultas de ids de membros que casam com cada token (prefixo) da busca."""
+	subs = []
+	for tok in query_tokens(q):
+		subs.append(
+			db.session.query(MembroSearchToken.membro_id).filter(MembroSearchToken.token.like(tok + '%')).distinct()
+		)
+	return subs
+
+
+def like_escape(text: str) -> str:
+	"""Texto com %, _ e \\ literais para LIKE (usar com escape='\\')."""
+	return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def like_pattern(text: str) -> str:
+	"""Padrão LIKE de substring, com o texto escapado (usar com escape='\\')."""
+	return '%' + like_escape(text) + '%'
+
+
+def filter_query(query, q: str):
+	tokens = tokenize(q)
+	if not tokens:
+		q = (q or '').strip()
+		if not q:
+			return query
+		# só pontuação: nada para o índice de tokens; busca literal por substring, como antes do índice
+		like = like_pattern(q)
+		return query.filter(
+			Membro.nome.ilike(like, escape='\\') | Membro.comarca_lotacao.ilike(like, escape='\\') | Membro.cargo_efetivo.ilike(like, escape='\\')
+		)
+	for sub in match_ids(q):
+		query = query.filter(Membro.id.in_(sub))
+	return query
+
+
+def ranked(query, q: str, limit: int = 20):
+	"""Ids do query filtrado, ordenados por relevância (soma dos pesos dos tokens casados)."""
+	tokens = query_tokens(q)
+	if not tokens:
+		return []
+	ids = filter_query(query, q).with_entities(Membro.id)
+	cond = MembroSearchToken.token.like(tokens[0] + '%')
+	for tok in tokens[1:]:
+		cond = cond | MembroSearchToken.token.like(tok + '%')
+	# bônus para token exato (não só prefixo)
+	exact = func.sum(db.case((MembroSearchToken.token.in_(tokens), MembroSearchToken.weight), else_=0))
+	score = (func.sum(MembroSearchToken.weight) + exact).label('score')
+	rows = db.session.query(MembroSearchToken.membro_id, score).filter(
+		cond, MembroSearchToken.membro_id.in_(ids)
+	).group_by(MembroSearchToken.membro_id).order_by(score.desc(), MembroSearchToken.membro_id.asc()).limit(limit).all()
+	return [(r.membro_id, int(r.score or 0)) for r in rows]
+
+
+@event.listens_for(Session, 'after_flush')
+def _sync_index(session, flush_context):
+	changed = [
+		obj for obj in list(session.new) + list(session.dirty)
+		if isinstance(obj, Membro) and (obj in session.new or session.is_modified(obj, include_collections=False))
+	]
+	if changed:
+		reindex(session.connection(), changed)
@@ -0,0 +1,250 @@
+from bisect import bisect_left, insort
+from heapq import merge, nsmallest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+from . import cache
+from .db import db
+from .models import Membro
+from .search import normalize, tokenize
+import threading
+import time
+
+# índice em memória de nomes para autocomplete: prefixo de palavra, sem acento
+# o índice é reconstruído quando a versão compartilhada 'nomes' (cache_versions) muda: ela só sobe
+# com gravações de nomes (inclusive DML direto em membros, de outros workers e da CLI).
+# A versão é conferida no máximo a cada VERSION_RECHECK segundos: entre uma conferência e outra,
+# sugestões não tocam o banco. MAX_AGE é só uma rede de segurança.
+SCOPE = 'nomes'
+VERSION_RECHECK = 5  # segundos
+MAX_AGE = 300  # segundos
+REBUILD_THRESHOLD = 1000
+MAX_MERGE_WORDS = 64  # acima disso o prefixo é muito comum e varrer em ordem de nome é mais barato
+WALK_BUDGET = 2000
+
+_lock = threading.Lock()
+_entries = []   # [(palavra, nome normalizado, id)] ordenado: cada palavra forma um trecho já em ordem de nome
+_vocab = []     # palavras distintas, ordenadas
+_counts = {}    # palavra -> nº de membros que a contêm
+_by_name = []   # [(nome normalizado, id)] ordenado
+_names = {}     # id -> (nome, nome normalizado, palavras)
+_built_at = None
+_built_version = None
+_checked_at = None
+
+
+def _add(id_, nome):
+	key = normalize(nome)
+	words = set(tokenize(nome))
+	_names[id_] = (nome, key, words)
+	insort(_by_name, (key, id_))
+	for w in words:
+		insort(_entries, (w, key, id_))
+		_counts[w] = _counts.get(w, 0) + 1
+		if _counts[w] == 1:
+			insort(_vocab, w)
+
+
+def _discard(lst, item):
+	i = bisect_left(lst, item)
+	if i < len(lst) and lst[i] == item:
+		del lst[i]
+
+
+def _remove(id_):
+	old = _names.pop(id_, None)
+	if not old:
+		return
+	_, key, words = old
+	_discard(_by_name, (key, id_))
+	for w in words:
+		_discard(_entries, (w, key, id_))
+		_counts[w] -= 1
+		if not _counts[w]:
+			del _counts[w]
+			_discard(_vocab, w)
+
+
+def rebuild() -> None:
+	global _entries, _vocab, _counts, _by_name, _names, _built_at, _built_version, _checked_at
+	# versão lida antes das linhas: uma gravação no meio só provoca outra reconstrução
+	version = cache.versions(fresh=True).get(SCOPE, 0)
+	rows = db.session.query(Membro.id, Membro.nome).filter(Membro.nome.isnot(None)).all()
+	names = {}
+	entries = []
+	counts = {}
+	by_name = []
+	for id_, nome in rows:
+		key = normalize(nome)
+		ws = set(tokenize(nome))
+		names[id_] = (nome, key, ws)
+		by_name.append((key, id_))
+		for w in ws:
+			entries.append((w, key, id_))
+			counts[w] = counts.get(w, 0) + 1
+	entries.sort()
+	by_name.sort()
+	vocab = sorted(counts)
+	with _lock:
+		_entries, _vocab, _counts, _by_name, _names = entries, vocab, counts, by_name, names
+		_built_at = _checked_at = time.monotonic()
+		_built_version = version
+
+
+def invalidate() -> None:
+	global _built_at
+	with _lock:
+		_built_at = None
+
+
+def _ensure():
+	global _checked_at
+	now = time.monotonic()
+	if _built_at is None or now - _built_at > MAX_AGE:
+		rebuild()
+		return
+	if now - _checked_at < VERSION_RECHECK:
+		return
+	_checked_at = now
+	if cache.versions(fresh=True).get(SCOPE, 0) != _built_version:
+		rebuild()
+
+
+def apply_changes(changes) -> None:
+	"""Atualiza o índice com [(id, nome|None)]; nome None remove o membro."""
+	global _built_at
+	if _built_at is None:
+		return
+	with _lock:
+		if len(changes) > REBUILD_THRESHOLD:
+			# lote grande (ex.: importação): mais barato reconstruir na próxima consulta
+			_built_at = None
+			return
+		for id_, nome in changes:
+			_remove(id_)
+			if nome:
+				_add(id_, nome)
+
+
+def _entry_span(prefix):
+	return bisect_left(_entries, (prefix,)), bisect_left(_entries, (prefix + '\uffff',))
+
+
+def _vocab_span(prefix):
+	return bisect_left(_vocab, prefix), bisect_left(_vocab, prefix + '\uffff')
+
+
+def _word_run(word):
+	lo = bisect_left(_entries, (word,))
+	hi = bisect_left(_entries, (word, '\uffff'), lo)
+	return ((_entries[j][1], _entries[j][2]) for j in range(lo, hi))
+
+
+def _has_prefix(i, t):
+	return any(w.startswith(t) for w in _names[i][2])
+
+
+def _ordered_stream(tokens, spans):
+	"""Ids em ordem de nome que casam com um dos termos (o de menos entradas entre os "mescláveis")."""
+	mergeable = []
+	for t in tokens:
+		vlo, vhi = _vocab_span(t)
+		if vhi - vlo <= MAX_MERGE_WORDS:
+			mergeable.append((spans[t][1] - spans[t][0], t, vlo, vhi))
+	if not mergeable:
+		# só prefixos muito comuns: varrer em ordem de nome
+		return (i for _, i in _by_name), list(tokens)
+	_, lead, vlo, vhi = min(mergeable)
+	# cada palavra tem seu trecho já em ordem de nome; o merge mantém a ordem
+	stream = (i for _, i in merge(*[_word_run(w) for w in _vocab[vlo:vhi]]))
+	return stream, [t for t in tokens if t != lead]
+
+
+def lookup(q: str, limit: int = 20):
+	"""[(id, nome)] cujos nomes têm palavras começando com todos os termos de q, ordenados por nome."""
+	_ensure()
+	tokens = set(tokenize(q))
+	with _lock:
+		if not tokens:
+			return [(i, _names[i][0]) for _, i in _by_name[:limit]]
+		# as entradas de um prefixo são contíguas em _entries
+		spans = {t: _entry_span(t) for t in tokens}
+		if any(lo == hi for lo, hi in spans.values()):
+			return []
+		# 1) percorrer em ordem de nome, conferindo os demais termos, até o limite ou o orçamento
+		stream, check = _ordered_stream(tokens, spans)
+		out = []
+		seen = set()
+		steps = 0
+		for i in stream:
+			if i in seen:
+				continue
+			seen.add(i)
+			if all(_has_prefix(i, t) for t in check):
+				out.append((i, _names[i][0]))
+				if len(out) >= limit:
+					return out
+			steps += 1
+			if check and steps >= WALK_BUDGET:
+				break
+		else:
+			return out
+		# 2) termos que quase não coincidem: interseção dos conjuntos de ids, do menor para o maior
+		order = sorted(tokens, key=lambda t: spans[t][1] - spans[t][0])
+		lo, hi = spans[order[0]]
+		cand = {e[2] for e in _entries[lo:hi]}
+		for t in order[1:]:
+			a, b = spans[t]
+			cand &= {e[2] for e in _entries[a:b]}
+		best = nsmallest(limit, cand, key=lambda i: (_names[i][1], i))
+		return [(i, _names[i][0]) for i in best]
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect(session, flush_context):
+	changes = session.info.setdefault('typeahead_changes', [])
+	for obj in session.new:
+		if isinstance(obj, Membro):
+			changes.append((obj.id, obj.nome))
+	for obj in session.dirty:
+		if isinstance(obj, Membro) and get_history(obj, 'nome').has_changes():
+			changes.append((obj.id, obj.nome))
+	for obj in session.deleted:
+		if isinstance(obj, Membro):
+			changes.append((obj.id, None))
+	if changes:
+		cache.mark_scope(session, SCOPE)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _on_execute(state):
+	# DML direto em membros (importação, Query.delete()): nomes desconhecidos, os workers reconstroem
+	if not (state.is_insert or state.is_update or state.is_delete):
+		return
+	if getattr(getattr(state.statement, 'table', None), 'name', None) == Membro.__tablename__:
+		cache.mark_scope(state.session, SCOPE)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply(session):
+	changes = session.info.pop('typeahead_changes', None)
+	if changes:
+		apply_changes(changes)
+		_advance()
+
+
+def _advance() -> None:
+	"""Após aplicar um commit local: se ele foi a única gravação desde a construção, o índice segue válido."""
+	global _built_version
+	if _built_at is None:
+		return
+	# cada commit sobe a versão do escopo em 1; mais que isso, outro processo também gravou
+	current = cache.versions(fresh=True).get(SCOPE, 0)
+	with _lock:
+		if _built_version is not None and current == _built_version + 1:
+			_built_version = current
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_pending(session):
+	session.info.pop('typeahead_changes', None)
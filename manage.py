@@ -3,9 +3,16 @@ from flask import current_app
 from flask.cli import with_appcontext
 import click
 from app.db import db
-from app.models import User, Membro
+from app.models import User, Membro, membro_amigos
+from app.search import FIELD_WEIGHTS as SEARCH_FIELDS, normalize as _norm, reindex as reindex_tokens
+from app import cache, geo, kinship, lookups, photos
+from sqlalchemy import bindparam, func, select
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import itertools
+import json
 import os
-import unicodedata
+import time
 
 app = create_app()
 
@@ -26,115 +33,100 @@ def create_admin(name, email, password):
 	click.echo(f'Admin criado: {email}')
 
 
-def _norm(s: str) -> str:
-	if s is None:
-		return ''
-	s = str(s)
-	s = unicodedata.normalize('NFD', s)
-	s = ''.join(ch for ch in s if unicodedata.category(ch) != 'Mn')
-	return s.strip().lower()
-
-
-@app.cli.command('import-membros')
-@click.argument('path')
-@click.option('--truncate', is_flag=True, help='Limpa tabelas antes de importar')
+@app.cli.command('reindex-search')
+@click.option('--batch', default=1000, show_default=True, help='Membros por lote')
 @with_appcontext
-def import_membros(path, truncate):
-	path = os.path.abspath(path)
-	if not os.path.exists(path):
-		click.echo(f'Arquivo não encontrado: {path}')
-		return
-	if truncate:
-		try:
-			# limpar pivot primeiro
-			db.session.execute(db.text('DELETE FROM membro_amigos'))
-		except Exception:
-			pass
-		Membro.query.delete()
+def reindex_search(batch):
+	"""Reconstrói o índice de busca (membro_search_tokens) a partir de membros."""
+	total = 0
+	last_id = 0
+	while True:
+		chunk = Membro.query.filter(Membro.id > last_id).order_by(Membro.id.asc()).limit(batch).all()
+		if not chunk:
+			break
+		total += reindex_tokens(db.session.connection(), chunk)
+		last_id = chunk[-1].id
 		db.session.commit()
-	rows = []
+		db.session.expunge_all()
+	click.echo(f'Índice de busca reconstruído: {total} tokens')
+
+
+# conjuntos para detectar linha de cabeçalho
+HEADER_HINTS = set([
+	'membro','mamp','sexo','data de nascimento','telefone celular','email','e-mail','concurso','titularidade','cargo efetivo','comarca lotacao','unidade lotacao','telefone unidade','cargo especial'
+])
+
+# aliases por campo (normalizados)
+IMPORT_ALIASES = {
+	'nome': ['membro','nome'],
+	'sexo': ['sexo','genero','genero biologico','genero biologico','genero biológico','genero biologico ','gênero'],
+	'concurso': ['concurso','classificacao','classificação'],
+	'cargo_efetivo': ['cargo efetivo','cargo_efetivo','cargo atual','cargo'],
+	'titularidade': ['titularidade'],
+	'email_pessoal': ['email pessoal','e-mail pessoal','email  pessoal','emailpessoal','e mail pessoal','email pessoal '],
+	'email_institucional': ['email institucional','e-mail institucional','mail institucional','email inst'],
+	'cargo_especial': ['cargo especial'],
+	'telefone_unidade': ['telefone unidade','tel unidade','telefone da unidade','telefone trabalho'],
+	'telefone_celular': ['telefone celular','celular','telefone movel','telefone móvel'],
+	'unidade_lotacao': ['unidade lotacao','unidade lotação','lotacao','lotação','unidade'],
+	'comarca_lotacao': ['comarca lotacao','comarca lotação','comarca','cidade'],
+	'time_extraprofissionais': ['time de futebol e outros grupos extraprofissionais','time extraprofissionais','grupos extraprofissionais','time de futebol'],
+	'quantidade_filhos': ['quantidade de filhos','qtd filhos','qtde filhos','numero de filhos','n filhos'],
+	'nomes_filhos': ['nome dos filhos','nomes dos filhos'],
+	'estado_origem': ['estado de origem','uf origem','uf'],
+	'academico': ['academico','acadêmico'],
+	'pretensao_carreira': ['pretensao de movimentacao na carreira','pretensão de movimentação na carreira','pretensao carreira'],
+	'carreira_anterior': ['carreira anterior'],
+	'lideranca': ['lideranca','liderança'],
+	'grupos_identitarios': ['grupos identitarios','grupos identitários','grupo identitarios','grupo identitário'],
+	'amigos_ids': ['amigos no mp (ids)','amigos mp (ids)','amigos mp ids','amigos (ids)']
+}
+
+
+def iter_sheet_rows(path):
+	"""Linhas (listas de valores) da primeira planilha, lidas sob demanda."""
 	ext = os.path.splitext(path)[1].lower()
-	# conjuntos para detectar linha de cabeçalho
-	expected = set([
-		'membro','mamp','sexo','data de nascimento','telefone celular','email','e-mail','concurso','titularidade','cargo efetivo','comarca lotacao','unidade lotacao','telefone unidade','cargo especial'
-	])
 	if ext == '.xlsx':
 		from openpyxl import load_workbook
-		wb = load_workbook(path)
-		sheet = wb.active
-		# detectar linha de cabeçalho nas primeiras 20 linhas
-		header_row = None
-		max_scan = min(20, sheet.max_row)
-		for r in range(1, max_scan+1):
-			vals = [str(c.value or '').strip() for c in next(sheet.iter_rows(min_row=r, max_row=r))[0:]]
-			norms = [_norm(v) for v in vals]
-			matches = sum(1 for v in norms if v in expected)
-			if matches >= 3:
-				header_row = r
-				headers = vals
-				break
-		if not header_row:
-			# fallback: primeira linha
-			headers = [str(c.value or '').strip() for c in next(sheet.iter_rows(min_row=1, max_row=1))[0:]]
-			data_iter = sheet.iter_rows(min_row=2, values_only=True)
-		else:
-			data_iter = sheet.iter_rows(min_row=header_row+1, values_only=True)
-		for row in data_iter:
-			rows.append(list(row))
+		wb = load_workbook(path, read_only=True, data_only=True)
+		try:
+			for row in wb.active.iter_rows(values_only=True):
+				yield list(row)
+		finally:
+			wb.close()
 	elif ext == '.xls':
 		import xlrd
-		wb = xlrd.open_workbook(path)
-		sheet = wb.sheet_by_index(0)
-		header_row = None
-		max_scan = min(20, sheet.nrows)
-		for r in range(0, max_scan):
-			vals = [str(sheet.cell_value(r, col) or '').strip() for col in range(sheet.ncols)]
-			norms = [_norm(v) for v in vals]
-			matches = sum(1 for v in norms if v in expected)
-			if matches >= 3:
-				header_row = r
-				headers = vals
-				break
-		if header_row is None:
-			headers = [str(sheet.cell_value(0, col) or '').strip() for col in range(sheet.ncols)]
-			start = 1
-		else:
-			start = header_row + 1
-		for r in range(start, sheet.nrows):
-			rows.append([sheet.cell_value(r, c) for c in range(sheet.ncols)])
+		wb = xlrd.open_workbook(path, on_demand=True)
+		try:
+			sheet = wb.sheet_by_index(0)
+			for r in range(sheet.nrows):
+				yield sheet.row_values(r)
+		finally:
+			wb.release_resources()
 	else:
-		click.echo('Formato não suportado. Use .xls ou .xlsx')
-		return
+		raise click.ClickException('Formato não suportado. Use .xls ou .xlsx')
+
+
+def read_sheet(path):
+	"""(cabeçalhos, iterador das linhas de dados); o cabeçalho é procurado nas 20 primeiras linhas."""
+	rows = iter_sheet_rows(path)
+	head = list(itertools.islice(rows, 20))
+	if not head:
+		return [], iter(())
+	header_row = 0
+	for r, row in enumerate(head):
+		norms = [_norm(str(v or '').strip()) for v in row]
+		if sum(1 for v in norms if v in HEADER_HINTS) >= 3:
+			header_row = r
+			break
+	# sem cabeçalho reconhecido: primeira linha
+	headers = [str(v or '').strip() for v in head[header_row]]
+	return headers, itertools.chain(head[header_row + 1:], rows)
+
 
-	# construir mapa de cabeçalhos normalizados
-	norm_headers = [_norm(h) for h in headers]
-	idx_by_norm = { h:i for i,h in enumerate(norm_headers) }
-
-	# aliases por campo (normalizados)
-	aliases = {
-		'nome': ['membro','nome'],
-		'sexo': ['sexo','genero','genero biologico','genero biologico','genero biológico','genero biologico ','gênero'],
-		'concurso': ['concurso','classificacao','classificação'],
-		'cargo_efetivo': ['cargo efetivo','cargo_efetivo','cargo atual','cargo'],
-		'titularidade': ['titularidade'],
-		'email_pessoal': ['email pessoal','e-mail pessoal','email  pessoal','emailpessoal','e mail pessoal','email pessoal '],
-		'email_institucional': ['email institucional','e-mail institucional','mail institucional','email inst'],
-		'cargo_especial': ['cargo especial'],
-		'telefone_unidade': ['telefone unidade','tel unidade','telefone da unidade','telefone trabalho'],
-		'telefone_celular': ['telefone celular','celular','telefone movel','telefone móvel'],
-		'unidade_lotacao': ['unidade lotacao','unidade lotação','lotacao','lotação','unidade'],
-		'comarca_lotacao': ['comarca lotacao','comarca lotação','comarca','cidade'],
-		'time_extraprofissionais': ['time de futebol e outros grupos extraprofissionais','time extraprofissionais','grupos extraprofissionais','time de futebol'],
-		'quantidade_filhos': ['quantidade de filhos','qtd filhos','qtde filhos','numero de filhos','n filhos'],
-		'nomes_filhos': ['nome dos filhos','nomes dos filhos'],
-		'estado_origem': ['estado de origem','uf origem','uf'],
-		'academico': ['academico','acadêmico'],
-		'pretensao_carreira': ['pretensao de movimentacao na carreira','pretensão de movimentação na carreira','pretensao carreira'],
-		'carreira_anterior': ['carreira anterior'],
-		'lideranca': ['lideranca','liderança'],
-		'grupos_identitarios': ['grupos identitarios','grupos identitários','grupo identitarios','grupo identitário'],
-		'amigos_ids': ['amigos no mp (ids)','amigos mp (ids)','amigos mp ids','amigos (ids)']
-	}
+def column_getter(headers):
+	"""Função get(row, campo) que resolve o campo pelos aliases do cabeçalho."""
+	idx_by_norm = { _norm(h): i for i, h in enumerate(headers) }
 
 	def find_idx(keys):
 		for k in keys:
@@ -143,69 +135,497 @@ def import_membros(path, truncate):
 				return i
 		return None
 
-	map_idx = { field: find_idx(al) for field, al in aliases.items() }
+	map_idx = { field: find_idx(al) for field, al in IMPORT_ALIASES.items() }
 
 	def get(row, field):
 		i = map_idx.get(field)
-		if i is None:
+		if i is None or i >= len(row):
 			return None
 		val = row[i]
 		if isinstance(val, str):
 			val = val.strip()
 		return val if val != '' else None
 
-	created = []
+	# campos encontrados no cabeçalho
+	get.fields = set(f for f, i in map_idx.items() if i is not None)
+	return get
+
+
+def membro_values(row, get):
+	"""Colunas de membros a partir de uma linha da planilha."""
+	email_p = get(row,'email_pessoal')
+	email_i = get(row,'email_institucional')
+	qtd = get(row,'quantidade_filhos')
+	return dict(
+		nome = get(row,'nome'),
+		sexo = get(row,'sexo'),
+		concurso = str(get(row,'concurso') or '') or None,
+		cargo_efetivo = get(row,'cargo_efetivo'),
+		titularidade = get(row,'titularidade'),
+		email_pessoal = (email_p or email_i),
+		cargo_especial = get(row,'cargo_especial'),
+		telefone_unidade = str(get(row,'telefone_unidade') or '') or None,
+		telefone_celular = str(get(row,'telefone_celular') or '') or None,
+		unidade_lotacao = get(row,'unidade_lotacao'),
+		comarca_lotacao = get(row,'comarca_lotacao'),
+		time_extraprofissionais = get(row,'time_extraprofissionais'),
+		quantidade_filhos = (int(float(qtd)) if qtd not in (None,'') else None),
+		nomes_filhos = get(row,'nomes_filhos'),
+		estado_origem = (str(get(row,'estado_origem') or '')[:2].upper() or None),
+		academico = get(row,'academico'),
+		pretensao_carreira = get(row,'pretensao_carreira'),
+		carreira_anterior = get(row,'carreira_anterior'),
+		lideranca = get(row,'lideranca'),
+		grupos_identitarios = get(row,'grupos_identitarios'),
+	)
+
+
+def parse_amigos_ids(raw):
+	if raw is None:
+		return []
+	if isinstance(raw, float) and raw.is_integer():
+		raw = int(raw)
+	raw = str(raw).strip()
+	return [int(x) for x in filter(None, [s.strip() for s in raw.replace(';',',').replace('|',',').split(',')]) if x.isdigit()]
+
+
+def insert_amigos(pairs, batch=5000) -> int:
+	"""Grava pares (membro_id, amigo_id) no pivot, descartando amigos inexistentes e pares já gravados."""
+	pairs = set((a, b) for a, b in pairs if a != b)
+	if not pairs:
+		return 0
+	wanted = sorted(set(b for _, b in pairs))
+	existing = set()
+	for i in range(0, len(wanted), batch):
+		chunk = wanted[i:i+batch]
+		existing.update(r[0] for r in db.session.execute(select(Membro.id).where(Membro.id.in_(chunk))))
+	owners = sorted(set(a for a, _ in pairs))
+	linked = set()
+	for i in range(0, len(owners), batch):
+		chunk = owners[i:i+batch]
+		linked.update(tuple(r) for r in db.session.execute(
+			select(membro_amigos.c.membro_id, membro_amigos.c.amigo_id).where(membro_amigos.c.membro_id.in_(chunk))
+		))
+	rows = [{'membro_id': a, 'amigo_id': b} for a, b in sorted(pairs) if b in existing and (a, b) not in linked]
+	for i in range(0, len(rows), batch):
+		db.session.execute(membro_amigos.insert(), rows[i:i+batch])
+	return len(rows)
+
+
+def _reindex_where(cond, batch=1000) -> None:
+	cols = [Membro.id] + [getattr(Membro, f) for f in SEARCH_FIELDS]
+	last_id = 0
+	while True:
+		chunk = db.session.execute(
+			select(*cols).where(cond, Membro.id > last_id).order_by(Membro.id.asc()).limit(batch)
+		).all()
+		if not chunk:
+			break
+		reindex_tokens(db.session.connection(), chunk)
+		last_id = chunk[-1].id
+
+
+def reindex_from(last_id, batch=1000) -> None:
+	"""Índice de busca dos membros com id > last_id (inseridos via Core, sem eventos do ORM)."""
+	_reindex_where(Membro.id > last_id, batch)
+
+
+def reindex_ids(ids, batch=1000) -> None:
+	ids = sorted(ids)
+	for i in range(0, len(ids), batch):
+		_reindex_where(Membro.id.in_(ids[i:i+batch]), batch)
+
+
+def natural_key(values):
+	"""Chave natural do membro: e-mail ou nome normalizado + concurso (sha1)."""
+	email = str(values.get('email_pessoal') or '').strip().lower()
+	if email:
+		raw = 'email:' + email
+	else:
+		nome = ' '.join(_norm(values.get('nome') or '').split())
+		if not nome:
+			return None
+		raw = 'nome:' + nome + '|' + str(values.get('concurso') or '').strip()
+	return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def content_hash(values, amigos_ids=()):
+	payload = json.dumps([values, sorted(amigos_ids)], sort_keys=True, default=str, ensure_ascii=False)
+	return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def existing_import_keys():
+	"""{import_key: (id, import_hash)} dos membros já importados."""
+	rows = db.session.execute(
+		select(Membro.import_key, Membro.id, Membro.import_hash).where(Membro.import_key.isnot(None))
+	)
+	return { k: (i, h) for k, i, h in rows }
+
+
+def backfill_import_keys(known, batch=2000) -> int:
+	"""Atribui import_key aos membros anteriores à importação incremental (quando a chave está livre)."""
+	rows = db.session.execute(
+		select(Membro.id, Membro.nome, Membro.concurso, Membro.email_pessoal).where(Membro.import_key.is_(None)).order_by(Membro.id.asc())
+	).all()
+	updates = []
 	for r in rows:
-		email_p = get(r,'email_pessoal')
-		email_i = get(r,'email_institucional')
-		m = Membro(
-			nome = get(r,'nome'),
-			sexo = get(r,'sexo'),
-			concurso = str(get(r,'concurso') or '') or None,
-			cargo_efetivo = get(r,'cargo_efetivo'),
-			titularidade = get(r,'titularidade'),
-			email_pessoal = (email_p or email_i),
-			cargo_especial = get(r,'cargo_especial'),
-			telefone_unidade = str(get(r,'telefone_unidade') or '') or None,
-			telefone_celular = str(get(r,'telefone_celular') or '') or None,
-			unidade_lotacao = get(r,'unidade_lotacao'),
-			comarca_lotacao = get(r,'comarca_lotacao'),
-			time_extraprofissionais = get(r,'time_extraprofissionais'),
-			quantidade_filhos = (int(float(get(r,'quantidade_filhos'))) if (get(r,'quantidade_filhos') not in (None,'')) else None),
-			nomes_filhos = get(r,'nomes_filhos'),
-			estado_origem = (str(get(r,'estado_origem') or '')[:2].upper() or None),
-			academico = get(r,'academico'),
-			pretensao_carreira = get(r,'pretensao_carreira'),
-			carreira_anterior = get(r,'carreira_anterior'),
-			lideranca = get(r,'lideranca'),
-			grupos_identitarios = get(r,'grupos_identitarios'),
-		)
-		db.session.add(m)
-		created.append((m, r))
+		key = natural_key({'nome': r.nome, 'concurso': r.concurso, 'email_pessoal': r.email_pessoal})
+		if key and key not in known:
+			known[key] = (r.id, None)
+			updates.append({'_id': r.id, '_key': key})
+	table = Membro.__table__
+	stmt = table.update().where(table.c.id == bindparam('_id')).values(import_key=bindparam('_key'))
+	for i in range(0, len(updates), batch):
+		db.session.execute(stmt, updates[i:i+batch])
+	return len(updates)
+
+
+def upsert_membros(rows, cols) -> None:
+	"""INSERT ... ON DUPLICATE KEY UPDATE (ou ON CONFLICT) em lote, casando por import_key; `cols` são as colunas atualizadas."""
+	table = Membro.__table__
+	dialect = db.session.get_bind().dialect.name
+	if dialect == 'mysql':
+		from sqlalchemy.dialects.mysql import insert as dialect_insert
+		stmt = dialect_insert(table)
+		stmt = stmt.on_duplicate_key_update({ c: stmt.inserted[c] for c in cols })
+	elif dialect in ('sqlite', 'postgresql'):
+		if dialect == 'sqlite':
+			from sqlalchemy.dialects.sqlite import insert as dialect_insert
+		else:
+			from sqlalchemy.dialects.postgresql import insert as dialect_insert
+		stmt = dialect_insert(table)
+		stmt = stmt.on_conflict_do_update(index_elements=['import_key'], set_={ c: stmt.excluded[c] for c in cols })
+	else:
+		raise click.ClickException(f'Importação incremental não suportada no banco {dialect} (use mysql, postgresql ou sqlite)')
+	db.session.execute(stmt, rows)
+
+
+def truncate_membros() -> bool:
+	"""Apaga os membros e as tabelas que dependem deles; informa cada tabela que falhar e não apaga os membros."""
+	ok = True
+	# pivot e tabelas derivadas primeiro
+	for table in ('membro_amigos', 'membro_search_tokens', 'membro_parentes', 'membro_familias'):
+		try:
+			with db.session.begin_nested():
+				db.session.execute(db.text(f'DELETE FROM {table}'))
+		except Exception as e:
+			click.echo(f'Falha ao limpar {table}: {str(e)[:200]}')
+			ok = False
+	if not ok:
+		db.session.rollback()
+		click.echo('Limpeza cancelada; nada foi apagado.')
+		return False
+	Membro.query.delete()
 	db.session.commit()
+	return True
 
-	# relacionamentos por IDs
-	amigos_col = map_idx.get('amigos_ids')
-	if amigos_col is not None:
-		for m, row in created:
-			raw_ids = row[amigos_col]
-			if raw_ids is None:
-				continue
-			if not isinstance(raw_ids, str):
-				raw_ids = str(raw_ids)
-			raw_ids = raw_ids.strip()
-			if not raw_ids:
-				continue
-			ids = [int(x) for x in filter(None, [s.strip() for s in raw_ids.replace(';',',').replace('|',',').split(',')]) if x.isdigit()]
-			if not ids:
-				continue
-			friends = Membro.query.filter(Membro.id.in_(ids)).all()
-			for f in friends:
-				if f.id != m.id and f not in m.amigos:
-					m.amigos.append(f)
-		db.session.commit()
 
-	click.echo(f'Importados: {len(created)} (com relacionamentos quando informados)')
+def insert_membros(rows, keys) -> dict:
+	"""INSERT em lote; retorna {import_key: id} das chaves pedidas, lidas de volta pela chave natural."""
+	db.session.execute(Membro.__table__.insert(), rows)
+	if not keys:
+		return {}
+	return dict(db.session.execute(select(Membro.import_key, Membro.id).where(Membro.import_key.in_(keys))).all())
+
+
+class Progress:
+	"""Linhas processadas e taxa (linhas/s) a cada `every` linhas."""
+
+	def __init__(self, every=5000):
+		self.every = every
+		self.count = 0
+		self.started = time.monotonic()
+		self._next = every
+
+	def add(self, n) -> None:
+		self.count += n
+		if self.count >= self._next:
+			self._next += self.every
+			click.echo(f'  {self.count} linhas ({self.rate():.0f}/s)')
+
+	def rate(self) -> float:
+		return self.count / max(time.monotonic() - self.started, 1e-6)
+
+
+@app.cli.command('import-municipios')
+@click.argument('path', required=False)
+@click.option('--uf', default=geo.DEFAULT_UF, show_default=True, help='UF dos municípios do arquivo')
+@click.option('--names', 'names_path', default=None, help='JSON de localidades do IBGE (id, nome) para malhas sem nome')
+@with_appcontext
+def import_municipios(path, uf, names_path):
+	"""Importa municípios (código IBGE, nome, centróide) de um GeoJSON do IBGE; sem PATH, usa static/mg.geo.json.
+
+	Malhas de outras UFs: https://servicodados.ibge.gov.br/api/v3/malhas/estados/<UF>?intrarregiao=municipio&formato=application/vnd.geo+json
+	traz só o código (codarea); os nomes vêm de .../api/v1/localidades/estados/<UF>/municipios, passado em --names.
+	"""
+	uf = uf.strip().upper()
+	if uf not in geo.UF_INFO:
+		click.echo(f'UF inválida: {uf}')
+		return
+	data = geo.load_geojson(path)
+	names = None
+	if names_path:
+		with open(names_path, 'r', encoding='utf-8') as f:
+			names = { int(it['id']): it['nome'] for it in json.load(f) if it.get('id') and it.get('nome') }
+	total = geo.import_geojson(db.session.connection(), data, uf, names)
+	# Core na conexão não passa pelos eventos do ORM: a versão sobe junto com as linhas (e os workers recarregam o índice)
+	cache.bump_version(geo.SCOPE, db.session.connection())
+	db.session.commit()
+	geo.reload()
+	click.echo(f'Municípios importados ({uf}): {total}')
+
+
+@app.cli.command('build-geo')
+@click.argument('path', required=False)
+@click.option('--uf', default=geo.DEFAULT_UF, show_default=True, help='UF da malha')
+@click.option('--names', 'names_path', default=None, help='JSON de localidades do IBGE (id, nome) para malhas sem nome')
+@with_appcontext
+def build_geo(path, uf, names_path):
+	"""Gera a malha simplificada do mapa (níveis em geo.SIMPLIFY_LEVELS), pré-comprimida e com hash no nome."""
+	uf = uf.strip().upper()
+	if uf not in geo.UF_INFO:
+		click.echo(f'UF inválida: {uf}')
+		return
+	names = None
+	if names_path:
+		with open(names_path, 'r', encoding='utf-8') as f:
+			names = { int(it['id']): it['nome'] for it in json.load(f) if it.get('id') and it.get('nome') }
+	built = geo.build_assets(geo.load_geojson(path), uf, names)
+	for level, (name, size) in built.items():
+		click.echo(f'{level}: {name} ({size // 1024} KB)')
+	try:
+		import brotli  # noqa: F401
+	except ImportError:
+		click.echo('Pacote brotli não instalado: gerados apenas .gz')
+
+
+def _photo_job(job):
+	# roda em outro processo: só caminhos e ids, sem sessão nem contexto de aplicação
+	member_id, src = job
+	try:
+		return member_id, photos.process(member_id, src), None
+	except Exception as e:
+		return member_id, None, str(e)[:200]
+
+
+def save_photo_paths(stmt, updates) -> None:
+	db.session.execute(stmt, updates)
+	db.session.commit()
+	# derivados anteriores só saem com o novo foto_path já gravado
+	for u in updates:
+		photos.prune(u['b_id'], u['b_path'])
+
+
+@app.cli.command('build-photos')
+@click.option('--workers', default=os.cpu_count() or 2, show_default=True, help='Processos em paralelo')
+@click.option('--force', is_flag=True, help='Reprocessa também fotos que já têm derivados')
+@with_appcontext
+def build_photos(workers, force):
+	"""Gera os derivados (miniatura, modal, PDF em WebP + JPEG) das fotos já cadastradas."""
+	rows = db.session.query(Membro.id, Membro.foto_path).filter(Membro.foto_path.isnot(None), Membro.foto_path != '').all()
+	jobs = []
+	missing = 0
+	for member_id, foto_path in rows:
+		if photos.is_processed(foto_path) and not force:
+			continue
+		src = photos.file_path(foto_path) if not photos.is_processed(foto_path) else None
+		if not src or not os.path.isfile(src):
+			src = photos.original_path(member_id)
+		if not src:
+			missing += 1
+			continue
+		jobs.append((member_id, src))
+	click.echo(f'Fotos a processar: {len(jobs)} (sem arquivo: {missing})')
+	if not jobs:
+		return
+	table = Membro.__table__
+	stmt = table.update().where(table.c.id == bindparam('b_id')).values(foto_path=bindparam('b_path'))
+	progress = Progress(every=100)
+	updates = []
+	failed = 0
+	with ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+		for member_id, foto_path, error in pool.map(_photo_job, jobs, chunksize=4):
+			if error:
+				failed += 1
+				click.echo(f'  #{member_id}: {error}')
+			else:
+				updates.append({'b_id': member_id, 'b_path': foto_path})
+			progress.add(1)
+			if len(updates) >= 500:
+				save_photo_paths(stmt, updates)
+				updates = []
+	if updates:
+		save_photo_paths(stmt, updates)
+	click.echo(f'Fotos processadas: {len(jobs) - failed} (falhas: {failed}) em {time.monotonic() - progress.started:.1f}s')
+
+
+@app.cli.command('rebuild-kinship')
+@with_appcontext
+def rebuild_kinship():
+	"""Reconstrói famílias e fecho de parentescos (membro_familias, membro_parentes)."""
+	families = kinship.rebuild_all(db.session.connection())
+	db.session.commit()
+	click.echo(f'Famílias: {families}')
+
+
+@app.cli.command('import-membros')
+@click.argument('path')
+@click.option('--truncate', is_flag=True, help='Limpa tabelas antes de importar')
+@click.option('--incremental', is_flag=True, help='Atualiza só o que mudou, casando por e-mail ou nome+concurso')
+@click.option('--batch', default=2000, show_default=True, help='Linhas por INSERT em lote')
+@with_appcontext
+def import_membros(path, truncate, incremental, batch):
+	path = os.path.abspath(path)
+	if not os.path.exists(path):
+		click.echo(f'Arquivo não encontrado: {path}')
+		return
+	ext = os.path.splitext(path)[1].lower()
+	if ext not in ('.xls', '.xlsx'):
+		click.echo('Formato não suportado. Use .xls ou .xlsx')
+		return
+	if truncate and incremental:
+		click.echo('Use --truncate ou --incremental, não ambos')
+		return
+	if truncate:
+		if not truncate_membros():
+			return
+
+	headers, data = read_sheet(path)
+	get = column_getter(headers)
+	if incremental:
+		return import_incremental(data, get, batch)
+	table = Membro.__table__
+	known = existing_import_keys()
+	# só para reindexar a busca: todo id inserido a seguir fica acima deste
+	last_id = db.session.execute(select(func.max(Membro.id))).scalar() or 0
+	progress = Progress()
+	amigos_by_key = {}
+	key_to_id = {}
+	pairs = []
+	lookup_pairs = set()
+	pending = []
+	inserted = 0
+	for row in data:
+		if not any(v not in (None, '') for v in row):
+			continue
+		values = membro_values(row, get)
+		friend_ids = parse_amigos_ids(get(row, 'amigos_ids'))
+		key = natural_key(values)
+		# chave já usada (no banco ou repetida na planilha): insere sem chave, como antes
+		if key and key not in known:
+			digest = content_hash(values, friend_ids)
+			known[key] = (None, digest)
+		else:
+			key = digest = None
+		values['import_key'] = key
+		values['import_hash'] = digest
+		lookup_pairs |= lookups.values_of(values)
+		if friend_ids and not key:
+			# sem chave para reencontrar a linha depois: INSERT próprio, com o id devolvido pelo banco
+			new_id = db.session.execute(table.insert().values(**values)).inserted_primary_key[0]
+			pairs.extend((new_id, f) for f in friend_ids)
+			inserted += 1
+			progress.add(1)
+			continue
+		pending.append(values)
+		if friend_ids:
+			amigos_by_key[key] = friend_ids
+		if len(pending) >= batch:
+			key_to_id.update(insert_membros(pending, [v['import_key'] for v in pending if v['import_key'] in amigos_by_key]))
+			inserted += len(pending)
+			progress.add(len(pending))
+			pending = []
+	if pending:
+		key_to_id.update(insert_membros(pending, [v['import_key'] for v in pending if v['import_key'] in amigos_by_key]))
+		inserted += len(pending)
+		progress.add(len(pending))
+
+	# relacionamentos por IDs, num único passe
+	pairs.extend((key_to_id[k], f) for k, ids in amigos_by_key.items() if k in key_to_id for f in ids)
+	linked = insert_amigos(pairs)
+	reindex_from(last_id)
+	if lookups.ensure(db.session.connection(), lookup_pairs):
+		# na transação da importação: os workers passam a ver a versão nova junto com os dados
+		cache.bump_version('lookups', db.session.connection())
+	# INSERT em lote não passa pelos eventos do ORM do servidor; o commit sobe as versões 'membros' e 'nomes'
+	# (cache_versions) e cada worker reconstrói o autocomplete na próxima conferência (typeahead.VERSION_RECHECK)
+	db.session.commit()
+
+	click.echo(f'Importados: {inserted} membros, {linked} relacionamentos ({progress.rate():.0f} linhas/s)')
+
+
+def import_incremental(data, get, batch) -> None:
+	"""Upsert por chave natural: só linhas novas ou com hash diferente são gravadas."""
+	known = existing_import_keys()
+	backfilled = backfill_import_keys(known)
+	progress = Progress()
+	seen = set()
+	amigos_by_key = {}
+	written = []
+	lookup_pairs = set()
+	counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'duplicated': 0, 'skipped': 0}
+	# atualização só das colunas presentes na planilha: o que foi editado no sistema e não vem nela é preservado
+	update_cols = [c for c in IMPORT_ALIASES if c in get.fields and c not in ('email_institucional', 'amigos_ids')]
+	if 'email_institucional' in get.fields and 'email_pessoal' not in update_cols:
+		update_cols.append('email_pessoal')
+	update_cols.append('import_hash')
+	pending = []
+	for row in data:
+		if not any(v not in (None, '') for v in row):
+			continue
+		progress.add(1)
+		values = membro_values(row, get)
+		key = natural_key(values)
+		if not key:
+			counts['skipped'] += 1
+			continue
+		if key in seen:
+			counts['duplicated'] += 1
+			continue
+		seen.add(key)
+		friend_ids = parse_amigos_ids(get(row, 'amigos_ids'))
+		digest = content_hash(values, friend_ids)
+		old = known.get(key)
+		if old and old[1] == digest:
+			counts['unchanged'] += 1
+			continue
+		counts['updated' if old else 'inserted'] += 1
+		if friend_ids:
+			amigos_by_key[key] = friend_ids
+		values['import_key'] = key
+		values['import_hash'] = digest
+		lookup_pairs |= lookups.values_of(values)
+		pending.append(values)
+		written.append(key)
+		if len(pending) >= batch:
+			upsert_membros(pending, update_cols)
+			pending = []
+	if pending:
+		upsert_membros(pending, update_cols)
+
+	# ids dos membros gravados (novos inclusive), por chave
+	key_to_id = {}
+	for i in range(0, len(written), batch):
+		chunk = written[i:i+batch]
+		key_to_id.update((k, mid) for k, mid in db.session.execute(
+			select(Membro.import_key, Membro.id).where(Membro.import_key.in_(chunk))
+		))
+	pairs = [(key_to_id[k], f) for k, ids in amigos_by_key.items() if k in key_to_id for f in ids]
+	linked = insert_amigos(pairs)
+	reindex_ids(key_to_id.values())
+	if lookups.ensure(db.session.connection(), lookup_pairs):
+		# na transação da importação: os workers passam a ver a versão nova junto com os dados
+		cache.bump_version('lookups', db.session.connection())
+	db.session.commit()
+	# membros já importados que não vieram na planilha: só informados, nunca apagados
+	orphaned = len(set(known) - seen)
+
+	click.echo(
+		f"Inseridos: {counts['inserted']}, atualizados: {counts['updated']}, inalterados: {counts['unchanged']}, "
+		f"órfãos: {orphaned}, repetidos na planilha: {counts['duplicated']}, sem chave: {counts['skipped']}, "
+		f"relacionamentos novos: {linked}, chaves atribuídas a membros antigos: {backfilled} "
+		f"({progress.rate():.0f} linhas/s)"
+	)
 
 
 @app.cli.command('seed-demo')
@@ -214,13 +634,8 @@ def import_membros(path, truncate):
 def seed_demo(force):
 	# opcionalmente limpar tabelas
 	if force:
-		try:
-			# limpar pivot primeiro
-			db.session.execute(db.text('DELETE FROM membro_amigos'))
-		except Exception:
-			pass
-		Membro.query.delete()
-		db.session.commit()
+		if not truncate_membros():
+			return
 	if Membro.query.count() > 0:
 		click.echo('Já existem membros, não será duplicado.')
 		return
@@ -0,0 +1,89 @@
+import os
+import tempfile
+
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from sqlalchemy.dialects.mysql import BIGINT
+from sqlalchemy.ext.compiler import compiles
+
+# banco sqlite descartável; precisa estar no ambiente antes de config.py ser importado
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='membro-tests-'), 'test.db')
+
+from app import create_app, geo, graph, typeahead  # noqa: E402
+from app.db import db  # noqa: E402
+from app.models import Membro, membro_amigos  # noqa: E402
+
+
+@compiles(BIGINT, 'sqlite')
+def _bigint_sqlite(type_, compiler, **kw):
+	# os modelos usam BIGINT UNSIGNED do MySQL; no sqlite só INTEGER PRIMARY KEY é autoincremento
+	return 'INTEGER'
+
+
+class QueryCounter:
+	"""Conta os comandos SQL enviados ao banco dentro do bloco with."""
+
+	def __init__(self, engine):
+		self.engine = engine
+		self.count = 0
+
+	def _on_execute(self, *args, **kwargs):
+		self.count += 1
+
+	def __enter__(self):
+		event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+		return self
+
+	def __exit__(self, *exc):
+		event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+@pytest.fixture
+def app():
+	app = create_app()
+	app.config.update(TESTING=True)
+	with app.app_context():
+		db.drop_all()
+		db.create_all()
+		# índices em memória são globais do módulo: não podem sobreviver ao banco do teste anterior
+		typeahead.invalidate()
+		graph.invalidate()
+		geo.reload()
+		yield app
+		db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+	return app.test_client()
+
+
+@pytest.fixture
+def headers(app):
+	token = create_access_token(identity='1', additional_claims={'role': 'admin'})
+	return {'Authorization': 'Bearer ' + token}
+
+
+@pytest.fixture
+def queries(app):
+	return lambda: QueryCounter(db.engine)
+
+
+@pytest.fixture
+def seed(app):
+	def make(n, friends=2):
+		"""n membros; cada um com `friends` amigos (os seguintes, em círculo)."""
+		comarcas = ['BELO HORIZONTE', 'CONTAGEM', 'UBERLÂNDIA']
+		ms = [
+			Membro(nome=f'MEMBRO {i:03d}', sexo='Feminino' if i % 2 else 'Masculino', comarca_lotacao=comarcas[i % 3], concurso=str(2000 + i % 5))
+			for i in range(n)
+		]
+		db.session.add_all(ms)
+		db.session.commit()
+		pairs = [{'membro_id': m.id, 'amigo_id': ms[(i + j) % n].id} for i, m in enumerate(ms) for j in range(1, friends + 1) if n > j]
+		if pairs:
+			db.session.execute(membro_amigos.insert(), pairs)
+			db.session.commit()
+		return ms
+	return make
@@ -0,0 +1,46 @@
+from app import cache
+from app.db import db
+from app.models import Membro
+
+
+def test_get_or_set_computes_once_per_version(app):
+	calls = []
+
+	def compute():
+		calls.append(1)
+		return len(calls)
+
+	assert cache.get_or_set('t', 'k', compute) == 1
+	assert cache.get_or_set('t', 'k', compute) == 1
+	cache.bump_version('membros')
+	assert cache.get_or_set('t', 'k', compute) == 2
+	assert len(calls) == 2
+
+
+def test_get_or_set_skips_store_when_version_moves(app):
+	calls = []
+
+	def compute():
+		calls.append(1)
+		if len(calls) == 1:
+			# gravação concorrente durante o cálculo: o resultado pode estar velho
+			with db.engine.begin() as conn:
+				cache.bump_version('membros', conn)
+		return len(calls)
+
+	assert cache.get_or_set('t', 'k', compute) == 1
+	assert cache.get_or_set('t', 'k', compute) == 2
+	assert cache.get_or_set('t', 'k', compute) == 2
+	assert len(calls) == 2
+
+
+def test_with_etag_returns_304_until_a_write(client, headers, seed):
+	id_ = seed(2, friends=0)[0].id
+	r = client.get(f'/api/membros/{id_}', headers=headers)
+	tag = r.headers['ETag']
+	r = client.get(f'/api/membros/{id_}', headers={**headers, 'If-None-Match': tag})
+	assert r.status_code == 304 and r.data == b'' and r.headers['ETag'] == tag
+	db.session.get(Membro, id_).comarca_lotacao = 'BETIM'
+	db.session.commit()
+	r = client.get(f'/api/membros/{id_}', headers={**headers, 'If-None-Match': tag})
+	assert r.status_code == 200 and r.headers['ETag'] != tag
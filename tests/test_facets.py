@@ -0,0 +1,14 @@
+import json
+
+from app.db import db
+
+
+def test_facets_keep_integer_values(client, headers, seed):
+	ms = seed(4, friends=0)
+	for m, filhos in zip(ms, (0, 2, 2, None)):
+		m.quantidade_filhos = filhos
+	db.session.commit()
+	fields = json.dumps(['Quantidade de filhos', 'Sexo'])
+	facets = client.get('/api/membros/facets', query_string={'fields': fields}, headers=headers).get_json()['facets']
+	assert facets['Quantidade de filhos'] == [{'v': 2, 'c': 2}, {'v': 0, 'c': 1}]
+	assert {it['v'] for it in facets['Sexo']} == {'Feminino', 'Masculino'}
@@ -0,0 +1,19 @@
+from app import cache, geo
+from app.db import db
+from app.models import Municipio
+
+
+def test_index_reloads_when_municipios_version_moves(app, client, headers):
+	app.config.update(MUNICIPIOS_UPSTREAM=False)
+	url = '/api/municipios/info?nome=Vila Nova do Teste&uf=SP&enrich=0'
+	assert client.get(url, headers=headers).get_json()['data']['id'] is None
+	# importação em outro processo: linhas e versão na mesma transação
+	with db.engine.begin() as conn:
+		conn.execute(Municipio.__table__.insert(), [{
+			'codigo': 3599999, 'nome': 'Vila Nova do Teste', 'nome_norm': geo.name_key('Vila Nova do Teste'),
+			'uf': 'SP', 'lat': -23.5, 'lon': -46.6,
+		}])
+		cache.bump_version(geo.SCOPE, conn)
+	body = client.get(url, headers=headers).get_json()
+	assert body['data']['id'] == 3599999
+	assert body['data']['centroide'] == {'lat': -23.5, 'lon': -46.6}
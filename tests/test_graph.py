@@ -0,0 +1,31 @@
+from app import cache, graph
+from app.db import db
+from app.models import Membro, membro_amigos
+
+
+def test_degree_sees_write_from_other_connection(client, headers, seed):
+	ms = seed(4, friends=1)
+	a, c = ms[0].id, ms[2].id
+	r = client.get(f'/api/graph/degree?id={a}', headers=headers)
+	assert r.get_json()['degree'] == 2
+	tag = r.headers['ETag']
+	# outro worker/CLI: grava em conexão própria e sobe a versão na mesma transação
+	with db.engine.begin() as conn:
+		conn.execute(membro_amigos.insert(), [{'membro_id': a, 'amigo_id': c}])
+		cache.bump_version(graph.SCOPE, conn)
+	r = client.get(f'/api/graph/degree?id={a}', headers={**headers, 'If-None-Match': tag})
+	assert r.status_code == 200
+	assert r.get_json()['degree'] == 3
+	assert r.headers['ETag'] != tag
+
+
+def test_local_commit_applies_delta_without_rebuild(client, headers, seed, monkeypatch):
+	ms = seed(4, friends=1)
+	a, c = ms[0].id, ms[2].id
+	assert client.get(f'/api/graph/degree?id={a}', headers=headers).get_json()['degree'] == 2
+	calls = []
+	monkeypatch.setattr(graph, '_load', lambda: calls.append(1))
+	db.session.get(Membro, a).amigos.append(db.session.get(Membro, c))
+	db.session.commit()
+	assert client.get(f'/api/graph/degree?id={a}', headers=headers).get_json()['degree'] == 3
+	assert calls == []
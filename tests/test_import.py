@@ -0,0 +1,43 @@
+from openpyxl import Workbook
+
+from app.db import db
+from app.models import Membro
+
+HEADER = ['Membro', 'Concurso', 'E-mail pessoal', 'Comarca']
+
+
+def _sheet(path, rows):
+	wb = Workbook()
+	wb.active.append(HEADER)
+	for row in rows:
+		wb.active.append(row)
+	wb.save(path)
+	return str(path)
+
+
+def _import(path):
+	import manage
+	result = manage.app.test_cli_runner().invoke(args=['import-membros', path, '--incremental'])
+	assert result.exit_code == 0, result.output
+	return result.output
+
+
+def test_incremental_import_counts(app, tmp_path):
+	first = _sheet(tmp_path / 'a.xlsx', [
+		['ANA', '2001', 'ana@example.com', 'BELO HORIZONTE'],
+		['BRUNO', '2002', None, 'CONTAGEM'],
+		['CAIO', '2003', None, 'BETIM'],
+	])
+	assert 'Inseridos: 3, atualizados: 0, inalterados: 0, órfãos: 0' in _import(first)
+
+	second = _sheet(tmp_path / 'b.xlsx', [
+		['ANA', '2001', 'ana@example.com', 'UBERLÂNDIA'],
+		['BRUNO', '2002', None, 'CONTAGEM'],
+		['DORA', '2004', None, 'BETIM'],
+	])
+	assert 'Inseridos: 1, atualizados: 1, inalterados: 1, órfãos: 1' in _import(second)
+
+	db.session.expire_all()
+	rows = dict(db.session.query(Membro.nome, Membro.comarca_lotacao).all())
+	# órfão é só informado, nunca apagado
+	assert rows == {'ANA': 'UBERLÂNDIA', 'BRUNO': 'CONTAGEM', 'CAIO': 'BETIM', 'DORA': 'BETIM'}
@@ -0,0 +1,54 @@
+def _relate(client, headers, a, b, degree):
+	r = client.post(f'/api/membros/{a}/relationships', json={'target_id': b, 'degree': degree}, headers=headers)
+	assert r.status_code == 200, r.get_json()
+	return r.get_json()['id']
+
+
+def _relations(client, headers, id_):
+	body = client.get(f'/api/membros/{id_}/family', headers=headers).get_json()
+	return {r['id']: (r['relation'], r['distance']) for r in body['relatives']}, body['familia_id']
+
+
+def test_closure_composes_parent_child_sibling_spouse(client, headers, seed):
+	g, p, u, x, s, b, c = (m.id for m in seed(7, friends=0))
+	_relate(client, headers, g, p, 'child')
+	_relate(client, headers, p, u, 'sibling')
+	_relate(client, headers, p, x, 'child')
+	_relate(client, headers, x, s, 'spouse')
+	_relate(client, headers, x, b, 'sibling')
+	_relate(client, headers, u, c, 'child')
+
+	rel, _ = _relations(client, headers, x)
+	assert rel == {
+		p: ('parent', 1), s: ('spouse', 1), b: ('sibling', 1),
+		g: ('grandparent', 2), u: ('uncle', 2), c: ('cousin', 3),
+	}
+	rel, _ = _relations(client, headers, g)
+	assert rel == {
+		p: ('child', 1), u: ('child', 2), x: ('grandchild', 2), c: ('grandchild', 3),
+		b: ('grandchild', 3), s: ('grandchild_in_law', 3),
+	}
+	rel, _ = _relations(client, headers, u)
+	assert rel[x] == ('nephew', 2) and rel[b] == ('nephew', 3) and rel[s] == ('nephew_in_law', 3)
+	assert rel[g] == ('parent', 2)
+	rel, _ = _relations(client, headers, c)
+	assert rel[p] == ('uncle', 2) and rel[x] == ('cousin', 3) and rel[g] == ('grandparent', 3)
+
+
+def test_family_splits_after_relationship_delete(client, headers, seed):
+	g, p, u, x, c = (m.id for m in seed(5, friends=0))
+	_relate(client, headers, g, p, 'child')
+	link = _relate(client, headers, p, u, 'sibling')
+	_relate(client, headers, p, x, 'child')
+	_relate(client, headers, u, c, 'child')
+	_, fam = _relations(client, headers, c)
+	assert fam == min(g, p, u, x, c)
+	assert client.get(f'/api/familias/{fam}', headers=headers).get_json()['size'] == 5
+
+	assert client.delete(f'/api/relationships/{link}', headers=headers).status_code == 200
+	rel_x, fam_x = _relations(client, headers, x)
+	rel_c, fam_c = _relations(client, headers, c)
+	assert fam_x == min(g, p, x) and fam_c == min(u, c)
+	assert set(rel_x) == {g, p} and set(rel_c) == {u}
+	sizes = {f: client.get(f'/api/familias/{f}', headers=headers).get_json()['size'] for f in (fam_x, fam_c)}
+	assert sizes == {fam_x: 3, fam_c: 2}
@@ -0,0 +1,28 @@
+import logging
+
+from app import lookups
+from app.db import db
+from app.models import Lookup, Membro
+
+
+def test_populate_limits_by_characters(client, headers):
+	# 200 letras acentuadas passam de 255 bytes, mas cabem na coluna
+	fits, too_long = 'Á' * 200, 'É' * 256
+	db.session.add_all([Membro(nome='A', comarca_lotacao=fits), Membro(nome='B', comarca_lotacao=too_long)])
+	db.session.commit()
+	db.session.query(Lookup).delete()
+	db.session.commit()
+	assert client.post('/api/lookups/populate-from-membros', headers=headers).status_code == 200
+	values = {v for v, in db.session.query(Lookup.value).filter(Lookup.type == 'comarca_lotacao')}
+	assert values == {fits}
+
+
+def test_lookup_failure_after_commit_is_logged(app, monkeypatch, caplog):
+	def fail(conn, pairs):
+		raise RuntimeError('sem conexão')
+	monkeypatch.setattr(lookups, 'ensure', fail)
+	db.session.add(Membro(nome='C', comarca_lotacao='BETIM'))
+	with caplog.at_level(logging.ERROR):
+		db.session.commit()
+	assert db.session.query(Membro).filter(Membro.nome == 'C').count() == 1
+	assert any('cadastros' in r.getMessage() and r.exc_info for r in caplog.records)
@@ -0,0 +1,24 @@
+from app.db import db
+from app.models import Membro
+
+
+def test_cursor_walk_covers_every_row_once(client, headers, seed):
+	seed(7, friends=0)
+	# nomes nulos (vêm primeiro) e repetidos, espalhados pelas bordas das páginas
+	db.session.add_all([Membro(nome=None) for _ in range(5)] + [Membro(nome='MEMBRO 003') for _ in range(6)])
+	db.session.commit()
+	expected = [m.id for m in Membro.query.order_by(Membro.nome.asc(), Membro.id.asc())]
+	for per_page in (1, 3, 4, 50):
+		seen = []
+		token = ''
+		pages = 0
+		while True:
+			body = client.get('/api/membros', query_string={'cursor': token, 'per_page': per_page}, headers=headers).get_json()
+			assert body['total'] == len(expected)
+			seen += [row['id'] for row in body['data']]
+			pages += 1
+			token = body['next_cursor']
+			if not token:
+				break
+			assert pages <= len(expected)
+		assert seen == expected, per_page
@@ -0,0 +1,148 @@
+"""Consultas remotas de /municipios/info contra servidores HTTP locais (sem rede)."""
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+import urllib.error
+
+import pytest
+
+from app.routes import municipios
+from app.routes.municipios import CircuitBreaker, UpstreamUnavailable
+
+NOME = 'Cidade Inventada'
+
+
+class Stub:
+	"""Servidor HTTP local; routes: prefixo do caminho -> (status, corpo JSON, atraso em s)."""
+
+	def __init__(self):
+		self.routes = {}
+		self.hits = []
+		stub = self
+
+		class Handler(BaseHTTPRequestHandler):
+			def do_GET(self):
+				stub.hits.append(self.path)
+				status, body, delay = next((v for k, v in stub.routes.items() if self.path.startswith(k)), (404, {}, 0))
+				time.sleep(delay)
+				raw = json.dumps(body).encode('utf-8')
+				try:
+					self.send_response(status)
+					self.send_header('Content-Type', 'application/json')
+					self.send_header('Content-Length', str(len(raw)))
+					self.end_headers()
+					self.wfile.write(raw)
+				except OSError:
+					pass  # cliente já desistiu (prazo esgotado)
+
+			def log_message(self, *args):
+				pass
+
+		self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+		self.server.daemon_threads = True
+		self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+		threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+	def count(self, prefix) -> int:
+		return sum(1 for p in self.hits if p.startswith(prefix))
+
+	def close(self) -> None:
+		self.server.shutdown()
+		self.server.server_close()
+
+
+BY_NAME = '/api/v1/localidades/municipios?'
+IBGE_UF = '/api/v1/localidades/estados/MG/municipios'
+BRASILAPI = '/api/ibge/municipios/v1/MG'
+
+
+def item(codigo, nome=NOME):
+	return {'id': codigo, 'nome': nome, 'microrregiao': {'nome': 'Micro', 'mesorregiao': {'nome': 'Meso', 'UF': {'sigla': 'MG', 'nome': 'Minas Gerais'}}}}
+
+
+@pytest.fixture
+def stub(app, monkeypatch):
+	s = Stub()
+	app.config.update(
+		MUNICIPIOS_UPSTREAM=True, MUNICIPIOS_ENRICH=False,
+		MUNICIPIOS_IBGE_URL=s.url, MUNICIPIOS_BRASILAPI_URL=s.url,
+		MUNICIPIOS_TIMEOUT=2, MUNICIPIOS_DEADLINE=1,
+	)
+	monkeypatch.setitem(municipios.BREAKERS, 'ibge', CircuitBreaker(failures=3, cooldown=0.3))
+	monkeypatch.setitem(municipios.BREAKERS, 'brasilapi', CircuitBreaker(failures=3, cooldown=0.3))
+	# pool próprio: consultas lentas que passaram do prazo terminam aqui, sem gravar no cache do teste seguinte
+	pool = ThreadPoolExecutor(max_workers=8)
+	monkeypatch.setattr(municipios, '_pool', pool)
+	yield s
+	pool.shutdown(wait=True)
+	s.close()
+
+
+def info(client, headers):
+	r = client.get('/api/municipios/info', query_string={'nome': NOME, 'uf': 'MG'}, headers=headers)
+	assert r.status_code == 200
+	return r.get_json()['data']
+
+
+def test_first_valid_answer_wins(client, headers, stub):
+	stub.routes = {
+		BY_NAME: (200, [], 0),                   # resposta vazia: não conta
+		IBGE_UF: (200, [item(1)], 0.8),          # válida, mas lenta
+		BRASILAPI: (200, [{'codigo_ibge': 2, 'nome': NOME}], 0),
+	}
+	started = time.monotonic()
+	data = info(client, headers)
+	assert data['id'] == 2
+	assert time.monotonic() - started < 0.7
+
+
+def test_deadline_is_honored(client, headers, stub):
+	stub.routes = {BY_NAME: (200, [item(1)], 1.5), IBGE_UF: (200, [item(1)], 1.5), BRASILAPI: (200, [item(2)], 1.5)}
+	started = time.monotonic()
+	data = info(client, headers)
+	elapsed = time.monotonic() - started
+	# fallback mínimo assim que o prazo (1 s) acaba, sem esperar as respostas de 1,5 s
+	assert data['id'] is None
+	assert 0.9 <= elapsed < 1.4
+
+
+def test_breaker_opens_after_three_failures_and_half_opens(app, stub):
+	stub.routes = {BY_NAME: (500, {}, 0)}
+	url = stub.url + BY_NAME + 'nome=x'
+	breaker = municipios.BREAKERS['ibge']
+	for _ in range(3):
+		with pytest.raises(urllib.error.HTTPError):
+			municipios._fetch('ibge', url, 1)
+	assert breaker.state == 'open'
+	# aberto: nem chega ao servidor
+	with pytest.raises(UpstreamUnavailable):
+		municipios._fetch('ibge', url, 1)
+	assert stub.count(BY_NAME) == 3
+
+	time.sleep(0.35)
+	assert breaker.state == 'half-open'
+	# uma tentativa passa; falhou, volta a abrir
+	with pytest.raises(urllib.error.HTTPError):
+		municipios._fetch('ibge', url, 1)
+	assert stub.count(BY_NAME) == 4
+	assert breaker.state == 'open'
+
+	stub.routes = {BY_NAME: (200, [item(1)], 0)}
+	time.sleep(0.35)
+	assert municipios._fetch('ibge', url, 1)[0]['id'] == 1
+	assert breaker.state == 'closed'
+
+
+def test_failures_are_not_cached(app, stub):
+	cfg = municipios._upstream_config()
+	url = stub.url + BRASILAPI
+	stub.routes = {BRASILAPI: (500, {}, 0)}
+	with pytest.raises(urllib.error.HTTPError):
+		municipios._uf_list('brasilapi', url, 'MG', cfg)
+	stub.routes = {BRASILAPI: (200, [item(2)], 0)}
+	assert municipios._uf_list('brasilapi', url, 'MG', cfg)[0]['id'] == 2
+	# sucesso fica em cache: a terceira chamada não vai ao servidor
+	assert municipios._uf_list('brasilapi', url, 'MG', cfg)[0]['id'] == 2
+	assert stub.count(BRASILAPI) == 2
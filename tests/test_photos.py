@@ -0,0 +1,58 @@
+import io
+import os
+
+from PIL import Image
+
+from app import photos
+from app.db import db
+from app.models import Membro
+
+
+def _png(color):
+	buf = io.BytesIO()
+	Image.new('RGB', (400, 300), color).save(buf, 'PNG')
+	buf.seek(0)
+	return buf
+
+
+def _upload(client, headers, id_, color):
+	r = client.post(f'/api/membros/{id_}/photo', headers=headers, data={'file': (_png(color), 'foto.png')})
+	assert r.status_code == 200, r.get_json()
+	return r.get_json()
+
+
+def test_upload_process_commit_prune(client, headers, seed, tmp_path, monkeypatch):
+	monkeypatch.setattr(photos, 'STATIC_DIR', str(tmp_path))
+	monkeypatch.setattr(photos, 'UPLOAD_DIR', str(tmp_path / 'uploads' / 'membros'))
+	id_ = seed(1, friends=0)[0].id
+	member_dir = tmp_path / 'uploads' / 'membros' / str(id_)
+
+	first = _upload(client, headers, id_, 'red')
+	second = _upload(client, headers, id_, 'blue')
+	assert first['foto_url'] != second['foto_url']
+
+	foto_path = db.session.get(Membro, id_).foto_path
+	files = sorted(os.listdir(member_dir))
+	# só os derivados da foto gravada e o original; nenhum upload temporário sobra
+	assert files == sorted(['original.png'] + [os.path.basename(photos.file_path(foto_path, s, e)) for s in photos.SIZES for e in photos.FORMATS])
+	assert Image.open(member_dir / 'original.png').getpixel((0, 0)) == (0, 0, 255)
+
+
+def test_upload_names_are_unique(tmp_path, monkeypatch):
+	monkeypatch.setattr(photos, 'STATIC_DIR', str(tmp_path))
+	monkeypatch.setattr(photos, 'UPLOAD_DIR', str(tmp_path / 'uploads'))
+
+	class File:
+		def __init__(self, color):
+			self.data = _png(color).getvalue()
+
+		def save(self, path):
+			with open(path, 'wb') as f:
+				f.write(self.data)
+
+	a = photos.store_upload(1, File('red'), '.png')
+	b = photos.store_upload(1, File('green'), '.png')
+	assert a[0] != b[0] and os.path.isfile(a[0]) and os.path.isfile(b[0])
+	photos.discard_upload(1, b[0], b[1], a[1])
+	assert not os.path.exists(b[0]) and os.path.isfile(a[0])
+	assert not any(os.path.basename(p).startswith(os.path.basename(b[1])) for p in photos._derivatives(1))
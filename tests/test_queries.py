@@ -0,0 +1,67 @@
+"""Número de consultas por requisição não pode crescer com o tamanho da página (N+1)."""
+
+
+def test_list_page_queries_do_not_grow_with_per_page(client, headers, seed, queries):
+	seed(320)
+	client.get('/api/membros?per_page=5', headers=headers)
+	counts = {}
+	for per_page in (10, 300):
+		with queries() as q:
+			r = client.get(f'/api/membros?per_page={per_page}', headers=headers)
+		assert r.status_code == 200
+		data = r.get_json()['data']
+		assert len(data) == per_page
+		# amigos vêm junto, de uma consulta só
+		assert all(len(row['data']['Amigos no MP (IDs)']) == 2 for row in data)
+		counts[per_page] = q.count
+	assert counts[10] == counts[300]
+
+
+def test_render_rows_loads_friends_in_one_query(app, seed, queries):
+	from app.models import Membro
+	from app.routes.membros import render_rows
+	seed(50)
+	items = Membro.query.order_by(Membro.id).all()
+	with queries() as q:
+		out = render_rows(items, None, False)
+	assert q.count == 1
+	assert len(out['data']) == 50
+
+
+def _link(ms, center, n):
+	from app.db import db
+	from app.models import MembroRelacionamento
+	# metade de saída, metade de entrada
+	for i, other in enumerate(ms[1:n + 1]):
+		src, dst = (center, other) if i % 2 else (other, center)
+		db.session.add(MembroRelacionamento(source_id=src.id, target_id=dst.id, degree='sibling'))
+	db.session.commit()
+
+
+def test_member_relationships_is_one_query(app, seed, queries):
+	from app.routes.relationships import member_relationships
+	ms = seed(30, friends=0)
+	_link(ms, ms[0], 20)
+	center = ms[0].id
+	with queries() as q:
+		rels = member_relationships(center)
+	assert q.count == 1
+	assert len(rels) == 20
+	assert {r['direction'] for r in rels} == {'in', 'out'}
+	assert all(r['other_name'].startswith('MEMBRO') for r in rels)
+
+
+def test_relationship_listing_and_pdf_queries_do_not_grow(client, headers, seed, queries):
+	ms = seed(30)
+	_link(ms, ms[0], 2)
+	_link(ms[::-1], ms[25], 20)
+	few, many = ms[0].id, ms[25].id
+	for url in ('/api/membros/{}/relationships', '/api/membros/{}/report.pdf'):
+		client.get(url.format(few), headers=headers)
+		counts = []
+		for id_ in (few, many):
+			with queries() as q:
+				r = client.get(url.format(id_), headers=headers)
+			assert r.status_code == 200
+			counts.append(q.count)
+		assert counts[0] == counts[1], url
@@ -0,0 +1,47 @@
+from app.db import db
+from app.models import MembroRelacionamento
+
+
+def _relate_all(ms):
+	rows = [{'source_id': a.id, 'target_id': b.id, 'degree': 'sibling'} for i, a in enumerate(ms) for b in ms[i + 1:]]
+	db.session.execute(MembroRelacionamento.__table__.insert(), rows)
+	db.session.commit()
+	return len(rows)
+
+
+def test_relationships_unpaginated_by_default(client, headers, seed):
+	total = _relate_all(seed(50, friends=0))
+	assert total > 1000
+	r = client.get('/api/relationships', headers=headers)
+	body = r.get_json()
+	assert len(body['data']) == total
+	assert 'next_cursor' not in body
+
+
+def test_relationships_paginate_with_limit_or_cursor(client, headers, seed):
+	total = _relate_all(seed(50, friends=0))
+	seen = []
+	body = client.get('/api/relationships?limit=1000', headers=headers).get_json()
+	seen += body['data']
+	assert len(body['data']) == 1000 and body['next_cursor']
+	body = client.get(f"/api/relationships?cursor={body['next_cursor']}", headers=headers).get_json()
+	seen += body['data']
+	assert body['next_cursor'] is None
+	assert len({r['id'] for r in seen}) == total
+
+
+def test_graph_includes_center_without_edges(client, headers, seed):
+	ms = seed(3, friends=0)
+	center = ms[2].id
+	body = client.get(f'/api/relationships/graph?center_id={center}', headers=headers).get_json()
+	assert body['edges'] == []
+	assert body['nodes'] == [{'id': center, 'nome': 'MEMBRO 002'}]
+
+
+def test_graph_name_wildcards_are_literal(client, headers, seed):
+	seed(3, friends=0)
+	for nome in ('%', '_', 'MEMBRO%1'):
+		body = client.get('/api/relationships/graph', query_string={'nome': nome}, headers=headers).get_json()
+		assert body['center_id'] is None, nome
+	body = client.get('/api/relationships/graph', query_string={'nome': 'membro 001'}, headers=headers).get_json()
+	assert [n['nome'] for n in body['nodes']] == ['MEMBRO 001']
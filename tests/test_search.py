@@ -0,0 +1,27 @@
+from app import search
+from app.db import db
+from app.models import Membro
+
+
+def test_punctuation_only_query_is_literal_substring(client, headers, seed):
+	seed(5)
+	db.session.add(Membro(nome='ANA 100% PRESENTE'))
+	db.session.commit()
+	for q, total in (('%', 1), ('_', 0), ('--', 0), ('josé', 0), ('membro', 5)):
+		r = client.get('/api/membros', query_string={'q': q}, headers=headers)
+		assert r.status_code == 200
+		assert r.get_json()['total'] == total, q
+
+
+def test_long_word_matches_truncated_index_token(client, headers, seed):
+	seed(3)
+	word = 'PNEUMOULTRAMICROSCOPICOSSILICOVULCANOCONIOTICO' * 2
+	db.session.add(Membro(nome=f'ANA {word}'))
+	db.session.commit()
+	for q in (word, word.lower(), word[:70]):
+		r = client.get('/api/membros', query_string={'q': q}, headers=headers)
+		assert r.get_json()['total'] == 1, q
+	# ranking: o token da consulta é cortado como o do índice, então conta o bônus de token exato
+	data = client.get('/api/membros/search', query_string={'q': word}, headers=headers).get_json()['data']
+	assert [d['nome'] for d in data] == [f'ANA {word}']
+	assert data[0]['score'] == 2 * search.FIELD_WEIGHTS['nome']
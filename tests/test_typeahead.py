@@ -0,0 +1,48 @@
+from sqlalchemy import text
+
+from app import cache, typeahead
+from app.db import db
+from app.models import membro_amigos
+
+
+def suggest(client, headers, q):
+	r = client.get('/api/membros/suggest', query_string={'q': q}, headers=headers)
+	assert r.status_code == 200
+	return r.get_json()['values']
+
+
+def test_suggest_issues_no_sql(client, headers, seed, queries):
+	seed(10)
+	assert suggest(client, headers, 'membro 00')  # constrói o índice
+	with queries() as q:
+		assert suggest(client, headers, 'membro 001') == ['MEMBRO 001']
+		client.get('/api/membros/search-min?q=membro', headers=headers)
+	assert q.count == 0
+
+
+def test_write_from_another_connection_is_seen_after_recheck(client, headers, seed, monkeypatch):
+	seed(3)
+	suggest(client, headers, 'zeca')
+	# outro worker (ou a CLI): conexão própria, sem os eventos desta sessão
+	with db.engine.begin() as conn:
+		conn.execute(text("INSERT INTO membros (nome) VALUES ('ZECA DE OUTRO WORKER')"))
+		cache.bump_version('nomes', conn)
+	monkeypatch.setattr(typeahead, 'VERSION_RECHECK', 0)
+	assert suggest(client, headers, 'zeca') == ['ZECA DE OUTRO WORKER']
+
+
+def test_non_name_writes_do_not_rebuild(client, headers, seed, monkeypatch):
+	ms = seed(4)
+	suggest(client, headers, 'membro')
+	monkeypatch.setattr(typeahead, 'VERSION_RECHECK', 0)
+	calls = []
+	original = typeahead.rebuild
+	monkeypatch.setattr(typeahead, 'rebuild', lambda: calls.append(1) or original())
+	ms[0].comarca_lotacao = 'OUTRA'
+	db.session.execute(membro_amigos.insert().values(membro_id=ms[0].id, amigo_id=ms[3].id))
+	db.session.commit()
+	# nome editado neste processo: aplicado no índice, sem reconstrução
+	ms[1].nome = 'NOVO NOME'
+	db.session.commit()
+	assert suggest(client, headers, 'novo') == ['NOVO NOME']
+	assert calls == []
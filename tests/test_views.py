@@ -0,0 +1,11 @@
+def test_page_etag_differs_per_encoding(client):
+	plain = client.get('/login', headers={'Accept-Encoding': 'identity'})
+	gz = client.get('/login', headers={'Accept-Encoding': 'gzip'})
+	assert gz.headers['Content-Encoding'] == 'gzip'
+	assert 'Content-Encoding' not in plain.headers
+	tag = plain.headers['ETag'].strip('"')
+	assert gz.headers['ETag'] == f'"{tag}-gz"'
+	# qualquer variante revalida, e a resposta traz a ETag da representação pedida
+	r = client.get('/login', headers={'Accept-Encoding': 'identity', 'If-None-Match': gz.headers['ETag']})
+	assert r.status_code == 304
+	assert r.headers['ETag'] == plain.headers['ETag']